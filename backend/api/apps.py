@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self) -> None:
+        from api.authentication import revoke_on_credential_change
+        from userauths.models import User
+
+        post_save.connect(revoke_on_credential_change, sender=User, dispatch_uid='api.revoke_on_credential_change')
@@ -0,0 +1,158 @@
+"""
+Async variants of the token, register and password reset endpoints, served
+under /api/v2/ next to the DRF views in api.views.
+
+They run on the event loop under ASGI: queries go through the async ORM,
+password hashing runs on the shared CPU pool (core.executors), and the
+remaining sync calls are handed to sync_to_async.
+"""
+import json
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.http import HttpRequest, JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+
+from api import serializer as api_serializer
+from api.throttling import PasswordResetEmailThrottle, PasswordResetIPThrottle
+from api.tokens import reset_token_generator
+from api.views import RESET_COALESCE_WINDOW, build_reset_email, build_reset_link, reset_pending_key
+from core import mail as mail_queue
+from core.executors import run_cpu_bound
+from userauths.models import User
+
+logger = logging.getLogger(__name__)
+
+INVALID_CREDENTIALS = "No active account found with the given credentials"
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncAPIView(View):
+    """Base async JSON view; like DRF's APIView it is exempt from CSRF checks."""
+
+    def parse_body(self, request: HttpRequest) -> Optional[Dict[str, Any]]:
+        """Return the JSON or form body as a dict, or None if it can't be parsed."""
+        if request.content_type == 'application/json':
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                return None
+            return data if isinstance(data, dict) else None
+        return request.POST.dict()
+
+    def missing_fields(self, data: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+        return {field: ["This field is required."] for field in fields if not data.get(field)}
+
+    def parse_error(self) -> JsonResponse:
+        return JsonResponse({"detail": "JSON parse error"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncTokenObtainPairView(AsyncAPIView):
+    """Issues a refresh/access token pair with the custom claims."""
+
+    async def post(self, request: HttpRequest, *args: Any, **kwargs: Any) -> JsonResponse:
+        data = self.parse_body(request)
+        if data is None:
+            return self.parse_error()
+        errors = self.missing_fields(data, ('email', 'password'))
+        if errors:
+            return JsonResponse(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = await User.objects.filter(email=data['email']).afirst()
+        if user is None:
+            # Hash anyway so unknown emails take as long as wrong passwords
+            await run_cpu_bound(make_password, data['password'])
+            return JsonResponse({"detail": INVALID_CREDENTIALS}, status=status.HTTP_401_UNAUTHORIZED)
+        # An outdated hash is upgraded in the background, see User.check_password
+        if not await run_cpu_bound(user.check_password, data['password']) or not user.is_active:
+            return JsonResponse({"detail": INVALID_CREDENTIALS}, status=status.HTTP_401_UNAUTHORIZED)
+
+        # Records the OutstandingToken row for the blacklist
+        refresh = await sync_to_async(api_serializer.MyTokenObtainPairSerializer.get_token)(user)
+        return JsonResponse({'refresh': str(refresh), 'access': str(refresh.access_token)})
+
+
+class AsyncRegisterView(AsyncAPIView):
+    """Registers a new user, hashing the password off the event loop."""
+
+    async def post(self, request: HttpRequest, *args: Any, **kwargs: Any) -> JsonResponse:
+        data = self.parse_body(request)
+        if data is None:
+            return self.parse_error()
+
+        # Email uniqueness and the password validators
+        serializer = api_serializer.RegisterSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        validated = serializer.validated_data
+        user = User(email=validated['email'], full_name=validated['full_name'])
+        user.password = await run_cpu_bound(make_password, validated['password'])
+        await user.asave()
+
+        return JsonResponse(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class AsyncPasswordResetEmailVerifyView(AsyncAPIView):
+    """Queues a password reset email, with the same throttling and coalescing as v1."""
+    # The reset token signs the current password hash, so read it from the primary
+    use_primary_db = True
+    throttle_classes = [PasswordResetIPThrottle, PasswordResetEmailThrottle]
+
+    def check_throttles(self, request: HttpRequest) -> Optional[float]:
+        """Return the seconds to wait if any throttle rejects the request."""
+        waits = [
+            throttle.wait() for throttle in (cls() for cls in self.throttle_classes)
+            if not throttle.allow_request(request, self)
+        ]
+        if not waits:
+            return None
+        return max((wait for wait in waits if wait is not None), default=0)
+
+    async def get(self, request: HttpRequest, email: str, *args: Any, **kwargs: Any) -> JsonResponse:
+        wait = await sync_to_async(self.check_throttles)(request)
+        if wait is not None:
+            response = JsonResponse(
+                {"detail": f"Request was throttled. Expected available in {int(wait) + 1} seconds."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+            response['Retry-After'] = str(int(wait) + 1)
+            return response
+
+        accepted = {
+            "message": "Password reset instructions will be sent to your email.",
+            "email": email,
+        }
+        # Coalesce repeated requests for the same email into the reset already issued
+        pending_key = reset_pending_key(email)
+        if not await cache.aadd(pending_key, True, RESET_COALESCE_WINDOW):
+            return JsonResponse(accepted, status=status.HTTP_202_ACCEPTED)
+
+        try:
+            user = await User.objects.filter(email=email).afirst()
+            if user is None:
+                await cache.adelete(pending_key)
+                return JsonResponse(
+                    {"error": "No user found with this email address."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+            reset_link = build_reset_link(user, reset_token_generator.make_token(user))
+            outbound = await sync_to_async(mail_queue.enqueue)(build_reset_email(user, reset_link))
+            logger.debug("Reset email queued", extra={'user_id': user.pk, 'outbound_email_id': outbound.pk})
+        except Exception:
+            await cache.adelete(pending_key)
+            logger.exception("Password reset request failed")
+            return JsonResponse(
+                {"error": "Failed to process reset request. Please try again."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        accepted['email'] = user.email
+        return JsonResponse(accepted, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,121 @@
+"""
+Stateless JWT authentication.
+
+simplejwt's JWTAuthentication loads the User row on every request. The access
+token already carries the user id and the claims MyTokenObtainPairSerializer
+adds, so StatelessJWTAuthentication builds a ClaimsUser from the verified
+token instead and only touches the database when a view asks for
+`request.user.instance`.
+
+Without the row there is no `is_active` or password check, so changing the
+password or deactivating a user records a revocation time in the cache and
+tokens issued before it are rejected. Each process remembers the lookup for
+JWT_REVOCATION_CHECK_TTL seconds, so a revocation can take that long to reach
+every worker.
+"""
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from userauths.models import User
+
+REVOCATION_CACHE_PREFIX = 'jwt-revoked'
+DEFAULT_REVOCATION_CHECK_TTL = 5
+MAX_LOCAL_REVOCATIONS = 10_000
+
+# user id -> (monotonic time checked, revocation time or None)
+_local_revocations: Dict[Any, Tuple[float, Optional[int]]] = {}
+_local_lock = threading.Lock()
+
+
+def revocation_cache_key(user_id: Any) -> str:
+    return f"{REVOCATION_CACHE_PREFIX}:{user_id}"
+
+
+def revoke_user_tokens(user_id: Any) -> None:
+    """Reject every token issued to `user_id` up to now."""
+    # Kept as long as a refresh token lives, so tokens minted from an old one can be caught too
+    timeout = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+    # Whole seconds, like `iat`, so tokens issued later in the same second stay valid
+    cache.set(revocation_cache_key(user_id), int(time.time()), timeout)
+    with _local_lock:
+        _local_revocations.pop(user_id, None)
+
+
+def get_revoked_at(user_id: Any) -> Optional[int]:
+    """Time tokens of `user_id` were last revoked, checked against the cache at most once per TTL."""
+    ttl = getattr(settings, 'JWT_REVOCATION_CHECK_TTL', DEFAULT_REVOCATION_CHECK_TTL)
+    now = time.monotonic()
+    entry = _local_revocations.get(user_id)
+    if entry is not None and now - entry[0] < ttl:
+        return entry[1]
+
+    revoked_at = cache.get(revocation_cache_key(user_id))
+    with _local_lock:
+        if len(_local_revocations) >= MAX_LOCAL_REVOCATIONS:
+            _local_revocations.clear()
+        _local_revocations[user_id] = (now, revoked_at)
+    return revoked_at
+
+
+def is_token_revoked(token: Any) -> bool:
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return False
+    revoked_at = get_revoked_at(user_id)
+    return revoked_at is not None and token.get('iat', 0) < revoked_at
+
+
+def clear_local_revocations() -> None:
+    with _local_lock:
+        _local_revocations.clear()
+
+
+def revoke_on_credential_change(sender: type[User], instance: User, created: bool, **kwargs: Any) -> None:
+    """Signal handler revoking a user's tokens when their password changes or they're deactivated."""
+    if created:
+        return
+    dirty = instance.get_dirty_fields()
+    if 'password' in dirty or ('is_active' in dirty and not instance.is_active):
+        revoke_user_tokens(instance.pk)
+
+
+class ClaimsUser(TokenUser):
+    """A user built from the claims of a verified access token; the User row is loaded on demand."""
+
+    @cached_property
+    def email(self) -> str:
+        return self.token.get('email', '')
+
+    @cached_property
+    def full_name(self) -> str:
+        return self.token.get('full_name', '')
+
+    @cached_property
+    def instance(self) -> User:
+        """The full User, loaded with one query the first time it's needed."""
+        return User.objects.get(pk=self.pk)
+
+    def __str__(self) -> str:
+        return self.email or super().__str__()
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWT authentication that trusts the token's claims instead of loading the user."""
+
+    def get_user(self, validated_token: Any) -> ClaimsUser:
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        if is_token_revoked(validated_token):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+        return api_settings.TOKEN_USER_CLASS(validated_token)
@@ -0,0 +1,178 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+DEFAULT_BLOOM_CAPACITY = 1_000_000
+DEFAULT_BLOOM_ERROR_RATE = 0.001
+DEFAULT_PRUNE_BATCH_SIZE = 1000
+PRUNE_PROGRESS_CACHE_KEY = 'token-prune:progress'
+
+
+class BloomFilter:
+    """A fixed-size bloom filter over strings using double hashing."""
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Tuple[int, ...]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return tuple((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class BlacklistFilter:
+    """
+    Process-local bloom filter of blacklisted refresh token ids.
+
+    It is warmed from the BlacklistedToken table on first use and updated as
+    this process blacklists tokens. A miss means "not known to be blacklisted",
+    so callers must still rely on an authoritative check before trusting it.
+    """
+
+    def __init__(self) -> None:
+        self._bloom: Optional[BloomFilter] = None
+        self._lock = threading.Lock()
+
+    @property
+    def bloom(self) -> BloomFilter:
+        if self._bloom is None:
+            with self._lock:
+                if self._bloom is None:
+                    bloom = BloomFilter(
+                        getattr(settings, 'JWT_BLACKLIST_BLOOM_CAPACITY', DEFAULT_BLOOM_CAPACITY),
+                        getattr(settings, 'JWT_BLACKLIST_BLOOM_ERROR_RATE', DEFAULT_BLOOM_ERROR_RATE),
+                    )
+                    jtis = BlacklistedToken.objects.values_list('token__jti', flat=True)
+                    for jti in jtis.iterator(chunk_size=10000):
+                        bloom.add(jti)
+                    self._bloom = bloom
+        return self._bloom
+
+    def add(self, jti: str) -> None:
+        self.bloom.add(jti)
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self.bloom
+
+    def reset(self) -> None:
+        with self._lock:
+            self._bloom = None
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def fast_refresh_enabled() -> bool:
+    """
+    The fast path is only safe when every refresh blacklists the presented token,
+    because that write is what finally rejects a replayed token.
+    """
+    return (
+        getattr(settings, 'JWT_FAST_REFRESH', False)
+        and api_settings.ROTATE_REFRESH_TOKENS
+        and api_settings.BLACKLIST_AFTER_ROTATION
+    )
+
+
+class BloomCheckedRefreshToken(RefreshToken):
+    """Refresh token that only queries the blacklist when the bloom filter flags it."""
+
+    def check_blacklist(self) -> None:
+        if self.payload[api_settings.JTI_CLAIM] in blacklist_filter:
+            super().check_blacklist()
+
+    def blacklist(self) -> Tuple[Any, bool]:
+        """
+        Blacklist the token, raising `TokenError` if it already was.
+
+        `get_or_create` on the one-to-one BlacklistedToken row is atomic, so a
+        token replayed on another worker is still rejected here.
+        """
+        blacklisted, created = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        if not created:
+            raise TokenError(_("Token is blacklisted"))
+        return blacklisted, created
+
+
+def prune_expired_tokens(
+    batch_size: int = DEFAULT_PRUNE_BATCH_SIZE,
+    grace: timedelta = timedelta(0),
+    pause: float = 0.0,
+    max_batches: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Delete expired outstanding tokens and their blacklist rows in bounded batches.
+
+    Each batch is its own short transaction, walking the primary key so no
+    statement scans or locks the whole table. Yields a progress dict after
+    every batch; the latest one is also stored in the cache under
+    PRUNE_PROGRESS_CACHE_KEY so other processes can report it.
+    """
+    cutoff = timezone.now() - grace
+    started = time.perf_counter()
+    progress: Dict[str, Any] = {
+        'cutoff': cutoff.isoformat(),
+        'batches': 0,
+        'outstanding_deleted': 0,
+        'blacklisted_deleted': 0,
+        'last_id': 0,
+        'elapsed_s': 0.0,
+        'rows_per_s': 0.0,
+        'done': False,
+    }
+
+    while max_batches is None or progress['batches'] < max_batches:
+        with transaction.atomic():
+            ids = list(
+                OutstandingToken.objects
+                .filter(id__gt=progress['last_id'], expires_at__lt=cutoff)
+                .order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                progress['done'] = True
+                break
+            # Only ids are loaded; the blacklist rows go in one fast cascade DELETE
+            _, deleted = OutstandingToken.objects.filter(id__in=ids).only('id').delete()
+
+        progress['batches'] += 1
+        progress['last_id'] = ids[-1]
+        progress['outstanding_deleted'] += deleted.get(OutstandingToken._meta.label, 0)
+        progress['blacklisted_deleted'] += deleted.get(BlacklistedToken._meta.label, 0)
+        progress['elapsed_s'] = time.perf_counter() - started
+        progress['rows_per_s'] = progress['outstanding_deleted'] / progress['elapsed_s']
+        cache.set(PRUNE_PROGRESS_CACHE_KEY, progress, None)
+        yield dict(progress)
+
+        if pause:
+            time.sleep(pause)
+
+    progress['elapsed_s'] = time.perf_counter() - started
+    cache.set(PRUNE_PROGRESS_CACHE_KEY, progress, None)
+    yield dict(progress)
@@ -0,0 +1,79 @@
+import time
+from datetime import timedelta
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from api.blacklist import DEFAULT_PRUNE_BATCH_SIZE, prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = (
+        "Incrementally deletes expired outstanding and blacklisted JWT refresh tokens "
+        "in small batches, so it can run on a schedule without long table locks."
+    )
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_PRUNE_BATCH_SIZE,
+            help="Outstanding tokens deleted per transaction.",
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.05,
+            help="Seconds to sleep between batches to let other writers through.",
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help="Stop after this many batches; the next run carries on.",
+        )
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=0,
+            help="Keep tokens for this long after they expire.",
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Keep pruning on a schedule instead of exiting.",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=3600,
+            help="Seconds between runs with --loop.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            while True:
+                self.prune(options)
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def prune(self, options: Any) -> None:
+        progress = {}
+        for progress in prune_expired_tokens(
+            batch_size=options['batch_size'],
+            grace=timedelta(hours=options['grace_hours']),
+            pause=options['pause'],
+            max_batches=options['max_batches'],
+        ):
+            if not progress['done']:
+                self.stdout.write(
+                    f"Batch {progress['batches']}: {progress['outstanding_deleted']} outstanding, "
+                    f"{progress['blacklisted_deleted']} blacklisted deleted "
+                    f"({progress['rows_per_s']:.0f} rows/s, last id {progress['last_id']})"
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {progress['outstanding_deleted']} outstanding and "
+            f"{progress['blacklisted_deleted']} blacklisted tokens in {progress['elapsed_s']:.1f}s"
+        ))
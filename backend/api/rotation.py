@@ -0,0 +1,79 @@
+"""
+Refresh token rotation that tolerates duplicate refreshes.
+
+With ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION, the first refresh
+blacklists the token it was given, so a second tab or a retried request
+presenting the same token a moment later is rejected and the user has to log
+in again. `rotate_once` lets one caller per token rotate it, under a lock in
+the cache, and hands the resulting pair to anyone presenting the same token
+within JWT_REFRESH_GRACE_PERIOD seconds.
+
+The pair is cached under a hash of the presented token, so only someone
+holding that exact token can collect it. For workers to share the lock and
+the pair, the default cache must be shared between them.
+"""
+import hashlib
+import time
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.settings import api_settings
+
+ROTATION_CACHE_PREFIX = 'jwt-rotation'
+DEFAULT_GRACE_PERIOD = 5
+DEFAULT_LOCK_TIMEOUT = 5
+LOCK_POLL_INTERVAL = 0.02
+
+TokenPair = Dict[str, Any]
+
+
+def rotation_grace_enabled() -> bool:
+    """Only rotation that blacklists the old token turns duplicates into failures."""
+    return (
+        getattr(settings, 'JWT_REFRESH_GRACE_PERIOD', DEFAULT_GRACE_PERIOD) > 0
+        and api_settings.ROTATE_REFRESH_TOKENS
+        and api_settings.BLACKLIST_AFTER_ROTATION
+    )
+
+
+def rotation_cache_keys(raw_token: str) -> Dict[str, str]:
+    digest = hashlib.sha256(raw_token.encode()).hexdigest()
+    return {
+        'result': f"{ROTATION_CACHE_PREFIX}:result:{digest}",
+        'lock': f"{ROTATION_CACHE_PREFIX}:lock:{digest}",
+    }
+
+
+def rotate_once(raw_token: str, rotate: Callable[[], TokenPair]) -> TokenPair:
+    """
+    Call `rotate` for `raw_token` unless it was rotated in the last grace
+    period, in which case the pair it produced is returned instead.
+
+    Concurrent callers wait for the lock holder's pair rather than rotating
+    the token themselves. If the holder fails or outlives the lock timeout,
+    they call `rotate`, which then fails the usual way.
+    """
+    keys = rotation_cache_keys(raw_token)
+    grace = getattr(settings, 'JWT_REFRESH_GRACE_PERIOD', DEFAULT_GRACE_PERIOD)
+    lock_timeout = getattr(settings, 'JWT_REFRESH_LOCK_TIMEOUT', DEFAULT_LOCK_TIMEOUT)
+    deadline = time.monotonic() + lock_timeout
+
+    while True:
+        pair = cache.get(keys['result'])
+        if pair is not None:
+            return pair
+        if cache.add(keys['lock'], 1, lock_timeout):
+            try:
+                # The previous holder may have finished between the two calls above
+                pair = cache.get(keys['result'])
+                if pair is None:
+                    pair = dict(rotate())
+                    cache.set(keys['result'], pair, grace)
+                return pair
+            finally:
+                cache.delete(keys['lock'])
+        # If the holder fails, its lock is released and the next pass rotates (and fails) itself
+        if time.monotonic() >= deadline:
+            return rotate()
+        time.sleep(LOCK_POLL_INTERVAL)
@@ -1,8 +1,12 @@
 from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from typing import Any, Dict
-from userauths.models import User, Profile
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from typing import Any, Dict, Optional
+from api.blacklist import BloomCheckedRefreshToken
+from userauths.images import variant_urls
+from userauths.models import User, Profile, ProfileImage
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Custom token serializer that includes additional user information in the token."""
@@ -12,23 +16,29 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         """Enhance the token with additional user data."""
         token = super().get_token(user)
         
-        # Add custom claims
-        token.update({
-            'full_name': user.full_name,
-            'email': user.email,
-            'username': user.username,
-        })
+        # Add custom claims; `user` is already loaded, so they are read straight from it
+        token['full_name'] = user.full_name
+        token['email'] = user.email
+        token['username'] = user.username
         
         return token
 
 
+class FastTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh serializer that skips the blacklist SELECT for tokens the local bloom
+    filter has never seen. Replays are still rejected when the token is blacklisted
+    during rotation.
+    """
+    token_class = BloomCheckedRefreshToken
+
+
 class RegisterSerializer(serializers.ModelSerializer):
     """Serializer for user registration with password validation."""
     
     password = serializers.CharField(
         write_only=True,
         required=True,
-        validators=[validate_password],
         style={'input_type': 'password'}
     )
     password2 = serializers.CharField(
@@ -51,6 +61,17 @@ class RegisterSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({
                 "password": "Password fields didn't match."
             })
+
+        # Validate against the new user's details so the similarity check has something to compare
+        user = User(
+            email=attrs['email'],
+            full_name=attrs['full_name'],
+            username=attrs['email'].split('@')[0]
+        )
+        try:
+            validate_password(attrs['password'], user=user)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError({"password": list(error.messages)})
         return attrs
 
     def create(self, validated_data: Dict[str, Any]) -> User:
@@ -58,11 +79,11 @@ class RegisterSerializer(serializers.ModelSerializer):
         # Remove password2 as it's not needed for user creation
         validated_data.pop('password2', None)
         
-        user = User.objects.create(
+        # Hash before the first save so the user is written with a single INSERT
+        user = User(
             email=validated_data['email'],
             full_name=validated_data['full_name']
         )
-        
         user.set_password(validated_data['password'])
         user.save()
 
@@ -78,13 +99,88 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class ProfileImageSerializer(serializers.ModelSerializer):
+    """A stored profile picture with the URLs of its resized variants."""
+
+    original = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProfileImage
+        fields = ('digest', 'original', 'width', 'height', 'status', 'variants')
+        read_only_fields = fields
+
+    def get_original(self, image: ProfileImage) -> str:
+        return default_storage.url(image.original)
+
+    def get_variants(self, image: ProfileImage) -> Dict[str, Dict[str, str]]:
+        return variant_urls(image)
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     """Serializer for the Profile model."""
     
     user = UserSerializer(read_only=True)
+    # {variant: {format: url}} once the uploaded picture has been processed
+    image_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = Profile
-        fields = ('id', 'user', 'image', 'full_name', 'country', 'about', 'date')
+        fields = ('id', 'user', 'image', 'image_variants', 'full_name', 'country', 'about', 'date')
         read_only_fields = ('id', 'date')
 
+    def get_image_variants(self, profile: Profile) -> Dict[str, Dict[str, str]]:
+        return variant_urls(profile.image_asset)
+
+
+
+class FastProfileSerializer:
+    """
+    Read-only equivalent of ProfileSerializer for the profile API.
+
+    ModelSerializer builds and binds its fields for every instance it
+    serializes. Here the output is a flat function of the row and its
+    select_related user and image, and the one field with non-trivial
+    formatting reuses a DateTimeField built once.
+
+    The user's email is left out unless the request is made by that user or
+    by staff.
+    """
+
+    date_field = serializers.DateTimeField(read_only=True)
+
+    def __init__(self, request: Any = None) -> None:
+        self.request = request
+
+    def shows_email(self, user: User) -> bool:
+        # Without a request this isn't a response to anyone
+        if self.request is None:
+            return True
+        viewer = getattr(self.request, 'user', None)
+        return viewer is not None and viewer.is_authenticated and (viewer.pk == user.pk or viewer.is_staff)
+
+    def image_url(self, image: Any) -> Optional[str]:
+        # As serializers.FileField renders it
+        if not image:
+            return None
+        try:
+            url = image.url
+        except AttributeError:
+            return None
+        return self.request.build_absolute_uri(url) if self.request is not None else url
+
+    def to_representation(self, profile: Profile) -> Dict[str, Any]:
+        user = profile.user
+        user_data = {'id': user.pk, 'email': user.email, 'username': user.username, 'full_name': user.full_name}
+        if not self.shows_email(user):
+            del user_data['email']
+        return {
+            'id': profile.pk,
+            'user': user_data,
+            'image': self.image_url(profile.image),
+            'image_variants': variant_urls(profile.image_asset),
+            'full_name': profile.full_name,
+            'country': profile.country,
+            'about': profile.about,
+            'date': self.date_field.to_representation(profile.date),
+        }
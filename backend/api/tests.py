@@ -1,3 +1,699 @@
-from django.test import TestCase
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api.authentication import (
+    ClaimsUser, StatelessJWTAuthentication, clear_local_revocations, is_token_revoked, revocation_cache_key,
+    revoke_user_tokens,
+)
+from api.blacklist import PRUNE_PROGRESS_CACHE_KEY, BloomFilter, blacklist_filter, prune_expired_tokens
+from api.throttling import PasswordResetEmailThrottle, PasswordResetIPThrottle, TokenBucketThrottle, hash_email
+from api.rotation import rotate_once, rotation_cache_keys
+from api.serializer import MyTokenObtainPairSerializer, ProfileSerializer
+from api.tokens import reset_token_generator
+from core.mail import deliver_batch
+from core.models import OutboundEmail
+from userauths.models import Profile, User
+
+
+@override_settings(MAIL_QUEUE_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class PasswordResetEmailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='student@example.com', full_name='Student One')
+
+    def test_reset_request_is_queued_and_accepted(self):
+        response = self.client.get('/api/v1/user/password-reset/student@example.com/')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(mail.outbox), 0)
+        outbound = OutboundEmail.objects.get()
+        self.assertEqual(outbound.to, ['student@example.com'])
+
+        deliver_batch()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('create-new-password', mail.outbox[0].body)
+
+    def test_stale_bearer_header_is_ignored(self):
+        response = self.client.get(
+            '/api/v1/user/password-reset/student@example.com/', HTTP_AUTHORIZATION='Bearer garbage'
+        )
+
+        self.assertEqual(response.status_code, 202)
+
+    def test_queue_failure_is_logged_not_returned(self):
+        with mock.patch('api.views.mail_queue.enqueue', side_effect=RuntimeError("smtp password=hunter2")), \
+                self.assertLogs('api.views', level='ERROR'):
+            response = self.client.get('/api/v1/user/password-reset/student@example.com/')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertNotIn('hunter2', response.content.decode())
+
+    def test_reset_issue_writes_nothing_to_the_user(self):
+        self.client.get('/api/v1/user/password-reset/student@example.com/')
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.password, self.user.password)
+        self.assertIsNone(user.otp)
+
+    def test_unknown_email_is_not_queued(self):
+        response = self.client.get('/api/v1/user/password-reset/nobody@example.com/')
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+    def test_repeated_requests_are_coalesced_into_one_reset(self):
+        url = '/api/v1/user/password-reset/student@example.com/'
+        self.assertEqual(self.client.get(url).status_code, 202)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 202)
+
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+    def test_unknown_email_does_not_hold_the_coalescing_window(self):
+        url = '/api/v1/user/password-reset/nobody@example.com/'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_email_bucket_returns_429_without_touching_the_database(self):
+        url = '/api/v1/user/password-reset/student@example.com/'
+        with mock.patch.object(PasswordResetEmailThrottle, 'rate', '2/hour', create=True):
+            for _ in range(2):
+                # Let each request through the coalescing window
+                cache.delete('password-reset:pending:' + hash_email('student@example.com'))
+                self.assertEqual(self.client.get(url).status_code, 202)
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    def test_ip_bucket_limits_across_emails(self):
+        with mock.patch.object(PasswordResetIPThrottle, 'rate', '1/hour', create=True):
+            self.assertEqual(self.client.get('/api/v1/user/password-reset/a@example.com/').status_code, 404)
+            self.assertEqual(self.client.get('/api/v1/user/password-reset/b@example.com/').status_code, 429)
+            response = self.client.get(
+                '/api/v1/user/password-reset/b@example.com/', REMOTE_ADDR='10.0.0.2'
+            )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PasswordChangeTests(TestCase):
+    url = '/api/v1/user/password-change/'
+
+    def setUp(self):
+        self.user = User.objects.create(email='student@example.com')
+        self.user.set_password('old-password-1')
+        self.user.save()
+        self.token = reset_token_generator.make_token(self.user)
+
+    def change(self, token: str, uuid=None, password: str = 'n3w-Secret-pw'):
+        return self.client.post(self.url, {
+            'otp': token,
+            'uuidb64': self.user.pk if uuid is None else uuid,
+            'password': password,
+        })
+
+    def test_valid_token_changes_password(self):
+        response = self.change(self.token)
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('n3w-Secret-pw'))
+
+    def test_stale_bearer_header_is_ignored(self):
+        response = self.client.post(self.url, {
+            'otp': self.token, 'uuidb64': self.user.pk, 'password': 'n3w-Secret-pw',
+        }, HTTP_AUTHORIZATION='Bearer garbage')
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_token_is_single_use(self):
+        self.assertEqual(self.change(self.token).status_code, 200)
+        self.assertEqual(self.change(self.token, password='another-pw-2').status_code, 404)
+
+    def test_tampered_token_or_unknown_user_is_rejected(self):
+        self.assertEqual(self.change(self.token[:-1] + 'x').status_code, 404)
+        self.assertEqual(self.change(self.token, uuid=self.user.pk + 1).status_code, 404)
+        self.assertEqual(self.change(self.token, uuid='not-a-number').status_code, 404)
+
+    @override_settings(PASSWORD_RESET_TIMEOUT=-1)
+    def test_expired_token_is_rejected(self):
+        self.assertEqual(self.change(self.token).status_code, 404)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    MAIL_QUEUE_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class AuthQueryCountTests(TestCase):
+    """Pins the number of queries issued by the auth endpoints."""
+
+    password = 'Sup3r-secret-pw'
+
+    def setUp(self):
+        cache.clear()
+
+    def test_register(self):
+        # email uniqueness check, user INSERT, profile INSERT; a leftover Bearer header is not looked at
+        with self.assertNumQueries(3):
+            response = self.client.post('/api/v1/user/register/', {
+                'email': 'student@example.com',
+                'full_name': 'Student One',
+                'password': self.password,
+                'password2': self.password,
+            }, HTTP_AUTHORIZATION='Bearer garbage')
+        self.assertEqual(response.status_code, 201)
+
+    def test_password_reset(self):
+        User.objects.create(email='student@example.com')
+        # user lookup, email enqueue
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/v1/user/password-reset/student@example.com/')
+        self.assertEqual(response.status_code, 202)
+
+    def test_password_change(self):
+        user = User.objects.create(email='student@example.com')
+        token = reset_token_generator.make_token(user)
+        # user lookup by primary key, password UPDATE
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/v1/user/password-change/', {
+                'otp': token,
+                'uuidb64': user.pk,
+                'password': self.password,
+            })
+        self.assertEqual(response.status_code, 200)
+
+
+class TokenBucketThrottleTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bucket_allows_bursts_then_refills_over_time(self):
+        class Throttle(TokenBucketThrottle):
+            rate = '2/min'
+
+            def get_cache_key(self, request, view):
+                return 'bucket-test'
+
+        now = [1000.0]
+        with mock.patch.object(Throttle, 'timer', lambda self: now[0]):
+            self.assertTrue(Throttle().allow_request(None, None))
+            self.assertTrue(Throttle().allow_request(None, None))
+            throttle = Throttle()
+            self.assertFalse(throttle.allow_request(None, None))
+            self.assertAlmostEqual(throttle.wait(), 30.0)
+
+            now[0] += 30
+            self.assertTrue(Throttle().allow_request(None, None))
+            self.assertFalse(Throttle().allow_request(None, None))
+
+
+class TokenClaimsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='student@example.com', full_name='Student One')
+
+    def test_claims_are_added_to_token_without_queries(self):
+        with self.assertNumQueries(1):
+            # Only simplejwt's OutstandingToken INSERT
+            token = MyTokenObtainPairSerializer.get_token(self.user)
+
+        self.assertEqual((token['full_name'], token['email']), ('Student One', 'student@example.com'))
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_token_endpoint_issues_tokens_with_claims(self):
+        self.user.set_password('Sup3r-secret-pw')
+        self.user.save()
+
+        response = self.client.post('/api/v1/user/token/', {
+            'email': 'student@example.com',
+            'password': 'Sup3r-secret-pw',
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RefreshToken(response.data['refresh'])['username'], 'student')
+
+    def test_claims_follow_updates_that_skip_save(self):
+        User.objects.filter(pk=self.user.pk).update(full_name='Renamed')
+        self.user.refresh_from_db()
+
+        self.assertEqual(MyTokenObtainPairSerializer.get_token(self.user)['full_name'], 'Renamed')
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        clear_local_revocations()
+        self.user = User.objects.create(email='student@example.com', full_name='Student One')
+        access = MyTokenObtainPairSerializer.get_token(self.user).access_token
+        # Issued before any change the tests make, not in the same second
+        access['iat'] -= 10
+        self.access = str(access)
+
+    def tearDown(self):
+        clear_local_revocations()
+
+    def authenticate(self, access=None):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access or self.access}')
+        return StatelessJWTAuthentication().authenticate(request)
+
+    def test_user_is_built_from_claims_without_queries(self):
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual((user.email, user.full_name, user.username), ('student@example.com', 'Student One', 'student'))
+        self.assertTrue(user.is_authenticated)
+
+    def test_full_user_is_loaded_on_demand(self):
+        user, _ = self.authenticate()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user.instance, self.user)
+            user.instance
+
+    def test_password_change_revokes_earlier_tokens(self):
+        self.user.set_password('n3w-Secret-pw')
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deactivation_revokes_earlier_tokens(self):
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_tokens_issued_in_the_second_of_the_change_stay_valid(self):
+        with mock.patch('api.authentication.time') as clock:
+            clock.time.return_value = 1_700_000_000.9
+            revoke_user_tokens(self.user.pk)
+
+        self.assertTrue(is_token_revoked({'user_id': self.user.pk, 'iat': 1_699_999_999}))
+        self.assertFalse(is_token_revoked({'user_id': self.user.pk, 'iat': 1_700_000_000}))
+
+    def test_password_change_keeps_tokens_issued_after_it(self):
+        self.user.set_password('n3w-Secret-pw')
+        self.user.save()
+        access = str(MyTokenObtainPairSerializer.get_token(self.user).access_token)
+
+        user, _ = self.authenticate(access)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_revocation_lookup_is_cached_per_process(self):
+        with mock.patch('api.authentication.cache.get', return_value=None) as cache_get:
+            self.authenticate()
+            self.authenticate()
+        self.assertEqual(cache_get.call_count, 1)
+
+        # A revocation made by another worker is seen once the local entry expires
+        cache.set(revocation_cache_key(self.user.pk), 2 ** 40)
+        self.authenticate()
+        with override_settings(JWT_REVOCATION_CHECK_TTL=0), self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_added_items_are_members(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'jti-{i}')
+
+        self.assertTrue(all(f'jti-{i}' in bloom for i in range(1000)))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+# Without the grace window, as when a replay comes after it
+@override_settings(JWT_FAST_REFRESH=True, JWT_REFRESH_GRACE_PERIOD=0)
+class FastTokenRefreshTests(TestCase):
+    url = '/api/v1/user/token/refresh/'
+
+    def setUp(self):
+        blacklist_filter.reset()
+        self.user = User.objects.create(email='student@example.com')
+        self.refresh = str(RefreshToken.for_user(self.user))
+
+    def tearDown(self):
+        blacklist_filter.reset()
+
+    def test_unseen_token_skips_blacklist_select(self):
+        blacklist_filter.bloom  # warm the filter outside the counted block
+        # outstanding token SELECT, then the blacklisted token get_or_create
+        with self.assertNumQueries(5) as queries:
+            response = self.client.post(self.url, {'refresh': self.refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('refresh', response.data)
+        # The standard check is an EXISTS joining the blacklist to outstanding tokens
+        self.assertFalse(any('INNER JOIN' in query['sql'] for query in queries.captured_queries))
+
+    def test_replayed_token_is_rejected(self):
+        self.assertEqual(self.client.post(self.url, {'refresh': self.refresh}).status_code, 200)
+        self.assertEqual(self.client.post(self.url, {'refresh': self.refresh}).status_code, 401)
+
+    def test_replay_on_a_worker_that_never_saw_the_token_is_rejected(self):
+        self.assertEqual(self.client.post(self.url, {'refresh': self.refresh}).status_code, 200)
+        blacklist_filter._bloom = BloomFilter(capacity=10, error_rate=0.01)
+
+        self.assertEqual(self.client.post(self.url, {'refresh': self.refresh}).status_code, 401)
+
+
+class RefreshGraceWindowTests(TestCase):
+    url = '/api/v1/user/token/refresh/'
+
+    def setUp(self):
+        cache.clear()
+        clear_local_revocations()
+        self.user = User.objects.create(email='student@example.com')
+        refresh = RefreshToken.for_user(self.user)
+        # Issued before any change the tests make, not in the same second
+        refresh['iat'] -= 10
+        self.refresh = str(refresh)
+
+    def test_duplicate_refresh_in_grace_window_gets_the_same_pair(self):
+        first = self.client.post(self.url, {'refresh': self.refresh})
+        with self.assertNumQueries(0):
+            second = self.client.post(self.url, {'refresh': self.refresh})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data, second.data)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=RefreshToken(self.refresh, verify=False)['jti']).exists())
+
+    def test_replay_after_grace_window_is_rejected(self):
+        self.assertEqual(self.client.post(self.url, {'refresh': self.refresh}).status_code, 200)
+        cache.delete(rotation_cache_keys(self.refresh)['result'])
+
+        self.assertEqual(self.client.post(self.url, {'refresh': self.refresh}).status_code, 401)
+
+    def test_revoked_user_cannot_refresh(self):
+        self.user.set_password('n3w-Secret-pw')
+        self.user.save()
+
+        self.assertEqual(self.client.post(self.url, {'refresh': self.refresh}).status_code, 401)
+
+
+class RotateOnceTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_callers_share_one_rotation(self):
+        calls = []
+        barrier = threading.Barrier(8)
+
+        def rotate():
+            calls.append(1)
+            time.sleep(0.05)
+            return {'access': 'a', 'refresh': f'r{len(calls)}'}
+
+        def refresh(_):
+            barrier.wait()
+            return rotate_once('token', rotate)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(refresh, range(8)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'access': 'a', 'refresh': 'r1'}] * 8)
+
+    def test_waiters_rotate_themselves_when_the_holder_fails(self):
+        barrier = threading.Barrier(4)
+        calls = []
+
+        def rotate():
+            calls.append(1)
+            time.sleep(0.05)
+            raise TokenError('Token is blacklisted')
+
+        def refresh(_):
+            barrier.wait()
+            with self.assertRaises(TokenError):
+                rotate_once('token', rotate)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(refresh, range(4)))
+
+        self.assertEqual(len(calls), 4)
+        self.assertIsNone(cache.get(rotation_cache_keys('token')['lock']))
+
+
+class ConcurrentRefreshTests(TransactionTestCase):
+    """Parallel refreshes of one token through the view, each on its own connection."""
+
+    url = '/api/v1/user/token/refresh/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='student@example.com')
+        self.refresh = str(RefreshToken.for_user(self.user))
+
+    def test_parallel_refreshes_all_succeed_with_one_rotation(self):
+        barrier = threading.Barrier(4)
+
+        def refresh(_):
+            barrier.wait()
+            try:
+                response = Client().post(self.url, {'refresh': self.refresh})
+                return response.status_code, response.json()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(refresh, range(4)))
+
+        self.assertEqual([code for code, _ in results], [200] * 4)
+        self.assertEqual(len({body['refresh'] for _, body in results}), 1)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class ProfileReadAPITests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create(email=f'student{i}@example.com', full_name=f'Student {i}') for i in range(3)]
+        access = RefreshToken.for_user(self.users[0]).access_token
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {access}'}
+
+    def get(self, url, **headers):
+        return self.client.get(url, **self.auth, **headers)
+
+    def test_matches_profile_serializer_in_one_query(self):
+        user = self.users[0]
+        # user lookup by the authentication class, then profile, user and picture in one SELECT
+        with self.assertNumQueries(2):
+            response = self.get(f'/api/v1/user/profile/{user.pk}/')
+
+        self.assertEqual(response.status_code, 200)
+        request = APIRequestFactory().get('/')
+        expected = ProfileSerializer(Profile.objects.get(user=user), context={'request': request}).data
+        self.assertEqual(response.json(), json.loads(JSONRenderer().render(expected)))
+
+    def test_emails_are_shown_only_to_their_owner_and_staff(self):
+        ids = ','.join(str(user.pk) for user in self.users[:2])
+        own, other = self.get('/api/v1/user/profile/', data={'ids': ids}).json()
+
+        self.assertEqual(own['user']['email'], 'student0@example.com')
+        self.assertNotIn('email', other['user'])
+
+        self.users[0].is_staff = True
+        self.users[0].save(update_fields=['is_staff'])
+        response = self.get(f'/api/v1/user/profile/{self.users[1].pk}/')
+        self.assertEqual(response.json()['user']['email'], 'student1@example.com')
+
+    def test_etag_depends_on_scheme_and_host(self):
+        url = f'/api/v1/user/profile/{self.users[1].pk}/'
+        etag = self.get(url)['ETag']
+
+        with override_settings(ALLOWED_HOSTS=['testserver', 'cdn.example.com']):
+            self.assertEqual(self.get(url, HTTP_HOST='cdn.example.com', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.get(url, secure=True, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_etag_depends_on_who_is_asking(self):
+        url = f'/api/v1/user/profile/{self.users[1].pk}/'
+        etag = self.get(url)['ETag']
+        owner = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.users[1]).access_token}'}
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **owner)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['email'], 'student1@example.com')
+
+    def test_bulk_read_keeps_the_requested_order(self):
+        ids = [self.users[2].pk, 999, self.users[0].pk, self.users[2].pk]
+        with self.assertNumQueries(2):
+            response = self.get('/api/v1/user/profile/', data={'ids': ','.join(map(str, ids))})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p['user']['id'] for p in response.json()], [self.users[2].pk, self.users[0].pk])
+
+    def test_matching_etag_gets_304(self):
+        url = f'/api/v1/user/profile/{self.users[1].pk}/'
+        etag = self.get(url)['ETag']
+
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(etag.startswith('W/'))
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_etag_follows_profile_and_user_versions(self):
+        url = f'/api/v1/user/profile/{self.users[1].pk}/'
+        etags = [self.get(url)['ETag']]
+
+        profile = Profile.objects.get(user=self.users[1])
+        profile.about = 'Learning Django'
+        profile.save(update_fields=['about'])
+        etags.append(self.get(url)['ETag'])
+        user = User.objects.get(pk=self.users[1].pk)
+        user.full_name = 'Renamed'
+        user.save(update_fields=['full_name'])
+        etags.append(self.get(url)['ETag'])
+
+        self.assertEqual(len(set(etags)), 3)
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etags[0]).json()['user']['full_name'], 'Renamed')
+
+    def test_errors(self):
+        self.assertEqual(self.client.get(f'/api/v1/user/profile/{self.users[1].pk}/').status_code, 401)
+        self.assertEqual(self.get('/api/v1/user/profile/999/').status_code, 404)
+        for ids in ('', 'a,b', ','.join(map(str, range(101)))):
+            self.assertEqual(self.get('/api/v1/user/profile/', data={'ids': ids}).status_code, 400)
+
+
+class PruneExpiredTokensTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        tokens = [
+            OutstandingToken(jti=f'jti-{i}', token='x', expires_at=now + timedelta(days=-1 if i < 5 else 1))
+            for i in range(8)
+        ]
+        OutstandingToken.objects.bulk_create(tokens)
+        BlacklistedToken.objects.bulk_create([BlacklistedToken(token=t) for t in OutstandingToken.objects.all()[:6]])
+
+    def test_prunes_only_expired_tokens_in_batches(self):
+        progress = list(prune_expired_tokens(batch_size=2))
+
+        self.assertEqual([p['batches'] for p in progress], [1, 2, 3, 3])
+        self.assertTrue(progress[-1]['done'])
+        self.assertEqual(progress[-1]['outstanding_deleted'], 5)
+        self.assertEqual(progress[-1]['blacklisted_deleted'], 5)
+        self.assertEqual(OutstandingToken.objects.count(), 3)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+        self.assertEqual(cache.get(PRUNE_PROGRESS_CACHE_KEY)['outstanding_deleted'], 5)
+
+    def test_max_batches_stops_early(self):
+        out = io.StringIO()
+        call_command('prune_tokens', '--batch-size', '2', '--max-batches', '1', '--pause', '0', stdout=out)
+
+        self.assertIn("Pruned 2 outstanding", out.getvalue())
+        self.assertEqual(OutstandingToken.objects.count(), 6)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    MAIL_QUEUE_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class AsyncAuthViewTests(TestCase):
+    """The /api/v2/ views, driven through the async handler and middleware chain."""
+
+    password = 'Sup3r-secret-pw'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(email='student@example.com', full_name='Student One')
+        self.user.set_password(self.password)
+        self.user.save()
+
+    async def test_token_pair_carries_custom_claims(self):
+        response = await self.async_client.post(
+            '/api/v2/user/token/', {'email': 'student@example.com', 'password': self.password},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        # Verifying a refresh token queries the blacklist, so skip it here
+        refresh = RefreshToken(response.json()['refresh'], verify=False)
+        self.assertEqual(refresh['full_name'], 'Student One')
+        self.assertTrue(await OutstandingToken.objects.filter(jti=refresh['jti']).aexists())
+        self.assertIn('X-Request-ID', response)
+
+    async def test_bad_credentials_are_rejected(self):
+        for email, password in (('student@example.com', 'wrong'), ('nobody@example.com', self.password)):
+            response = await self.async_client.post(
+                '/api/v2/user/token/', {'email': email, 'password': password}, content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 401)
+
+        response = await self.async_client.post('/api/v2/user/token/', {'email': 'student@example.com'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json())
+
+    async def test_register_creates_user_and_profile(self):
+        response = await self.async_client.post('/api/v2/user/register/', {
+            'email': 'new@example.com', 'full_name': 'New Student',
+            'password': self.password, 'password2': self.password,
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'email': 'new@example.com', 'full_name': 'New Student'})
+        user = await User.objects.aget(email='new@example.com')
+        self.assertTrue(user.check_password(self.password))
+        self.assertTrue(await Profile.objects.filter(user=user).aexists())
+
+    async def test_register_validates_like_v1(self):
+        response = await self.async_client.post('/api/v2/user/register/', {
+            'email': 'student@example.com', 'full_name': 'Again',
+            'password': self.password, 'password2': 'different',
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.json())
+
+    async def test_password_reset_is_queued_and_coalesced(self):
+        url = '/api/v2/user/password-reset/student@example.com/'
+        self.assertEqual((await self.async_client.get(url)).status_code, 202)
+        self.assertEqual((await self.async_client.get(url)).status_code, 202)
+
+        self.assertEqual(await OutboundEmail.objects.acount(), 1)
+        outbound = await OutboundEmail.objects.aget()
+        self.assertEqual(outbound.to, ['student@example.com'])
+
+    async def test_password_reset_unknown_email_and_throttle(self):
+        self.assertEqual((await self.async_client.get('/api/v2/user/password-reset/a@example.com/')).status_code, 404)
+        with mock.patch.object(PasswordResetIPThrottle, 'rate', '1/hour', create=True):
+            await self.async_client.get('/api/v2/user/password-reset/b@example.com/')
+            response = await self.async_client.get('/api/v2/user/password-reset/c@example.com/')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    async def test_register_rejects_a_password_like_the_email(self):
+        response = await self.async_client.post('/api/v2/user/register/', {
+            'email': 'marguerite@example.com', 'full_name': 'Marguerite',
+            'password': 'Marguerite1', 'password2': 'Marguerite1',
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('too similar', response.json()['password'][0])
@@ -0,0 +1,63 @@
+import hashlib
+from typing import Any, Optional
+
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """
+    Token-bucket throttle backed by Django's cache.
+
+    A rate of 'N/period' gives each key a bucket of N tokens that refills
+    continuously at N per period, so bursts up to N are allowed while the
+    sustained rate stays at N per period. Throttles run before the view
+    handler, so a rejected request never touches the database.
+    """
+
+    def allow_request(self, request: Any, view: Any) -> bool:
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        refill_per_second = self.num_requests / self.duration
+        tokens, updated = self.cache.get(self.key, (float(self.num_requests), self.now))
+        self.tokens = min(float(self.num_requests), tokens + (self.now - updated) * refill_per_second)
+
+        if self.tokens < 1:
+            return self.throttle_failure()
+        self.tokens -= 1
+        # Not atomic across workers; a race can admit a request or two extra
+        self.cache.set(self.key, (self.tokens, self.now), self.duration)
+        return True
+
+    def wait(self) -> Optional[float]:
+        """Seconds until the bucket holds a whole token again."""
+        return (1 - self.tokens) * self.duration / self.num_requests
+
+
+def hash_email(email: str) -> str:
+    """Stable, PII-free cache key fragment for an email address."""
+    return hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+
+
+class PasswordResetEmailThrottle(TokenBucketThrottle):
+    """Limits reset requests per target email address."""
+    scope = 'password_reset_email'
+
+    def get_cache_key(self, request: Any, view: Any) -> Optional[str]:
+        email = view.kwargs.get('email')
+        if not email:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': hash_email(email)}
+
+
+class PasswordResetIPThrottle(TokenBucketThrottle):
+    """Limits reset requests per client IP address."""
+    scope = 'password_reset_ip'
+
+    def get_cache_key(self, request: Any, view: Any) -> Optional[str]:
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
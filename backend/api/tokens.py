@@ -0,0 +1,16 @@
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+
+
+class ResetTokenGenerator(PasswordResetTokenGenerator):
+    """
+    Signed, time-limited password reset tokens.
+
+    Tokens are an HMAC over the user's id, password hash, last login, email and
+    issue time, so nothing is stored when one is issued and redeeming needs only
+    the user row. Changing the password changes the hash, which makes every
+    outstanding token single-use. Lifetime is `settings.PASSWORD_RESET_TIMEOUT`.
+    """
+    key_salt = "api.tokens.ResetTokenGenerator"
+
+
+reset_token_generator = ResetTokenGenerator()
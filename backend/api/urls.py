@@ -1,11 +1,13 @@
 from api import views as api_views
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
-    path('user/token/', api_views.MyTokenObtainPairView.as_view()),
-    path('user/token/refresh/', TokenRefreshView.as_view()),
-    path('user/register/', api_views.RegisterView.as_view()),
-    path('user/password-reset/<email>/', api_views.PasswordResetEmailVerifyAPIView.as_view()),
-    path('user/password-change/', api_views.PasswordChangeAPIView.as_view()),
+    path('user/token/', api_views.MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('user/token/refresh/', api_views.MyTokenRefreshView.as_view(), name='token_refresh'),
+    path('user/register/', api_views.RegisterView.as_view(), name='register'),
+    path('user/password-reset/<email>/', api_views.PasswordResetEmailVerifyAPIView.as_view(), name='password_reset'),
+    path('user/password-change/', api_views.PasswordChangeAPIView.as_view(), name='password_change'),
+    path('user/profile/image/', api_views.ProfileImageUploadView.as_view(), name='profile_image'),
+    path('user/profile/', api_views.ProfileReadView.as_view(), name='profiles'),
+    path('user/profile/<int:user_id>/', api_views.ProfileReadView.as_view(), name='profile'),
 ]
\ No newline at end of file
@@ -0,0 +1,8 @@
+from api import async_views
+from django.urls import path
+
+urlpatterns = [
+    path('user/token/', async_views.AsyncTokenObtainPairView.as_view(), name='v2_token_obtain_pair'),
+    path('user/register/', async_views.AsyncRegisterView.as_view(), name='v2_register'),
+    path('user/password-reset/<email>/', async_views.AsyncPasswordResetEmailVerifyView.as_view(), name='v2_password_reset'),
+]
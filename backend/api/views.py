@@ -1,20 +1,88 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string, get_template
-from django.utils.html import strip_tags
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.translation import gettext_lazy as _
 from api import serializer as api_serializer
-from rest_framework_simplejwt.views import TokenObtainPairView
+from api.authentication import is_token_revoked
+from api.blacklist import fast_refresh_enabled
+from api.rotation import rotate_once, rotation_grace_enabled
+from api.throttling import PasswordResetEmailThrottle, PasswordResetIPThrottle, hash_email
+from api.tokens import reset_token_generator
+from core import mail as mail_queue
+from core.email_templates import get_email_template
+from core.uploads import HashingUploadHandler
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework import generics, status
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from userauths.models import User, Profile
-from rest_framework.permissions import AllowAny
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
-from typing import Any, Tuple
-import random
+from userauths.images import InvalidImage, get_max_bytes, store_profile_image, too_large_error
+from userauths.models import User, Profile
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from typing import Any, Dict, Iterable, List, Optional
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
 
 FRONTEND_URL = getattr(settings, 'FRONTEND_URL', 'http://localhost:5173')
-OTP_LENGTH = 7
+RESET_EMAIL_TEMPLATE = 'email/password_reset.html'
+RESET_EMAIL_FIELDS = ('user.full_name', 'reset_link')
+RESET_COALESCE_WINDOW = getattr(settings, 'PASSWORD_RESET_COALESCE_WINDOW', 60)
+PROFILE_BULK_LIMIT = getattr(settings, 'PROFILE_BULK_LIMIT', 100)
+# Part of every profile ETag; bump it when the representation changes
+PROFILE_REPRESENTATION_VERSION = '1'
+
+
+def reset_pending_key(email: str) -> str:
+    """Cache key marking a reset as already issued for `email`."""
+    return f"password-reset:pending:{hash_email(email)}"
+
+
+def build_reset_link(user: User, token: str) -> str:
+    return (
+        f"{FRONTEND_URL}/create-new-password/?"
+        f"otp={token}&"
+        f"uuid={user.pk}"
+    )
+
+
+def build_reset_email(user: User, reset_link: str) -> EmailMultiAlternatives:
+    """Render the password reset email from the precompiled template."""
+    # Prepare email content
+    context = {
+        'user': user,
+        'reset_link': reset_link,
+        'frontend_url': FRONTEND_URL,
+    }
+
+    # Render from the precompiled template; the text part is prebuilt per template version
+    template = get_email_template(RESET_EMAIL_TEMPLATE, RESET_EMAIL_FIELDS)
+    html_content, text_content = template.render(context)
+    logger.debug("Reset email rendered", extra={'user_id': user.pk, 'template_version': template.version})
+
+    # Get Mailgun domain from settings
+    mailgun_domain = settings.ANYMAIL.get('MAILGUN_SENDER_DOMAIN')
+    from_email = f"Frank's LMS <mailgun@{mailgun_domain}>"
+
+    msg = EmailMultiAlternatives(
+        subject="Password Reset Request",
+        body=text_content,
+        from_email=from_email,
+        to=[user.email],
+        headers={  # Add Mailgun-specific headers
+            "X-Mailgun-Variables": {
+                "user_id": str(user.id),
+                "reset_type": "password"
+            }
+        }
+    )
+    msg.attach_alternative(html_content, "text/html")
+    return msg
 
 # Create your views here.
 
@@ -22,21 +90,54 @@ class MyTokenObtainPairView(TokenObtainPairView):
     """Custom token view that includes additional user information in the token."""
     serializer_class = api_serializer.MyTokenObtainPairSerializer
 
+class MyTokenRefreshView(TokenRefreshView):
+    """
+    Token refresh view that uses the bloom-filtered blacklist check when enabled.
+
+    Duplicate refreshes of a token that was just rotated get the same new pair
+    (api.rotation), and tokens of users whose tokens were revoked are rejected.
+    """
+
+    def get_serializer_class(self) -> Any:
+        if fast_refresh_enabled():
+            return api_serializer.FastTokenRefreshSerializer
+        return super().get_serializer_class()
+
+    def post(self, request: Any, *args: Any, **kwargs: Any) -> Response:
+        raw_token = request.data.get('refresh')
+
+        def rotate() -> Dict[str, Any]:
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            return serializer.validated_data
+
+        try:
+            if isinstance(raw_token, str) and is_token_revoked(RefreshToken(raw_token, verify=False)):
+                raise InvalidToken(_("Token has been revoked"))
+            if isinstance(raw_token, str) and rotation_grace_enabled():
+                data = rotate_once(raw_token, rotate)
+            else:
+                data = rotate()
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+
+        return Response(data, status=status.HTTP_200_OK)
+
 class RegisterView(generics.CreateAPIView):
     """View for registering new users."""
     queryset = User.objects.all()
+    # Open to anyone; a stale Bearer header from a logged-out client must not turn into a 401
+    authentication_classes = []
     permission_classes = [AllowAny]
     serializer_class = api_serializer.RegisterSerializer
 
-#Random number generator for otp
-def generate_random_otp(length: int = OTP_LENGTH) -> str:
-    """Generate a random OTP of specified length."""
-    otp = "".join([str(random.randint(0, 9)) for _ in range(length)])
-    return otp
-
 class PasswordResetEmailVerifyAPIView(generics.GenericAPIView):
     """View for initiating the password reset process."""
+    authentication_classes = []
     permission_classes = [AllowAny]
+    # The reset token signs the current password hash, so read it from the primary
+    use_primary_db = True
+    throttle_classes = [PasswordResetIPThrottle, PasswordResetEmailThrottle]
     serializer_class = api_serializer.UserSerializer
 
     def get_object(self) -> User:
@@ -44,121 +145,76 @@ class PasswordResetEmailVerifyAPIView(generics.GenericAPIView):
         email = self.kwargs.get('email')
         return User.objects.filter(email=email).first()
 
-    def send_reset_email(self, user: User, reset_link: str) -> Tuple[bool, str]:
+    def send_reset_email(self, user: User, reset_link: str) -> bool:
         """
-        Send password reset email using Anymail/Mailgun.
+        Queue the password reset email for delivery by the outbound mail worker.
         """
         try:
-            # Prepare email content
-            context = {
-                'user': user,
-                'reset_link': reset_link,
-                'frontend_url': FRONTEND_URL,
-            }
-            
-            # Debug template rendering
-            html_content = render_to_string(
-                'email/password_reset.html',
-                context
-            )
-            print("Template rendered successfully")
-            
-            text_content = strip_tags(html_content)
-            print("Text content created")
-            
-            try:
-                # Get Mailgun domain from settings
-                mailgun_domain = settings.ANYMAIL.get('MAILGUN_SENDER_DOMAIN')
-                from_email = f"Frank's LMS <mailgun@{mailgun_domain}>"
-                
-                # Create message
-                msg = EmailMultiAlternatives(
-                    subject="Password Reset Request",
-                    body=text_content,
-                    from_email=from_email,  # Use the constructed from_email
-                    to=[user.email],
-                    headers={  # Add Mailgun-specific headers
-                        "X-Mailgun-Variables": {
-                            "user_id": str(user.id),
-                            "reset_type": "password"
-                        }
-                    }
-                )
-                print(f"Email message created with from_email: {from_email}")
-                
-                msg.attach_alternative(html_content, "text/html")
-                print("HTML content attached")
-                
-                # Debug Mailgun settings
-                print(f"Mailgun API Key: {settings.ANYMAIL.get('MAILGUN_API_KEY')[:6]}...")
-                print(f"Mailgun Domain: {mailgun_domain}")
-                
-                # Send with explicit configuration
-                msg.send(fail_silently=False)
-                print("Email sent successfully")
-                return True, ""
-                
-            except Exception as email_error:
-                print(f"Email sending error: {str(email_error)}")
-                import traceback
-                print(traceback.format_exc())
-                return False, str(email_error)
-            
-        except Exception as e:
-            print(f"General error: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
-            return False, str(e)
+            msg = build_reset_email(user, reset_link)
+        except Exception:
+            logger.exception("Failed to render reset email", extra={'user_id': user.pk})
+            return False
+
+        try:
+            # Hand off to the outbound queue; `send_queued_mail` talks to Mailgun
+            outbound = mail_queue.enqueue(msg)
+            logger.debug("Reset email queued", extra={'user_id': user.pk, 'outbound_email_id': outbound.pk})
+            return True
+        except Exception:
+            logger.exception("Failed to queue reset email", extra={'user_id': user.pk})
+            return False
 
     def get(self, request: Any, *args: Any, **kwargs: Any) -> Response:
         """Handle GET request for password reset."""
+        # Coalesce repeated requests for the same email into the reset already issued
+        pending_key = reset_pending_key(self.kwargs.get('email', ''))
+        if not cache.add(pending_key, True, RESET_COALESCE_WINDOW):
+            return Response({
+                "message": "Password reset instructions will be sent to your email.",
+                "email": self.kwargs.get('email')
+            }, status=status.HTTP_202_ACCEPTED)
+
         try:
             user = self.get_object()
             
             if not user:
+                cache.delete(pending_key)
                 return Response(
                     {"error": "No user found with this email address."},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            # Generate tokens and OTP
-            refresh = RefreshToken.for_user(user)
-            user.otp = generate_random_otp()
-            user.save()
+            # Signed reset token; nothing is written until the token is redeemed
+            token = reset_token_generator.make_token(user)
 
             # Create reset link
-            reset_link = (
-                f"{FRONTEND_URL}/create-new-password/?"
-                f"otp={user.otp}&"
-                f"uuid={user.pk}&"
-                f"refresh_token={str(refresh.access_token)}"
-            )
-
-            # Send email with detailed error handling
-            email_sent, error_message = self.send_reset_email(user, reset_link)
-            print(f"Email sending result: {email_sent}, Error: {error_message}")
+            reset_link = build_reset_link(user, token)
+
+            # Queue email with detailed error handling
+            email_queued = self.send_reset_email(user, reset_link)
             
-            if email_sent:
+            if email_queued:
                 return Response({
-                    "message": "Password reset instructions have been sent to your email.",
+                    "message": "Password reset instructions will be sent to your email.",
                     "email": user.email
-                }, status=status.HTTP_200_OK)
+                }, status=status.HTTP_202_ACCEPTED)
             else:
+                cache.delete(pending_key)
                 return Response({
-                    "error": f"Failed to send reset email: {error_message}"
+                    "error": "Failed to queue reset email. Please try again."
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        except Exception as e:
-            print(f"View error: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
+        except Exception:
+            cache.delete(pending_key)
+            logger.exception("Password reset request failed")
             return Response({
-                "error": f"Failed to process reset request: {str(e)}"
+                "error": "Failed to process reset request. Please try again."
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class PasswordChangeAPIView(generics.GenericAPIView):
-    """View for changing password using OTP."""
+    """View for changing password using a signed reset token."""
     serializer_class = api_serializer.UserSerializer
+    authentication_classes = []
     permission_classes = [AllowAny]
 
     def post(self, request: Any, *args: Any, **kwargs: Any) -> Response:
@@ -175,24 +231,138 @@ class PasswordChangeAPIView(generics.GenericAPIView):
                     "error": "Missing required fields"
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Get user and validate OTP
+            # Get user and validate the signed reset token
             try:
-                user = get_object_or_404(User, id=uuid, otp=otp)
-            except User.DoesNotExist:
+                user = User.objects.filter(pk=uuid).first()
+            except (TypeError, ValueError):
+                user = None
+            if user is None or not reset_token_generator.check_token(user, otp):
                 return Response({
                     "error": "Invalid reset token or OTP"
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            # Change password and clear OTP
+            # Changing the password invalidates the token
             user.set_password(password)
-            user.otp = ""
-            user.save()
+            user.save(update_fields=['password'])
 
             return Response({
                 "message": "Password changed successfully"
             }, status=status.HTTP_200_OK)
 
-        except Exception as e:
+        except Exception:
+            logger.exception("Password change failed")
             return Response({
                 "error": "Failed to change password. Please try again."
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+class ProfileImageUploadView(generics.GenericAPIView):
+    """
+    Sets the authenticated user's profile picture from a multipart `image` upload.
+
+    The upload is spooled to disk and hashed as it streams in, and cut off
+    once it passes PROFILE_IMAGE_MAX_BYTES. It is then stored
+    content-addressed; resized variants follow from `process_profile_images`.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    serializer_class = api_serializer.ProfileImageSerializer
+
+    def initialize_request(self, request: Any, *args: Any, **kwargs: Any) -> Any:
+        # Must be set before anything reads the body
+        self.upload_handler = HashingUploadHandler(request, max_bytes=get_max_bytes())
+        request.upload_handlers = [self.upload_handler]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def post(self, request: Any, *args: Any, **kwargs: Any) -> Response:
+        upload = request.FILES.get('image')
+        if self.upload_handler.exceeded:
+            return Response({"image": [str(too_large_error(get_max_bytes()))]}, status=status.HTTP_400_BAD_REQUEST)
+        if upload is None:
+            return Response({"image": ["No file was submitted."]}, status=status.HTTP_400_BAD_REQUEST)
+
+        profile, _ = Profile.objects.get_or_create(user=request.user)
+        try:
+            image = store_profile_image(profile, upload)
+        except InvalidImage as error:
+            return Response({"image": [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        response_status = status.HTTP_200_OK if image.status == image.STATUS_READY else status.HTTP_202_ACCEPTED
+        return Response(self.get_serializer(image).data, status=response_status)
+
+
+def profile_etag(profiles: Iterable[Profile], serializer: api_serializer.FastProfileSerializer) -> str:
+    """
+    Strong ETag from the row versions of the profiles and of their users and
+    pictures, and from what else `serializer` puts in the body: the scheme
+    and host of its absolute URLs and whether each user's email is shown.
+    """
+    digest = hashlib.sha256(PROFILE_REPRESENTATION_VERSION.encode())
+    if serializer.request is not None:
+        digest.update(f"{serializer.request.build_absolute_uri('/')};".encode())
+    for profile in profiles:
+        image = profile.image_asset
+        digest.update(
+            f"{profile.pk}:{profile.updated.isoformat()}:{profile.user.updated.isoformat()}:"
+            f"{image.digest if image else ''}:{image.status if image else ''}:"
+            f"{serializer.shows_email(profile.user):d};".encode()
+        )
+    return '"%s"' % digest.hexdigest()[:32]
+
+
+class ProfileReadView(generics.GenericAPIView):
+    """
+    Profiles by user id: one at `user/profile/<user_id>/`, several at
+    `user/profile/?ids=1,2,3` (in the requested order; unknown ids are left out).
+
+    Any authenticated user can read profiles, but emails are only shown to
+    their owner and to staff (with stateless JWT authentication, staff is
+    whatever the token's `is_staff` claim says, so by default no one).
+
+    Profiles are read with their user and picture in one query and serialized
+    by FastProfileSerializer. The strong ETag only depends on row versions, the
+    host and on who is asking, so a matching If-None-Match is answered with a 304
+    before serializing anything.
+    """
+    permission_classes = [IsAuthenticated]
+    queryset = Profile.objects.select_related('user', 'image_asset')
+    # Describes the representation in the API docs; responses use FastProfileSerializer
+    serializer_class = api_serializer.ProfileSerializer
+
+    def get(self, request: Any, user_id: Optional[int] = None) -> Any:
+        if user_id is not None:
+            profile = self.get_queryset().filter(user_id=user_id).first()
+            if profile is None:
+                return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+            profiles = [profile]
+        else:
+            try:
+                ids = self.parse_ids(request.query_params.get('ids', ''))
+            except ValueError as error:
+                return Response({"ids": [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+            found = {profile.user_id: profile for profile in self.get_queryset().filter(user_id__in=ids)}
+            profiles = [found[pk] for pk in ids if pk in found]
+
+        serializer = api_serializer.FastProfileSerializer(request)
+        etag = profile_etag(profiles, serializer)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            data = [serializer.to_representation(profile) for profile in profiles]
+            response = Response(data[0] if user_id is not None else data)
+        response['ETag'] = etag
+        # Revalidate every time; the ETag makes that cheap
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @staticmethod
+    def parse_ids(value: str) -> List[int]:
+        message = "Expected a comma-separated list of user ids."
+        try:
+            ids = list(dict.fromkeys(int(pk) for pk in value.split(',') if pk.strip()))
+        except ValueError:
+            raise ValueError(message) from None
+        if not ids:
+            raise ValueError(message)
+        if len(ids) > PROFILE_BULK_LIMIT:
+            raise ValueError(f"At most {PROFILE_BULK_LIMIT} ids can be requested at once.")
+        return ids
@@ -14,34 +14,40 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
-
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Frank LMS API",
-        default_version='v1',
-        description="Frank LMS API",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="f.kinuthia01@gmail.com"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
 
-urlpatterns = [
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path("", schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+from core import views as core_views
 
-    path('admin/', admin.site.urls),
+urlpatterns = [
+    path('health/', core_views.health, name='health'),
+    path('metrics', core_views.metrics, name='metrics'),
+    path('diagnostics/memory', core_views.memory_diagnostics, name='memory_diagnostics'),
     path('api/v1/', include('api.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) \
-  + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+    path('api/v2/', include('api.urls_v2')),
+    # Static files are answered by core.static.StaticFilesMiddleware before URL resolution
+    re_path(rf'^{settings.MEDIA_URL.strip("/")}/(?P<path>.+)$', core_views.media, name='media'),
+]
+
+# API-only workers (WORKER_PROFILE=api) don't install these apps or import their views
+if not settings.API_ONLY:
+    from django.contrib import admin
+    from rest_framework import permissions
+    from drf_yasg.views import get_schema_view
+
+    from core.openapi import API_INFO
+
+    # Only renders the UI pages; they load the cached schema from `schema-json` (SWAGGER_SETTINGS["SPEC_URL"])
+    schema_view = get_schema_view(
+        API_INFO,
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+
+    urlpatterns += [
+        path('swagger<format>/', core_views.openapi_schema, name='schema-json'),
+        path("", schema_view.with_ui('swagger', cache_timeout=settings.OPENAPI_UI_CACHE_TIMEOUT), name='schema-swagger-ui'),
+        path('redoc/', schema_view.with_ui('redoc', cache_timeout=settings.OPENAPI_UI_CACHE_TIMEOUT), name='schema-redoc'),
+
+        path('admin/', admin.site.urls),
+    ]
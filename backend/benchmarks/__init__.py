@@ -0,0 +1,78 @@
+"""
+Micro-benchmarks for hot paths in the backend.
+
+Run them from the backend directory, e.g. ``python -m benchmarks.email_render``.
+"""
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Sequence
+
+
+def setup_django() -> None:
+    """Configure Django for a standalone benchmark script."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database() -> Iterator[None]:
+    """Run the block against a throwaway test database and caches, as the test runner does."""
+    from django.db import connection
+    from django.test import override_settings
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    from core.testing import isolated_caches
+
+    setup_test_environment()
+    # Throttle buckets and locks would otherwise outlive the run in the configured cache
+    cache_dir = tempfile.TemporaryDirectory()
+    caches = override_settings(CACHES=isolated_caches(cache_dir.name))
+    caches.enable()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        caches.disable()
+        cache_dir.cleanup()
+        teardown_test_environment()
+
+
+def measure(fn: Callable[[], Any], iterations: int, repeat: int = 3) -> Dict[str, float]:
+    """Time `iterations` calls of `fn`, best of `repeat` runs."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        runs.append(time.perf_counter() - start)
+    best = min(runs)
+    return {
+        'iterations': iterations,
+        'best_s': best,
+        'median_s': statistics.median(runs),
+        'per_call_us': best / iterations * 1e6,
+        'per_second': iterations / best,
+    }
+
+
+def percentiles(samples: Sequence[float], points: Sequence[int] = (50, 95, 99)) -> Dict[str, float]:
+    """Nearest-rank percentiles of `samples`, keyed 'p50', 'p95', ..."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {f'p{point}': 0.0 for point in points}
+    return {
+        f'p{point}': ordered[min(len(ordered) - 1, max(0, -(-point * len(ordered) // 100) - 1))]
+        for point in points
+    }
+
+
+def report(name: str, result: Dict[str, float]) -> None:
+    print(
+        f"{name:<32} {result['per_call_us']:>10.2f} us/call "
+        f"{result['per_second']:>12.0f} calls/s  (best of {result['iterations']} iterations)"
+    )
@@ -0,0 +1,239 @@
+"""
+Load test for the /api/v1/user/* endpoints.
+
+Starts a threaded WSGI server in-process against a throwaway database and
+drives token, refresh, register, password-reset and password-change with
+`--concurrency` parallel clients. Latency percentiles and throughput for
+each endpoint are written to `--output`, then compared with a stored
+baseline; the run exits non-zero when an endpoint regresses past
+`--tolerance`.
+
+The database comes from DATABASE_URL as usual, so point it at a local
+Postgres to benchmark that instead of SQLite. Outbound mail is delivered
+with the locmem backend, password reset throttles are lifted, and a cheap
+password hasher is used unless --real-hasher is passed.
+
+    python -m benchmarks.api_load --requests 500 --concurrency 8
+    python -m benchmarks.api_load --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from benchmarks import percentiles, setup_django, test_database
+
+API_PREFIX = '/api/v1/user'
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baselines' / 'api_load.json'
+PASSWORD = 'Load-test-passw0rd'
+LOCMEM_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# (method, path, JSON body) for one request
+Call = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+def start_server() -> Any:
+    """Serve the project's WSGI application on a free local port in a background thread."""
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler, allow_reuse_address=False)
+    server.set_app(get_internal_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def send(base_url: str, call: Call) -> Tuple[float, int, Any]:
+    """Make one request and return (seconds, status code, decoded JSON body)."""
+    method, path, body = call
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(
+        base_url + path, data=data, method=method, headers={'Content-Type': 'application/json'},
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            status, content = response.status, response.read()
+    except urllib.error.HTTPError as error:
+        status, content = error.code, error.read()
+    elapsed = time.perf_counter() - start
+    try:
+        payload = json.loads(content) if content else None
+    except ValueError:
+        payload = None
+    return elapsed, status, payload
+
+
+def run_scenario(base_url: str, calls: Sequence[Call], concurrency: int, expected: int) -> Tuple[Dict[str, float], List[Any]]:
+    """Send `calls` with `concurrency` clients and summarise latency and throughput."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda call: send(base_url, call), calls))
+    wall = time.perf_counter() - started
+
+    latencies = [elapsed * 1000 for elapsed, _, _ in results]
+    summary = {
+        'requests': len(results),
+        'errors': sum(1 for _, status, _ in results if status != expected),
+        'throughput_rps': round(len(results) / wall, 1) if wall else 0.0,
+    }
+    summary.update({f'{name}_ms': round(value, 2) for name, value in percentiles(latencies).items()})
+    return summary, [payload for _, _, payload in results]
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return a description of every endpoint that regressed past `tolerance`."""
+    regressions = []
+    for name, base in baseline.get('scenarios', {}).items():
+        current = results['scenarios'].get(name)
+        if current is None:
+            continue
+        if current['errors']:
+            regressions.append(f"{name}: {current['errors']} failed requests")
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = base[metric] * (1 + tolerance)
+            if current[metric] > limit:
+                regressions.append(f"{name}: {metric} {current[metric]:.2f} > {limit:.2f} (baseline {base[metric]:.2f})")
+        floor = base['throughput_rps'] * (1 - tolerance)
+        if current['throughput_rps'] < floor:
+            regressions.append(
+                f"{name}: throughput {current['throughput_rps']:.1f} < {floor:.1f} req/s "
+                f"(baseline {base['throughput_rps']:.1f})"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint.")
+    parser.add_argument('--concurrency', type=int, default=8, help="Parallel clients.")
+    parser.add_argument('--output', default='api_load_results.json', help="Where to write the results.")
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown, as a fraction of the baseline.")
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the new baseline.")
+    parser.add_argument('--real-hasher', action='store_true')
+    args = parser.parse_args()
+
+    # Read by settings at import; the load would otherwise be throttled after a few resets
+    os.environ['PASSWORD_RESET_EMAIL_RATE'] = '1000000/s'
+    os.environ['PASSWORD_RESET_IP_RATE'] = '1000000/s'
+    setup_django()
+    from django.db import connection
+    from django.test import override_settings
+
+    from api.tokens import reset_token_generator
+    from userauths.models import Profile, User
+
+    overrides: Dict[str, Any] = {
+        'EMAIL_BACKEND': LOCMEM_BACKEND,
+        'MAIL_QUEUE_DELIVERY_BACKEND': LOCMEM_BACKEND,
+        'ALLOWED_HOSTS': ['127.0.0.1', 'localhost'],
+    }
+    if not args.real_hasher:
+        overrides['PASSWORD_HASHERS'] = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+    # The server's threads need a database file they can all open; in-memory SQLite is per connection
+    workdir = tempfile.TemporaryDirectory()
+    if connection.vendor == 'sqlite':
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(workdir.name, 'api_load.sqlite3')
+
+    n = args.requests
+    with workdir, test_database(), override_settings(**overrides):
+        users = [User(email=f'load{i}@example.com', username=f'load{i}', full_name=f'Load {i}') for i in range(n)]
+        users[0].set_password(PASSWORD)
+        for user in users:
+            user.password = users[0].password
+        User.objects.bulk_create(users)
+        users = list(User.objects.filter(email__startswith='load').order_by('pk'))
+        Profile.objects.bulk_create([Profile(user=user, full_name=user.full_name) for user in users])
+
+        server = start_server()
+        base_url = f'http://127.0.0.1:{server.server_port}{API_PREFIX}'
+        scenarios: Dict[str, Dict[str, float]] = {}
+        try:
+            scenarios['token'], tokens = run_scenario(base_url, [
+                ('POST', '/token/', {'email': user.email, 'password': PASSWORD}) for user in users
+            ], args.concurrency, 200)
+
+            scenarios['refresh'], _ = run_scenario(base_url, [
+                ('POST', '/token/refresh/', {'refresh': (payload or {}).get('refresh', '')}) for payload in tokens
+            ], args.concurrency, 200)
+
+            scenarios['register'], _ = run_scenario(base_url, [
+                ('POST', '/register/', {
+                    'email': f'new{i}@example.com', 'full_name': f'New {i}',
+                    'password': PASSWORD, 'password2': PASSWORD,
+                }) for i in range(n)
+            ], args.concurrency, 201)
+
+            scenarios['password_reset'], _ = run_scenario(base_url, [
+                ('GET', f'/password-reset/{user.email}/', None) for user in users
+            ], args.concurrency, 202)
+
+            scenarios['password_change'], _ = run_scenario(base_url, [
+                ('POST', '/password-change/', {
+                    'otp': reset_token_generator.make_token(user), 'uuidb64': user.pk, 'password': PASSWORD + '!',
+                }) for user in users
+            ], args.concurrency, 200)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    results = {
+        'meta': {
+            'database': connection.vendor,
+            'requests': n,
+            'concurrency': args.concurrency,
+            'hasher': 'real' if args.real_hasher else 'md5',
+            'python': platform.python_version(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'scenarios': scenarios,
+    }
+    Path(args.output).write_text(json.dumps(results, indent=2) + '\n')
+
+    print(f"{'endpoint':<18}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, summary in scenarios.items():
+        print(
+            f"{name:<18}{summary['throughput_rps']:>10.1f}{summary['p50_ms']:>10.2f}"
+            f"{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}{summary['errors']:>8}"
+        )
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2) + '\n')
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.")
+        return
+    baseline = json.loads(args.baseline.read_text())
+    keys = ('database', 'requests', 'concurrency', 'hasher')
+    if any(baseline['meta'].get(key) != results['meta'][key] for key in keys):
+        print("Warning: baseline was recorded with different settings: "
+              + ', '.join(f"{key}={baseline['meta'].get(key)}" for key in keys))
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("Regressions against the baseline:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"No regressions against the baseline (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == '__main__':
+    main()
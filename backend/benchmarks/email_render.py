@@ -0,0 +1,48 @@
+"""
+Compare the old render_to_string + strip_tags path with the precompiled template.
+
+    python -m benchmarks.email_render --renders 10000
+"""
+import argparse
+
+from benchmarks import measure, report, setup_django
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--renders', type=int, default=10000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.template.loader import render_to_string
+    from django.utils.html import strip_tags
+
+    from api.views import RESET_EMAIL_FIELDS, RESET_EMAIL_TEMPLATE
+    from core.email_templates import get_email_template
+    from userauths.models import User
+
+    user = User(pk=1, email='student@example.com', full_name='Student One')
+    context = {
+        'user': user,
+        'reset_link': 'http://localhost:5173/create-new-password/?otp=123456&uuid=1',
+        'frontend_url': 'http://localhost:5173',
+    }
+
+    def old_path():
+        html = render_to_string(RESET_EMAIL_TEMPLATE, context)
+        return html, strip_tags(html)
+
+    def new_path():
+        return get_email_template(RESET_EMAIL_TEMPLATE, RESET_EMAIL_FIELDS).render(context)
+
+    assert old_path() == new_path(), "precompiled output differs from render_to_string"
+
+    old = measure(old_path, args.renders)
+    new = measure(new_path, args.renders)
+    report('render_to_string + strip_tags', old)
+    report('precompiled template', new)
+    print(f"speedup: {old['best_s'] / new['best_s']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+JSON rendering and parsing cost per endpoint: DRF's JSONRenderer/JSONParser
+against the orjson-based ones in core.renderers and core.parsers.
+
+Each endpoint's response is built the way its view builds it (serializers
+run once, outside the timing), then rendered; request bodies are parsed.
+Output is checked to be identical before anything is timed.
+
+    python -m benchmarks.json_rendering --iterations 20000
+"""
+import argparse
+import io
+from typing import Any, Callable, Dict, Tuple
+
+from benchmarks import measure, setup_django
+
+
+def build_payloads() -> Tuple[Dict[str, Any], Dict[str, bytes]]:
+    """(responses, request bodies) keyed by endpoint."""
+    from django.utils import timezone
+    from rest_framework_simplejwt.settings import api_settings
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from api import serializer as api_serializer
+    from userauths.models import Profile, ProfileImage, User
+
+    users = [
+        User(pk=i, email=f'student{i}@example.com', username=f'student{i}', full_name=f'Student {i}')
+        for i in range(1, 101)
+    ]
+    image = ProfileImage(
+        digest='ab' * 32, original='images/ab/original.jpg', width=1200, height=900,
+        status=ProfileImage.STATUS_READY,
+        variants={size: {fmt: {'name': f'images/ab/{size}.{fmt}'} for fmt in ('webp', 'jpeg')}
+                  for size in ('thumb', 'small', 'medium')},
+    )
+    profiles = [
+        Profile(pk=user.pk, user=user, full_name=user.full_name, country='Kenya',
+                about='Learning Django. ' * 10, date=timezone.now(), image_asset=image if user.pk % 2 else None)
+        for user in users
+    ]
+    # Same claims as MyTokenObtainPairSerializer.get_token, without recording an outstanding token
+    token = RefreshToken()
+    token[api_settings.USER_ID_CLAIM] = users[0].pk
+    for claim in ('full_name', 'email', 'username'):
+        token[claim] = getattr(users[0], claim)
+    pair = {'refresh': str(token), 'access': str(token.access_token)}
+
+    responses = {
+        'POST user/token/': pair,
+        'POST user/token/refresh/': pair,
+        'POST user/register/': api_serializer.RegisterSerializer(users[0]).data,
+        'GET user/password-reset/': {
+            'message': "Password reset instructions will be sent to your email.", 'email': users[0].email,
+        },
+        'POST user/profile/image/': api_serializer.ProfileImageSerializer(image).data,
+        'ProfileSerializer': api_serializer.ProfileSerializer(profiles[0]).data,
+        'ProfileSerializer, 100 profiles': api_serializer.ProfileSerializer(profiles, many=True).data,
+    }
+    bodies = {
+        'POST user/token/': b'{"email": "student1@example.com", "password": "Sup3r-secret-pw"}',
+        'POST user/token/refresh/': b'{"refresh": "%s"}' % pair['refresh'].encode(),
+        'POST user/register/': (
+            b'{"email": "student1@example.com", "full_name": "Student 1", '
+            b'"password": "Sup3r-secret-pw", "password2": "Sup3r-secret-pw"}'
+        ),
+    }
+    return responses, bodies
+
+
+def compare(old: Callable[[], Any], new: Callable[[], Any], iterations: int) -> Tuple[float, float, float]:
+    """(old us/call, new us/call, speedup)"""
+    old_result = measure(old, iterations)
+    new_result = measure(new, iterations)
+    return old_result['per_call_us'], new_result['per_call_us'], old_result['best_s'] / new_result['best_s']
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000, help="Calls per measurement; divided by 100 for lists.")
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+
+    from core.parsers import FastJSONParser
+    from core.renderers import FastJSONRenderer
+
+    responses, bodies = build_payloads()
+    json_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+    json_parser, fast_parser = JSONParser(), FastJSONParser()
+
+    print(f"{'':<40}{'stdlib us':>11}{'orjson us':>11}{'speedup':>9}{'bytes':>9}")
+
+    def report(name: str, size: int, timings: Tuple[float, float, float]) -> None:
+        old_us, new_us, speedup = timings
+        print(f"{name:<40}{old_us:>11.2f}{new_us:>11.2f}{speedup:>8.1f}x{size:>9}")
+
+    for endpoint, data in responses.items():
+        rendered = json_renderer.render(data)
+        assert fast_renderer.render(data) == rendered, f"{endpoint}: output differs from JSONRenderer"
+        iterations = max(1, args.iterations // 100) if isinstance(data, list) else args.iterations
+        report('render ' + endpoint, len(rendered), compare(
+            lambda: json_renderer.render(data), lambda: fast_renderer.render(data), iterations,
+        ))
+    for endpoint, body in bodies.items():
+        assert fast_parser.parse(io.BytesIO(body)) == json_parser.parse(io.BytesIO(body))
+        report('parse ' + endpoint, len(body), compare(
+            lambda: json_parser.parse(io.BytesIO(body)), lambda: fast_parser.parse(io.BytesIO(body)), args.iterations,
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Requests/sec for issuing and redeeming signed password reset tokens.
+
+Drives the real endpoints through the test client against a throwaway
+database. A cheap password hasher is used by default so the numbers show
+the request and database cost rather than PBKDF2; pass --real-hasher to
+include it.
+
+    python -m benchmarks.password_reset --requests 2000
+"""
+import argparse
+import os
+import time
+
+from benchmarks import measure, report, setup_django, test_database
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--real-hasher', action='store_true')
+    args = parser.parse_args()
+
+    # Read by settings at import; every request would be throttled after the first 20
+    os.environ['PASSWORD_RESET_EMAIL_RATE'] = '1000000/s'
+    os.environ['PASSWORD_RESET_IP_RATE'] = '1000000/s'
+    setup_django()
+    from django.test import Client, override_settings
+
+    from api.tokens import reset_token_generator
+    from userauths.models import User
+
+    hashers = {} if args.real_hasher else {
+        'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+    }
+    with test_database(), override_settings(**hashers):
+        client = Client()
+        users = [User(email=f'student{i}@example.com', username=f'student{i}') for i in range(args.requests)]
+        for user in users:
+            user.set_password('old-password')
+        User.objects.bulk_create(users)
+        users = list(User.objects.order_by('pk'))
+
+        report('token make_token', measure(lambda: reset_token_generator.make_token(users[0]), args.requests))
+        token = reset_token_generator.make_token(users[0])
+        report('token check_token', measure(lambda: reset_token_generator.check_token(users[0], token), args.requests))
+
+        start = time.perf_counter()
+        for user in users:
+            response = client.get(f'/api/v1/user/password-reset/{user.email}/')
+            assert response.status_code == 202, response.content
+        issue = time.perf_counter() - start
+
+        tokens = [reset_token_generator.make_token(user) for user in users]
+        start = time.perf_counter()
+        for user, token in zip(users, tokens):
+            response = client.post('/api/v1/user/password-change/', {
+                'otp': token, 'uuidb64': user.pk, 'password': 'new-password',
+            })
+            assert response.status_code == 200, response.content
+        redeem = time.perf_counter() - start
+
+    print(f"issue  (GET password-reset):   {args.requests / issue:>8.0f} req/s")
+    print(f"redeem (POST password-change): {args.requests / redeem:>8.0f} req/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Password validation cost per registration: Django's validators against the
+indexed common-password and count-based similarity validators.
+
+Startup is the cost of the first validation in a fresh worker (Django
+decompresses its password list; the index file is memory-mapped). Per
+registration is `validate_password` with the new user, as RegisterSerializer
+calls it.
+
+    python -m benchmarks.password_validation --validations 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks import measure, report, setup_django
+
+DJANGO_VALIDATORS = [
+    {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+     'OPTIONS': {'user_attributes': ('username', 'full_name', 'email')}},
+    {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
+    {'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator'},
+    {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--validations', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.password_validation import get_password_validators
+    from django.core.exceptions import ValidationError
+    from django.test import override_settings
+
+    from core.password_validation import clear_indexes, write_index, read_password_list, DEFAULT_PASSWORD_LIST_PATH
+    from userauths.models import User
+
+    users = [
+        User(username=f'student{i}', full_name=f'Student Number {i}', email=f'student.number{i}@example.com')
+        for i in range(100)
+    ]
+    # A mix of accepted passwords, common ones and ones too close to the user
+    passwords = ['Tr0ub4dor-&-3', 'password1', 'studentnumber', 'correct horse battery', 'qwerty123']
+
+    def validate_all(validators):
+        def run():
+            for user in users:
+                for password in passwords:
+                    for validator in validators:
+                        try:
+                            validator.validate(password, user)
+                        except ValidationError:
+                            pass
+        return run
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        index_path = os.path.join(tmpdir, 'common-passwords.idx')
+        write_index(read_password_list(DEFAULT_PASSWORD_LIST_PATH), index_path)
+
+        with override_settings(COMMON_PASSWORDS_INDEX=index_path):
+            for name, config in (('django', DJANGO_VALIDATORS), ('indexed', settings.AUTH_PASSWORD_VALIDATORS)):
+                clear_indexes()
+                start = time.perf_counter()
+                # Django loads its list here; the index is mapped on the first lookup
+                for validator in get_password_validators(config):
+                    try:
+                        validator.validate(passwords[0], users[0])
+                    except ValidationError:
+                        pass
+                print(f"{name + ' startup':<32} {(time.perf_counter() - start) * 1000:>10.2f} ms")
+
+            per_run = len(users) * len(passwords)
+            iterations = max(1, args.validations // per_run)
+            results = {}
+            for name, config in (('django', DJANGO_VALIDATORS), ('indexed', settings.AUTH_PASSWORD_VALIDATORS)):
+                result = measure(validate_all(get_password_validators(config)), iterations)
+                result['per_call_us'] /= per_run
+                result['per_second'] *= per_run
+                result['iterations'] *= per_run
+                results[name] = result
+                report(f'{name} per registration', result)
+
+    print(f"speedup: {results['django']['best_s'] / results['indexed']['best_s']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
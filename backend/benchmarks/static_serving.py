@@ -0,0 +1,138 @@
+"""
+Throughput of static and media serving.
+
+Compares the previous setup, where `django.views.static.serve` streamed
+files through the URL resolver and the whole middleware stack, with
+core.static: StaticFilesMiddleware serving collected, precompressed files
+near the top of the stack, and media handed to the front proxy with
+X-Accel-Redirect. For the hand-off only the Django side is measured; the
+proxy then sends the bytes itself.
+
+The in-process server has no sendfile(), so the middleware numbers are a
+lower bound; under gunicorn FileResponse goes through its `wsgi.file_wrapper`.
+
+    python -m benchmarks.static_serving --requests 200 --concurrency 4
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from benchmarks import percentiles, setup_django
+
+WORDS = ('function', 'return', 'const', 'let', 'this', 'value', 'props', 'state', 'render', 'async')
+
+
+def make_asset(size: int, seed: int = 1) -> bytes:
+    """Source-like text that compresses about as well as real bundles."""
+    rng = random.Random(seed)
+    chunks: List[str] = []
+    total = 0
+    while total < size:
+        line = ' '.join(rng.choice(WORDS) + str(rng.randrange(1000)) for _ in range(8)) + ';\n'
+        chunks.append(line)
+        total += len(line)
+    return ''.join(chunks).encode()[:size]
+
+
+def fetch(url: str, headers: Dict[str, str]) -> Tuple[float, int]:
+    """Return (seconds, body bytes) for one GET."""
+    request = urllib.request.Request(url, headers=headers)
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=30) as response:
+        size = len(response.read())
+    return time.perf_counter() - start, size
+
+
+def run(url: str, headers: Dict[str, str], requests: int, concurrency: int) -> Dict[str, float]:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: fetch(url, headers), range(requests)))
+    wall = time.perf_counter() - started
+    transferred = sum(size for _, size in results)
+    summary = {
+        'req_per_s': requests / wall,
+        'mb_per_s': transferred / wall / 1e6,
+        'bytes_per_request': transferred / requests,
+    }
+    summary.update({name: value * 1000 for name, value in percentiles([elapsed for elapsed, _ in results]).items()})
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help="Requests per scenario.")
+    parser.add_argument('--concurrency', type=int, default=4, help="Parallel clients.")
+    parser.add_argument('--size-kb', type=int, default=512, help="Size of the asset served.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from django.test import override_settings
+    from django.urls import include, path, re_path
+    from django.views.static import serve
+
+    from benchmarks.api_load import start_server
+
+    workdir = tempfile.mkdtemp()
+    source, static_root, media_root = (os.path.join(workdir, name) for name in ('source', 'static', 'media'))
+    os.makedirs(os.path.join(source, 'js'))
+    os.makedirs(os.path.join(media_root, 'images', 'ab'))
+    with open(os.path.join(source, 'js', 'app.js'), 'wb') as f:
+        f.write(make_asset(args.size_kb * 1024))
+    with open(os.path.join(media_root, 'images', 'ab', 'avatar.webp'), 'wb') as f:
+        f.write(os.urandom(args.size_kb * 1024))
+
+    class URLs:
+        # The project's routes plus the static() route urls.py used to append
+        urlpatterns = [
+            re_path(r'^legacy-static/(?P<path>.*)$', serve, {'document_root': static_root}),
+            path('', include('backend.urls')),
+        ]
+
+    overrides: Dict[str, Any] = {
+        'ROOT_URLCONF': URLs,
+        'STATIC_ROOT': static_root,
+        'STATICFILES_DIRS': [source],
+        'STATICFILES_FINDERS': ['django.contrib.staticfiles.finders.FileSystemFinder'],
+        'MEDIA_ROOT': media_root,
+        'MEDIA_SENDFILE': 'x-accel-redirect',
+        'ALLOWED_HOSTS': ['127.0.0.1', 'localhost'],
+    }
+    try:
+        with override_settings(**overrides):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            from django.contrib.staticfiles.storage import staticfiles_storage
+            hashed = staticfiles_storage.stored_name('js/app.js')
+
+            server = start_server()
+            base_url = f'http://127.0.0.1:{server.server_port}'
+            scenarios = {
+                'django.views.static.serve': (f'/legacy-static/{hashed}', {}),
+                'middleware, identity': (f'/static/{hashed}', {}),
+                'middleware, gzip': (f'/static/{hashed}', {'Accept-Encoding': 'gzip'}),
+                'middleware, br or gzip': (f'/static/{hashed}', {'Accept-Encoding': 'br, gzip'}),
+                'media, X-Accel-Redirect': ('/media/images/ab/avatar.webp', {}),
+            }
+            try:
+                print(f"{'scenario':<28}{'req/s':>10}{'MB/s':>10}{'KB/req':>10}{'p50 ms':>10}{'p95 ms':>10}")
+                for name, (url, headers) in scenarios.items():
+                    summary = run(base_url + url, headers, args.requests, args.concurrency)
+                    print(
+                        f"{name:<28}{summary['req_per_s']:>10.1f}{summary['mb_per_s']:>10.1f}"
+                        f"{summary['bytes_per_request'] / 1024:>10.1f}{summary['p50']:>10.2f}{summary['p95']:>10.2f}"
+                    )
+            finally:
+                server.shutdown()
+                server.server_close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Refresh-token latency against a large token blacklist, before and after pruning.
+
+Seeds `--rows` outstanding tokens (half of them expired, all blacklisted), then
+times POST /api/v1/user/token/refresh/. Runs the incremental pruner and times
+it again. Compare e.g. --rows 1000000 with --rows 10000000.
+
+    python -m benchmarks.token_refresh --rows 1000000
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from benchmarks import percentiles, setup_django, test_database
+
+SEED_BATCH = 10000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--refreshes', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from django.utils import timezone
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from api.blacklist import prune_expired_tokens
+    from userauths.models import User
+
+    with test_database():
+        user = User.objects.create(email='student@example.com')
+        client = Client()
+
+        now = timezone.now()
+        start = time.perf_counter()
+        for offset in range(0, args.rows, SEED_BATCH):
+            count = min(SEED_BATCH, args.rows - offset)
+            tokens = OutstandingToken.objects.bulk_create([
+                OutstandingToken(
+                    user=user,
+                    jti=f'seed-{offset + i}',
+                    token='seed',
+                    expires_at=now + timedelta(days=-1 if (offset + i) % 2 else 50),
+                )
+                for i in range(count)
+            ])
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens])
+        print(f"seeded {args.rows} outstanding + blacklisted tokens in {time.perf_counter() - start:.1f}s")
+
+        def time_refreshes(label: str) -> None:
+            tokens = [str(RefreshToken.for_user(user)) for _ in range(args.refreshes)]
+            samples = []
+            for token in tokens:
+                start = time.perf_counter()
+                response = client.post('/api/v1/user/token/refresh/', {'refresh': token})
+                samples.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.content
+            stats = percentiles(samples)
+            rows = OutstandingToken.objects.count()
+            print(f"{label:<14} rows={rows:<10} p50={stats['p50']:.2f}ms p95={stats['p95']:.2f}ms p99={stats['p99']:.2f}ms")
+
+        time_refreshes('before prune')
+        progress = {}
+        for progress in prune_expired_tokens(batch_size=args.batch_size):
+            pass
+        print(
+            f"pruned {progress['outstanding_deleted']} tokens in {progress['elapsed_s']:.1f}s "
+            f"({progress['rows_per_s']:.0f} rows/s, {progress['batches']} batches)"
+        )
+        time_refreshes('after prune')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Memory per worker with and without preloading the app in the master.
+
+Forks `--workers` processes the way gunicorn does, in three modes:
+
+- no-preload: each worker imports and sets up the project itself
+- preload: the master loads it and the workers inherit it
+- preload+freeze: as gunicorn.conf.py does it; the master runs with the GC
+  disabled and freezes everything before forking (core.memory)
+
+Each worker then serves some requests and runs full collections, like a
+long-lived worker would, and its unique (USS) and shared memory are read
+from smaps_rollup while all of them are alive. Linux only.
+
+    python -m benchmarks.worker_memory --workers 4
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+MODES = ('no-preload', 'preload', 'preload+freeze')
+
+
+def load_app() -> Any:
+    from benchmarks import setup_django
+    setup_django()
+    from django.core.wsgi import get_wsgi_application
+    return get_wsgi_application()
+
+
+def serve_requests(count: int) -> None:
+    from django.test import Client
+
+    client = Client(HTTP_HOST='localhost')
+    for _ in range(count):
+        client.get('/metrics')
+        client.get('/swagger.json/')
+    # Long-lived workers eventually run full collections over everything they hold
+    gc.collect()
+
+
+def run_mode(mode: str, workers: int, requests: int) -> Dict[str, Any]:
+    """Fork the workers for one mode and measure them; runs in a fresh interpreter."""
+    if mode != 'no-preload':
+        if mode == 'preload+freeze':
+            gc.disable()
+        load_app()
+        from core.memory import warm_up
+        warm_up()
+        if mode == 'preload+freeze':
+            gc.freeze()
+
+    ready_read, ready_write = os.pipe()
+    children: List[int] = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            gc.enable()
+            if mode == 'no-preload':
+                load_app()
+            serve_requests(requests)
+            os.write(ready_write, b'.')
+            # Stay alive so pages shared with the others are counted as shared
+            signal.pause()
+            os._exit(0)
+        children.append(pid)
+
+    os.close(ready_write)
+    received = 0
+    while received < workers:
+        received += len(os.read(ready_read, workers))
+    time.sleep(0.2)
+
+    from core.memory import process_memory
+    try:
+        measured = [process_memory(pid) for pid in children]
+    finally:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+
+    return {
+        'mode': mode,
+        'workers': workers,
+        'uss_mib': sum(m['uss'] for m in measured) / len(measured) / 2**20,
+        'shared_mib': sum(m['shared'] for m in measured) / len(measured) / 2**20,
+        'pss_mib': sum(m['pss'] for m in measured) / len(measured) / 2**20,
+        'rss_mib': sum(m['rss'] for m in measured) / len(measured) / 2**20,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=50, help="Requests served by each worker before measuring.")
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.workers, args.requests)))
+        return
+
+    print(f"{'mode':<18}{'USS MiB':>10}{'shared MiB':>12}{'PSS MiB':>10}{'RSS MiB':>10}   (per worker)")
+    for mode in MODES:
+        # A fresh interpreter per mode, so nothing is imported before the fork unless the mode says so
+        completed = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.worker_memory', '--mode', mode,
+             '--workers', str(args.workers), '--requests', str(args.requests)],
+            capture_output=True, text=True, check=True,
+        )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        print(
+            f"{mode:<18}{result['uss_mib']:>10.1f}{result['shared_mib']:>12.1f}"
+            f"{result['pss_mib']:>10.1f}{result['rss_mib']:>10.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,9 @@
 from django.contrib import admin
+from .models import OutboundEmail
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created')
+    list_filter = ('status',)
 
 # Register your models here.
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
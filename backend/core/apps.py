@@ -1,6 +1,24 @@
+import os
+
 from django.apps import AppConfig
+from django.core import checks
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self) -> None:
+        from core.cache import cache_collector
+        from core.memory import memory_collector
+        from core.metrics import registry
+        from core.password_validation import get_common_password_index, get_index_path
+        from core.static import check_media_serving
+
+        registry.register_collector(memory_collector)
+        registry.register_collector(cache_collector)
+        checks.register(check_media_serving)
+
+        # Map the common password index before workers fork, so they share its pages
+        if os.path.exists(get_index_path()):
+            get_common_password_index()
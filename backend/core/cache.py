@@ -0,0 +1,367 @@
+"""
+A two-tier cache: a small in-process LRU in front of a cache every worker shares.
+
+Everything is stored in the shared cache (Redis in production; FileCache
+stands in for it on a single machine and in tests). Keys whose
+namespace, the part before the first ':', is listed in LOCAL_NAMESPACES are
+also kept in the worker's own LRU, so hot, read-mostly entries are read
+without a round trip.
+
+Local copies are invalidated across workers with a version stamp per key.
+Deleting a key (or calling `invalidate`) stores a fresh random stamp
+for it in the shared cache, and each local copy remembers the stamp it was
+read under. A worker looks a copy's stamp up at most once per
+STAMP_CHECK_INTERVAL seconds, so an invalidation made elsewhere is seen
+within that interval, and invalidating one key leaves every other copy
+alone. `set` doesn't change the stamp; a changed value must be deleted (the
+usual cache-aside pattern) or it reaches other workers only as their copies
+expire after LOCAL_TIMEOUT. Locks, counters and throttle state belong in
+namespaces that aren't listed, where every read is authoritative; incr and
+decr are refused in listed ones.
+
+Values in listed namespaces are stored in the shared cache as SharedEntry,
+with their expiry time, so a copy read from there is never kept locally
+past the moment the shared value expires.
+
+Django builds a backend instance per thread, so the LRU and the
+hit counters live in a LocalState shared by every instance with the same
+LOCATION, as LocMemCache shares its store. Reads are counted per thread,
+without a lock, and summed when /metrics is scraped (`cache_collector`);
+a finished thread's counts are folded into the totals and dropped.
+
+    CACHES = {
+        "default": {
+            "BACKEND": "core.cache.TieredCache",
+            "OPTIONS": {"SHARED_CACHE": "shared", "LOCAL_NAMESPACES": ["course-catalog"]},
+        },
+        "shared": {"BACKEND": "django.core.cache.backends.redis.RedisCache", ...},
+    }
+"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+
+from core.metrics import format_labels
+
+STAMP_PREFIX = 'cache-stamp'
+DEFAULT_LOCAL_MAX_ENTRIES = 1000
+DEFAULT_LOCAL_TIMEOUT = 30
+DEFAULT_STAMP_CHECK_INTERVAL = 1
+
+_missing = object()
+
+
+class LocalEntry(NamedTuple):
+    value: Any
+    # time.monotonic() deadline
+    expires_at: float
+    stamp: Optional[str]
+    # time.monotonic() the stamp was last compared with the shared one
+    checked_at: float
+
+
+class SharedEntry(NamedTuple):
+    value: Any
+    # time.time() the shared value expires at, None for never
+    expires_at: Optional[float]
+
+
+class LocalLRU:
+    """Bounded, thread-safe LRU of LocalEntry values."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, LocalEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[LocalEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: LocalEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+COUNTERS = ('local_hits', 'local_misses', 'shared_hits', 'shared_misses')
+
+
+class LocalState:
+    """One process's local copies and read counts for a TieredCache LOCATION."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.lru = LocalLRU(max_entries)
+        self._thread = threading.local()
+        # id -> counters of each live thread
+        self._thread_counts: Dict[int, Dict[str, int]] = {}
+        # Counts of threads that have finished
+        self._retired = dict.fromkeys(COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    def counts(self) -> Dict[str, int]:
+        """This thread's counters; only the thread itself writes to them."""
+        counts = getattr(self._thread, 'counts', None)
+        if counts is None:
+            counts = self._thread.counts = dict.fromkeys(COUNTERS, 0)
+            with self._lock:
+                self._thread_counts[id(counts)] = counts
+            weakref.finalize(threading.current_thread(), self._retire, counts)
+        return counts
+
+    def _retire(self, counts: Dict[str, int]) -> None:
+        with self._lock:
+            self._thread_counts.pop(id(counts), None)
+            for name in COUNTERS:
+                self._retired[name] += counts[name]
+
+    def totals(self) -> Dict[str, int]:
+        with self._lock:
+            every = [self._retired, *self._thread_counts.values()]
+            return {name: sum(counts[name] for counts in every) for name in COUNTERS}
+
+
+# LOCATION -> state
+_local_states: Dict[str, LocalState] = {}
+_local_states_lock = threading.Lock()
+
+
+def get_local_state(location: str, max_entries: int) -> LocalState:
+    with _local_states_lock:
+        state = _local_states.get(location)
+        if state is None:
+            state = _local_states[location] = LocalState(max_entries)
+        return state
+
+
+def cache_collector() -> List[str]:
+    """Prometheus lines for the reads of every TieredCache in this worker, registered with core.metrics."""
+    with _local_states_lock:
+        states = dict(_local_states)
+    if not states:
+        return []
+    lines = [
+        "# HELP lms_cache_requests_total Cache reads by tier and result",
+        "# TYPE lms_cache_requests_total counter",
+    ]
+    for location, state in sorted(states.items()):
+        for name, value in state.totals().items():
+            tier, _, result = name.partition('_')
+            labels = format_labels((
+                ('location', location), ('result', 'hit' if result == 'hits' else 'miss'), ('tier', tier),
+            ))
+            lines.append(f"lms_cache_requests_total{labels} {value}")
+    return lines
+
+
+def key_namespace(key: str) -> str:
+    return key.split(':', 1)[0] if ':' in key else ''
+
+
+class TieredCache(BaseCache):
+    """Cache backend reading hot namespaces from a per-process LRU and everything else from a shared cache."""
+
+    def __init__(self, location: str, params: Dict[str, Any]) -> None:
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.shared_alias = options.get('SHARED_CACHE', 'shared')
+        self.local_namespaces = frozenset(options.get('LOCAL_NAMESPACES', ()))
+        self.local_timeout = options.get('LOCAL_TIMEOUT', DEFAULT_LOCAL_TIMEOUT)
+        self.stamp_check_interval = options.get('STAMP_CHECK_INTERVAL', DEFAULT_STAMP_CHECK_INTERVAL)
+        self.state = get_local_state(location, options.get('LOCAL_MAX_ENTRIES', DEFAULT_LOCAL_MAX_ENTRIES))
+        self.local = self.state.lru
+
+    @property
+    def shared(self) -> BaseCache:
+        return caches[self.shared_alias]
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Reads counted by every thread of this process."""
+        return self.state.totals()
+
+    def _count(self, tier: str, hit: bool) -> None:
+        self.state.counts()[f"{tier}_{'hits' if hit else 'misses'}"] += 1
+
+    def _local_key(self, key: str, version: Optional[int]) -> Optional[str]:
+        if not self.local_namespaces or key_namespace(key) not in self.local_namespaces:
+            return None
+        return self.make_and_validate_key(key, version)
+
+    def _stamp_key(self, key: str) -> str:
+        return f'{STAMP_PREFIX}:{key}'
+
+    def _bump_stamp(self, key: str, version: Optional[int]) -> None:
+        """Invalidate every worker's local copy of `key`."""
+        # Outlives any copy read under the previous stamp; once it expires, copies are refilled anyway
+        self.shared.set(self._stamp_key(key), uuid.uuid4().hex, self.local_timeout * 2, version=version)
+
+    def _local_expiry(self, timeout: Optional[float]) -> float:
+        seconds = self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+        return time.monotonic() + seconds
+
+    def _wrap(self, value: Any, timeout: Any) -> SharedEntry:
+        timeout = self._shared_timeout(timeout)
+        return SharedEntry(value, None if timeout is None else time.time() + timeout)
+
+    def get(self, key: str, default: Any = None, version: Optional[int] = None) -> Any:
+        local_key = self._local_key(key, version)
+        if local_key is None:
+            return self._shared_get(key, default, version)
+
+        now = time.monotonic()
+        entry = self.local.get(local_key)
+        if entry is not None and entry.expires_at > now:
+            if now - entry.checked_at < self.stamp_check_interval:
+                self._count('local', True)
+                return entry.value
+            if self.shared.get(self._stamp_key(key), version=version) == entry.stamp:
+                self.local.set(local_key, entry._replace(checked_at=now))
+                self._count('local', True)
+                return entry.value
+        self._count('local', False)
+
+        # The stamp is read before the value, so a value deleted after it can't be kept under it
+        stamp_key = self._stamp_key(key)
+        found = self.shared.get_many([stamp_key, key], version=version)
+        shared = found.get(key)
+        remaining = None
+        if isinstance(shared, SharedEntry) and shared.expires_at is not None:
+            remaining = shared.expires_at - time.time()
+        if not isinstance(shared, SharedEntry) or (remaining is not None and remaining <= 0):
+            self._count('shared', False)
+            return default
+        self._count('shared', True)
+        self.local.set(local_key, LocalEntry(shared.value, self._local_expiry(remaining), found.get(stamp_key), now))
+        return shared.value
+
+    def _shared_get(self, key: str, default: Any, version: Optional[int]) -> Any:
+        value = self.shared.get(key, _missing, version=version)
+        if value is _missing:
+            self._count('shared', False)
+            return default
+        self._count('shared', True)
+        return value
+
+    def set(self, key: str, value: Any, timeout: Any = DEFAULT_TIMEOUT, version: Optional[int] = None) -> None:
+        local_key = self._local_key(key, version)
+        if local_key is None:
+            self.shared.set(key, value, timeout=self._shared_timeout(timeout), version=version)
+            return
+        # Read before writing, so a delete made after the write is seen as a new stamp
+        stamp = self.shared.get(self._stamp_key(key), version=version)
+        entry = self._wrap(value, timeout)
+        self.shared.set(key, entry, timeout=self._shared_timeout(timeout), version=version)
+        remaining = None if entry.expires_at is None else entry.expires_at - time.time()
+        if remaining is not None and remaining <= 0:
+            self.local.pop(local_key)
+        else:
+            self.local.set(local_key, LocalEntry(value, self._local_expiry(remaining), stamp, time.monotonic()))
+
+    def add(self, key: str, value: Any, timeout: Any = DEFAULT_TIMEOUT, version: Optional[int] = None) -> bool:
+        if self._local_key(key, version) is not None:
+            value = self._wrap(value, timeout)
+        # Misses are never kept locally, so a new key needs no invalidation
+        return self.shared.add(key, value, timeout=self._shared_timeout(timeout), version=version)
+
+    def touch(self, key: str, timeout: Any = DEFAULT_TIMEOUT, version: Optional[int] = None) -> bool:
+        if self._local_key(key, version) is None:
+            return self.shared.touch(key, timeout=self._shared_timeout(timeout), version=version)
+        # The expiry is stored with the value, so rewrite it and drop copies that keep the old one
+        entry = self.shared.get(key, version=version)
+        if not isinstance(entry, SharedEntry):
+            return False
+        self.shared.set(key, self._wrap(entry.value, timeout), timeout=self._shared_timeout(timeout), version=version)
+        self._invalidate(key, version)
+        return True
+
+    def delete(self, key: str, version: Optional[int] = None) -> bool:
+        deleted = self.shared.delete(key, version=version)
+        self._invalidate(key, version)
+        return deleted
+
+    def incr(self, key: str, delta: int = 1, version: Optional[int] = None) -> int:
+        self._check_counter(key, version)
+        return self.shared.incr(key, delta, version=version)
+
+    def decr(self, key: str, delta: int = 1, version: Optional[int] = None) -> int:
+        self._check_counter(key, version)
+        return self.shared.decr(key, delta, version=version)
+
+    def _check_counter(self, key: str, version: Optional[int]) -> None:
+        if self._local_key(key, version) is not None:
+            raise ValueError(f"Counters can't be kept in a local namespace: '{key}'")
+
+    def clear(self) -> None:
+        self.shared.clear()
+        self.local.clear()
+
+    def clear_local(self) -> None:
+        """Drop this process's copies, e.g. in tests simulating another worker."""
+        self.local.clear()
+
+    def invalidate(self, key: str, version: Optional[int] = None) -> None:
+        """Drop every worker's local copy of `key` without touching the shared value."""
+        self._invalidate(key, version)
+
+    def _invalidate(self, key: str, version: Optional[int]) -> None:
+        local_key = self._local_key(key, version)
+        if local_key is not None:
+            self._bump_stamp(key, version)
+            self.local.pop(local_key)
+
+    def _shared_timeout(self, timeout: Any) -> Any:
+        # This backend's TIMEOUT applies when the caller gives none
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+
+class FileCache(FileBasedCache):
+    """File cache whose `add` is atomic across processes, so it can hold locks."""
+
+    def add(self, key: str, value: Any, timeout: Any = DEFAULT_TIMEOUT, version: Optional[int] = None) -> bool:
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            for _ in range(2):
+                try:
+                    # Unlike the rename set() uses, a link fails if the file exists
+                    os.link(tmp_path, fname)
+                    return True
+                except FileExistsError:
+                    if self.has_key(key, version):
+                        return False
+                    # Expired; remove it and try once more
+                    self._delete(fname)
+            return False
+        finally:
+            os.remove(tmp_path)
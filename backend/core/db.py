@@ -0,0 +1,60 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY_DB = 'default'
+
+_use_primary: ContextVar[bool] = ContextVar('use_primary_db', default=False)
+
+
+def get_replicas() -> List[str]:
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def pin_to_primary(pinned: bool = True) -> Token:
+    """Send reads in the current context to the primary until the token is reset."""
+    return _use_primary.set(pinned)
+
+
+def reset_primary_pin(token: Token) -> None:
+    _use_primary.reset(token)
+
+
+@contextmanager
+def use_primary() -> Iterator[None]:
+    """Send every read inside the block (or decorated function) to the primary."""
+    token = pin_to_primary()
+    try:
+        yield
+    finally:
+        reset_primary_pin(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Routes writes to the primary and reads to a random replica.
+
+    Reads stay on the primary while `use_primary` is active (the
+    PrimaryDatabaseMiddleware turns it on for writes and flagged views) and
+    inside a transaction on the primary, so a request reads its own writes.
+    """
+
+    def db_for_read(self, model: Any, **hints: Any) -> Optional[str]:
+        replicas = get_replicas()
+        if not replicas or _use_primary.get() or connections[PRIMARY_DB].in_atomic_block:
+            return PRIMARY_DB
+        return random.choice(replicas)
+
+    def db_for_write(self, model: Any, **hints: Any) -> Optional[str]:
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1: Any, obj2: Any, **hints: Any) -> Optional[bool]:
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db: str, app_label: str, model_name: Optional[str] = None, **hints: Any) -> Optional[bool]:
+        return db == PRIMARY_DB
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import re
+import threading
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.template.loader import get_template
+from django.utils.html import conditional_escape, strip_tags
+
+from core.metrics import timed
+
+PLACEHOLDER_FORMAT = '__email_field_{}__'
+PLACEHOLDER_RE = re.compile(r'(__email_field_\d+__)')
+
+_templates: Dict[Tuple[str, Tuple[str, ...]], 'PrecompiledEmailTemplate'] = {}
+_lock = threading.Lock()
+
+
+def _nest(placeholders: Mapping[str, str]) -> Dict[str, Any]:
+    """Turn {'user.full_name': 'x'} into {'user': {'full_name': 'x'}} for template lookups."""
+    context: Dict[str, Any] = {}
+    for field, placeholder in placeholders.items():
+        *parents, leaf = field.split('.')
+        node = context
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = placeholder
+    return context
+
+
+def _resolve(context: Mapping[str, Any], path: Tuple[str, ...]) -> Any:
+    """Resolve a dotted field against the render context, like a template variable."""
+    value: Any = context
+    for part in path:
+        if isinstance(value, Mapping):
+            value = value.get(part, '')
+        else:
+            value = getattr(value, part, '')
+    return value
+
+
+class PrecompiledEmailTemplate:
+    """
+    An email template compiled once into static HTML and plain-text skeletons.
+
+    The template is rendered a single time with placeholder values for the
+    declared `fields`, and `strip_tags` runs once over that result. Rendering
+    for a user is then a join of the skeleton pieces with the escaped values.
+    Fields must be output directly (``{{ user.full_name }}``), not fed into
+    tags or filters, since the placeholders stand in for the final output.
+    """
+
+    def __init__(self, template_name: str, fields: Sequence[str]) -> None:
+        self.template_name = template_name
+        self.fields = tuple(fields)
+        self._paths = tuple(tuple(field.split('.')) for field in self.fields)
+        self.compile()
+
+    def compile(self) -> None:
+        template = get_template(self.template_name)
+        placeholders = {
+            field: PLACEHOLDER_FORMAT.format(index) for index, field in enumerate(self.fields)
+        }
+        html = template.render(_nest(placeholders))
+
+        for field, placeholder in placeholders.items():
+            if placeholder not in html:
+                raise ImproperlyConfigured(
+                    f"Field '{field}' is not rendered directly by '{self.template_name}'."
+                )
+
+        self.origin = template.origin.name
+        self.mtime = self._source_mtime()
+        self.version = hashlib.sha1(html.encode()).hexdigest()[:12]
+        self._html = self._split(html, placeholders)
+        self._text = self._split(strip_tags(html), placeholders)
+
+    def _source_mtime(self) -> float:
+        try:
+            return os.stat(self.origin).st_mtime
+        except (OSError, TypeError):
+            return 0.0
+
+    def _split(self, skeleton: str, placeholders: Mapping[str, str]) -> List[Any]:
+        """Split a skeleton into literal strings and field indexes."""
+        index_by_placeholder = {placeholder: index for index, placeholder in enumerate(placeholders.values())}
+        return [
+            index_by_placeholder.get(piece, piece)
+            for piece in PLACEHOLDER_RE.split(skeleton)
+            if piece
+        ]
+
+    def is_stale(self) -> bool:
+        return self._source_mtime() != self.mtime
+
+    def render(self, context: Mapping[str, Any]) -> Tuple[str, str]:
+        """Return the (html, text) bodies for `context`."""
+        with timed('template_render'):
+            values = [str(conditional_escape(_resolve(context, path))) for path in self._paths]
+            html = ''.join(piece if isinstance(piece, str) else values[piece] for piece in self._html)
+            text = ''.join(piece if isinstance(piece, str) else values[piece] for piece in self._text)
+        return html, text
+
+
+def get_email_template(template_name: str, fields: Sequence[str]) -> PrecompiledEmailTemplate:
+    """
+    Return the process-wide compiled template, compiling it on first use.
+
+    With DEBUG on the template file is checked for edits and recompiled, so
+    a new template version gets a fresh plain-text variant.
+    """
+    key = (template_name, tuple(fields))
+    template = _templates.get(key)
+    if template is None or (settings.DEBUG and template.is_stale()):
+        with _lock:
+            template = _templates.get(key)
+            if template is None or (settings.DEBUG and template.is_stale()):
+                template = _templates[key] = PrecompiledEmailTemplate(template_name, fields)
+    return template
+
+
+def clear_email_templates() -> None:
+    """Drop every compiled template, e.g. after a deploy changes them."""
+    with _lock:
+        _templates.clear()
@@ -0,0 +1,71 @@
+"""
+Shared, bounded thread pool for CPU-bound work started from async code.
+
+Password hashing would block the event loop if awaited inline; the hashers
+release the GIL, so a small pool runs them in parallel while the loop keeps
+serving other requests. The same pool runs short background jobs, such as
+upgrading password hashes after login; jobs that query the database must
+close their connections when done.
+
+Work runs in a copy of the caller's context, so context variables such as
+the request's metric phases (core.metrics.collect_phases) follow it onto
+the pool thread.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from django.conf import settings
+
+T = TypeVar('T')
+
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process-wide pool, sized by CPU_EXECUTOR_WORKERS."""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = getattr(settings, 'CPU_EXECUTOR_WORKERS', None) or DEFAULT_MAX_WORKERS
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cpu-bound')
+    return _executor
+
+
+async def run_cpu_bound(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Await `fn(*args, **kwargs)` run on the shared pool."""
+    loop = asyncio.get_running_loop()
+    # Unlike asyncio.to_thread, run_in_executor doesn't carry the context over
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), call)
+
+
+def submit(fn: Callable[..., T], *args: Any, **kwargs: Any) -> 'Future[T]':
+    """Start `fn(*args, **kwargs)` on the shared pool without waiting for it."""
+    return get_executor().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+def _forget_executor() -> None:
+    # Pool threads don't survive fork; the child starts a pool of its own
+    global _executor, _lock
+    _executor = None
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_executor)
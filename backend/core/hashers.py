@@ -0,0 +1,84 @@
+"""
+Password hashers used by the project.
+
+Each wraps one of Django's hashers, keeping its algorithm name and hash
+format, and adds two things: hashing time is reported to the request
+metrics, and cost parameters come from settings.PASSWORD_HASHER_COSTS so
+every environment can tune them (see `manage.py calibrate_hashers`).
+Hashes made with other costs still verify, and are upgraded on login.
+"""
+from typing import Any, Dict
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from core.metrics import timed
+
+
+def get_costs(algorithm: str) -> Dict[str, Any]:
+    return getattr(settings, 'PASSWORD_HASHER_COSTS', {}).get(algorithm, {})
+
+
+class Cost:
+    """
+    A hasher cost parameter read from PASSWORD_HASHER_COSTS[algorithm] on every
+    use, so changing the setting needs no restart of the hasher cache. Falls
+    back to Django's value, and can be overridden per instance (when calibrating).
+    """
+
+    def __init__(self, default: int) -> None:
+        self.default = default
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, instance: Any, owner: type) -> int:
+        if instance is None:
+            return self.default
+        if self.name in instance.__dict__:
+            return instance.__dict__[self.name]
+        return get_costs(instance.algorithm).get(self.name, self.default)
+
+    def __set__(self, instance: Any, value: int) -> None:
+        instance.__dict__[self.name] = value
+
+
+class TimedHasherMixin:
+    """Reports hashing and verification time to the request metrics."""
+
+    def encode(self, password: str, salt: str, *args: Any, **kwargs: Any) -> str:
+        with timed('password_hash'):
+            return super().encode(password, salt, *args, **kwargs)
+
+    def verify(self, password: str, encoded: str) -> bool:
+        with timed('password_hash'):
+            return super().verify(password, encoded)
+
+    def harden_runtime(self, password: str, encoded: str) -> None:
+        with timed('password_hash'):
+            return super().harden_runtime(password, encoded)
+
+
+class PBKDF2PasswordHasher(TimedHasherMixin, hashers.PBKDF2PasswordHasher):
+    iterations = Cost(hashers.PBKDF2PasswordHasher.iterations)
+
+
+class PBKDF2SHA1PasswordHasher(TimedHasherMixin, hashers.PBKDF2SHA1PasswordHasher):
+    iterations = Cost(hashers.PBKDF2SHA1PasswordHasher.iterations)
+
+
+class Argon2PasswordHasher(TimedHasherMixin, hashers.Argon2PasswordHasher):
+    time_cost = Cost(hashers.Argon2PasswordHasher.time_cost)
+    # KiB
+    memory_cost = Cost(hashers.Argon2PasswordHasher.memory_cost)
+    parallelism = Cost(hashers.Argon2PasswordHasher.parallelism)
+
+
+class ScryptPasswordHasher(TimedHasherMixin, hashers.ScryptPasswordHasher):
+    work_factor = Cost(hashers.ScryptPasswordHasher.work_factor)
+    block_size = Cost(hashers.ScryptPasswordHasher.block_size)
+    parallelism = Cost(hashers.ScryptPasswordHasher.parallelism)
+    # Only a ceiling: scrypt allocates about 128 * n * r bytes. OpenSSL's default
+    # of 32 MiB would reject work factors above 2 ** 14, including older hashes
+    # made before the costs were lowered.
+    maxmem = 2 ** 30
@@ -0,0 +1,125 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, Sequence
+
+DEFAULT_QUEUE_SIZE = 10000
+
+request_id_var: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds the current request's correlation id to every record as `request_id`."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = request_id_var.get()
+        if request_id is None:
+            # django.request logs the response after the middleware has returned
+            request_id = getattr(getattr(record, 'request', None), 'request_id', None)
+        record.request_id = request_id
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a `rate` fraction of records at or below `max_level`, so
+    high-volume debug events can stay enabled in production.
+    """
+
+    def __init__(self, rate: float = 1.0, max_level: str = 'DEBUG') -> None:
+        super().__init__()
+        self.rate = rate
+        self.max_level = logging.getLevelName(max_level)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Queues records for a background thread that runs the real handlers, so
+    the request thread never blocks on log I/O.
+
+    Filters on this handler run in the calling thread (use them for request
+    context); the formatter is applied by the target handlers. When the queue
+    is full records are dropped and counted rather than blocking.
+    """
+
+    def __init__(
+        self,
+        handlers: Optional[Sequence[logging.Handler]] = None,
+        stream: Any = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ) -> None:
+        self.queue_size = queue_size
+        self.targets: List[logging.Handler] = list(handlers or [logging.StreamHandler(stream or sys.stdout)])
+        self.dropped = 0
+        super().__init__(queue.Queue(queue_size))
+        self._start_listener()
+        atexit.register(self.stop)
+        # A forked worker doesn't inherit the listener thread, so start a fresh one
+        os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _start_listener(self) -> None:
+        self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+
+    def _restart_after_fork(self) -> None:
+        self.queue = queue.Queue(self.queue_size)
+        self._start_listener()
+
+    def setFormatter(self, fmt: Optional[logging.Formatter]) -> None:
+        for target in self.targets:
+            target.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve args and exceptions here, since they may not survive the thread hop
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        if self.listener._thread is not None:
+            self.listener.stop()
@@ -0,0 +1,129 @@
+from datetime import timedelta
+from typing import Any, List, Sequence, Tuple
+
+from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.utils import timezone
+
+from core.models import OutboundEmail, MAX_ERROR_LENGTH
+from core.worker import claim_due
+
+QUEUED_EMAIL_BACKEND = 'core.mail.QueuedEmailBackend'
+DEFAULT_DELIVERY_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 30  # seconds, doubled on every failed attempt
+DEFAULT_LEASE = 300  # seconds a claimed batch is hidden from other workers
+
+
+def enqueue(message: EmailMessage) -> OutboundEmail:
+    """Persist an email message so it can be delivered outside the request cycle."""
+    if message.attachments:
+        raise ValueError("Queued emails do not support attachments.")
+
+    return OutboundEmail.objects.create(
+        subject=message.subject,
+        body=message.body,
+        from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(message.to),
+        cc=list(message.cc),
+        bcc=list(message.bcc),
+        reply_to=list(message.reply_to),
+        headers=message.extra_headers,
+        alternatives=[list(alt) for alt in getattr(message, 'alternatives', [])],
+    )
+
+
+def build_message(outbound: OutboundEmail, connection: Any = None) -> EmailMultiAlternatives:
+    """Rebuild the EmailMultiAlternatives stored in a queued row."""
+    message = EmailMultiAlternatives(
+        subject=outbound.subject,
+        body=outbound.body,
+        from_email=outbound.from_email,
+        to=outbound.to,
+        cc=outbound.cc,
+        bcc=outbound.bcc,
+        reply_to=outbound.reply_to,
+        headers=outbound.headers,
+        connection=connection,
+    )
+    for content, mimetype in outbound.alternatives:
+        message.attach_alternative(content, mimetype)
+    return message
+
+
+def get_delivery_backend() -> str:
+    """Return the dotted path of the backend that actually delivers queued mail."""
+    backend = getattr(settings, 'MAIL_QUEUE_DELIVERY_BACKEND', DEFAULT_DELIVERY_BACKEND)
+    if backend == QUEUED_EMAIL_BACKEND:
+        raise ValueError("MAIL_QUEUE_DELIVERY_BACKEND cannot be the queued backend itself.")
+    return backend
+
+
+def claim_batch(batch_size: int = DEFAULT_BATCH_SIZE) -> List[OutboundEmail]:
+    """Claim up to `batch_size` due messages under a lease (core.worker.claim_due)."""
+    lease = getattr(settings, 'MAIL_QUEUE_LEASE', DEFAULT_LEASE)
+    return claim_due(OutboundEmail.objects.filter(status=OutboundEmail.STATUS_QUEUED), batch_size, lease)
+
+
+def deliver_batch(batch_size: int = DEFAULT_BATCH_SIZE) -> Tuple[int, int, int]:
+    """
+    Deliver one batch of queued messages over a single backend connection.
+
+    Returns a (sent, retried, failed) tuple. Messages that fail are retried
+    with exponential backoff until MAIL_QUEUE_MAX_ATTEMPTS is reached.
+    """
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0, 0
+
+    max_attempts = getattr(settings, 'MAIL_QUEUE_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    retry_delay = getattr(settings, 'MAIL_QUEUE_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    sent = retried = failed = 0
+
+    connection = get_connection(get_delivery_backend(), fail_silently=False)
+    connection.open()
+    try:
+        for outbound in batch:
+            outbound.attempts += 1
+            try:
+                build_message(outbound, connection=connection).send(fail_silently=False)
+            except Exception as error:
+                outbound.last_error = str(error)[:MAX_ERROR_LENGTH]
+                if outbound.attempts >= max_attempts:
+                    outbound.status = OutboundEmail.STATUS_FAILED
+                    failed += 1
+                else:
+                    delay = retry_delay * 2 ** (outbound.attempts - 1)
+                    outbound.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+                    retried += 1
+                outbound.save(update_fields=['attempts', 'status', 'next_attempt_at', 'last_error'])
+            else:
+                outbound.status = OutboundEmail.STATUS_SENT
+                outbound.sent_at = timezone.now()
+                outbound.last_error = ''
+                outbound.save(update_fields=['attempts', 'status', 'sent_at', 'last_error'])
+                sent += 1
+    finally:
+        connection.close()
+
+    return sent, retried, failed
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """Email backend that stores messages in the outbound queue instead of sending them."""
+
+    def send_messages(self, email_messages: Sequence[EmailMessage]) -> int:
+        count = 0
+        for message in email_messages:
+            if not message.recipients():
+                continue
+            try:
+                enqueue(message)
+            except Exception:
+                if not self.fail_silently:
+                    raise
+            else:
+                count += 1
+        return count
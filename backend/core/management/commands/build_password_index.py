@@ -0,0 +1,36 @@
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.password_validation import DEFAULT_PASSWORD_LIST_PATH, CommonPasswordIndex, read_password_list, write_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the memory-mapped common password index used by "
+        "IndexedCommonPasswordValidator. Run it once per deploy, before the workers start."
+    )
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--source',
+            default=str(DEFAULT_PASSWORD_LIST_PATH),
+            help="Password list to index, one password per line, optionally gzipped. Defaults to Django's list.",
+        )
+        parser.add_argument(
+            '--output',
+            default=getattr(settings, 'COMMON_PASSWORDS_INDEX', ''),
+            help="Index file to write. Defaults to COMMON_PASSWORDS_INDEX.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if not options['output']:
+            raise CommandError("Set COMMON_PASSWORDS_INDEX or pass --output.")
+        try:
+            count = write_index(read_password_list(options['source']), options['output'])
+            # Make sure the file we just wrote maps cleanly
+            CommonPasswordIndex.open(options['output'])
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Could not build the password index: {error}")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} passwords into {options['output']}"))
@@ -0,0 +1,169 @@
+import json
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from django.contrib.auth import hashers as django_hashers
+from django.core.management.base import BaseCommand
+
+from core.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher, ScryptPasswordHasher
+
+# In order of preference for the suggested PASSWORD_HASHER
+ALGORITHMS = ('argon2', 'scrypt', 'pbkdf2_sha256')
+MIN_MEMORY_MIB = 8
+SCRYPT_BLOCK_SIZE = 8
+PASSWORD = 'calibration-Passw0rd'
+
+Result = Tuple[Dict[str, int], float]
+
+
+class Command(BaseCommand):
+    help = (
+        "Times the password hashers on this machine and suggests PASSWORD_HASHER_COSTS "
+        "that keep one hash within a latency budget. Run it on production hardware."
+    )
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--target-ms',
+            type=float,
+            default=100.0,
+            help="Latency budget for hashing one password.",
+        )
+        parser.add_argument(
+            '--algorithm',
+            action='append',
+            choices=ALGORITHMS,
+            help="Algorithm to calibrate; may be repeated. Defaults to all of them.",
+        )
+        parser.add_argument(
+            '--memory-mib',
+            type=int,
+            default=64,
+            help="Memory ceiling per hash for argon2 and scrypt.",
+        )
+        parser.add_argument(
+            '--parallelism',
+            type=int,
+            default=1,
+            help="Argon2 lanes. Keep at 1 when every worker process hashes in parallel.",
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=3,
+            help="Hashes timed per candidate setting; the fastest counts.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        self.samples = max(1, options['samples'])
+        target = options['target_ms']
+        calibrators: Dict[str, Callable[[], Result]] = {
+            'argon2': lambda: self.calibrate_argon2(target, options['memory_mib'], options['parallelism']),
+            'scrypt': lambda: self.calibrate_scrypt(target, options['memory_mib']),
+            'pbkdf2_sha256': lambda: self.calibrate_pbkdf2(target),
+        }
+
+        costs: Dict[str, Dict[str, int]] = {}
+        for algorithm in options['algorithm'] or ALGORITHMS:
+            try:
+                params, elapsed = calibrators[algorithm]()
+            except ValueError as error:
+                # Argon2 without argon2-cffi installed
+                self.stderr.write(self.style.WARNING(f"{algorithm}: skipped ({error})"))
+                continue
+            costs[algorithm] = params
+            summary = ' '.join(f"{name}={value}" for name, value in params.items())
+            self.stdout.write(f"{algorithm:<15}{summary:<50}{elapsed:>8.1f} ms")
+            self.warn_if_weaker(algorithm, params)
+
+        if not costs:
+            return
+        preferred = next(algorithm for algorithm in ALGORITHMS if algorithm in costs)
+        self.stdout.write("\nSuggested environment:")
+        self.stdout.write(f"PASSWORD_HASHER={preferred}")
+        self.stdout.write(f"PASSWORD_HASHER_COSTS='{json.dumps(costs, separators=(',', ':'))}'")
+
+    def time_hash(self, hasher: django_hashers.BasePasswordHasher) -> float:
+        """Milliseconds for the fastest of `samples` hashes."""
+        salt = hasher.salt()
+        runs = []
+        for _ in range(self.samples):
+            start = time.perf_counter()
+            hasher.encode(PASSWORD, salt)
+            runs.append(time.perf_counter() - start)
+        return min(runs) * 1000
+
+    def calibrate_pbkdf2(self, target_ms: float) -> Result:
+        # Cost is linear in the iteration count, so one probe is enough
+        hasher = PBKDF2PasswordHasher()
+        probe = hasher.iterations = 100_000
+        iterations = int(probe * target_ms / self.time_hash(hasher))
+        hasher.iterations = max(10_000, iterations // 10_000 * 10_000)
+        return {'iterations': hasher.iterations}, self.time_hash(hasher)
+
+    def calibrate_scrypt(self, target_ms: float, memory_mib: int) -> Result:
+        """Largest power-of-two work factor that fits the budget and the memory ceiling."""
+        hasher = ScryptPasswordHasher()
+        hasher.block_size = SCRYPT_BLOCK_SIZE
+        hasher.parallelism = 1
+        max_work_factor = memory_mib * 2 ** 20 // (128 * SCRYPT_BLOCK_SIZE)
+
+        hasher.work_factor = 2 ** 10
+        elapsed = self.time_hash(hasher)
+        while hasher.work_factor * 2 <= max_work_factor:
+            hasher.work_factor *= 2
+            candidate = self.time_hash(hasher)
+            if candidate > target_ms:
+                hasher.work_factor //= 2
+                break
+            elapsed = candidate
+        return {
+            'work_factor': hasher.work_factor,
+            'block_size': hasher.block_size,
+            'parallelism': hasher.parallelism,
+        }, elapsed
+
+    def calibrate_argon2(self, target_ms: float, memory_mib: int, parallelism: int) -> Result:
+        """
+        Most passes at the memory ceiling that fit the budget; if one pass
+        is already too slow, halve the memory instead.
+        """
+        hasher = Argon2PasswordHasher()
+        hasher.parallelism = parallelism
+        hasher.memory_cost = memory_mib * 1024
+        hasher.time_cost = 1
+        elapsed = self.time_hash(hasher)
+
+        while elapsed > target_ms and hasher.memory_cost // 2 >= MIN_MEMORY_MIB * 1024:
+            hasher.memory_cost //= 2
+            elapsed = self.time_hash(hasher)
+
+        while True:
+            hasher.time_cost += 1
+            candidate = self.time_hash(hasher)
+            if candidate > target_ms:
+                hasher.time_cost -= 1
+                break
+            elapsed = candidate
+        return {
+            'time_cost': hasher.time_cost,
+            'memory_cost': hasher.memory_cost,
+            'parallelism': hasher.parallelism,
+        }, elapsed
+
+    def warn_if_weaker(self, algorithm: str, params: Dict[str, int]) -> None:
+        """Flag settings below Django's own defaults for the algorithm."""
+        defaults = {
+            'argon2': django_hashers.Argon2PasswordHasher,
+            'scrypt': django_hashers.ScryptPasswordHasher,
+            'pbkdf2_sha256': django_hashers.PBKDF2PasswordHasher,
+        }[algorithm]
+        weaker: List[str] = [
+            name for name, value in params.items()
+            if name != 'parallelism' and value < getattr(defaults, name)
+        ]
+        if weaker:
+            self.stdout.write(self.style.WARNING(
+                f"  {algorithm}: {', '.join(weaker)} below Django's default; "
+                f"consider a larger --target-ms or more hashing capacity."
+            ))
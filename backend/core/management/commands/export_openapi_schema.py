@@ -0,0 +1,33 @@
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.openapi import CODECS, write_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders the OpenAPI schema to schema.json and schema.yaml, which the schema "
+        "endpoint then serves as-is. Run it at deploy, after collectstatic."
+    )
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--output-dir',
+            default=getattr(settings, 'OPENAPI_SCHEMA_DIR', ''),
+            help="Directory to write to. Defaults to OPENAPI_SCHEMA_DIR.",
+        )
+        parser.add_argument(
+            '--format',
+            action='append',
+            choices=sorted(CODECS),
+            help="Format to write; may be repeated. Defaults to all of them.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if not options['output_dir']:
+            raise CommandError("Set OPENAPI_SCHEMA_DIR or pass --output-dir.")
+        for fmt in options['format'] or sorted(CODECS):
+            path = write_schema(fmt, str(options['output_dir']))
+            self.stdout.write(f"Wrote {path}")
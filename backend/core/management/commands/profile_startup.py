@@ -0,0 +1,150 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = ('full', 'api')
+
+# Run in a fresh interpreter, so nothing is imported yet
+STARTUP_SCRIPTS = {
+    # What every manage.py command pays before it runs
+    'setup': "import django; django.setup()",
+    # A WSGI worker up to serving its first request: apps, middleware and the URLconf
+    'wsgi': (
+        "import backend.wsgi\n"
+        "from django.urls import get_resolver\n"
+        "get_resolver().url_patterns\n"
+    ),
+}
+MEASURE = (
+    "import json, os, resource, sys, time\n"
+    "start = time.perf_counter()\n"
+    "{script}\n"
+    "elapsed = time.perf_counter() - start\n"
+    "rss = 0\n"
+    "try:\n"
+    "    with open('/proc/self/status') as f:\n"
+    "        rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))\n"
+    "except OSError:\n"
+    "    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+    "print(json.dumps({{'seconds': elapsed, 'rss_kib': rss, 'modules': len(sys.modules)}}))\n"
+)
+IMPORT_TIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+# (module, self microseconds, cumulative microseconds, nesting depth)
+ImportRecord = Tuple[str, int, int, int]
+
+
+def parse_import_times(stderr: str) -> List[ImportRecord]:
+    """Parse the report `python -X importtime` writes to stderr."""
+    records = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return records
+
+
+class Command(BaseCommand):
+    help = (
+        "Starts fresh interpreters under each worker profile and reports cold-start time, "
+        "RSS, and which modules and packages the import time goes to."
+    )
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--profile',
+            action='append',
+            choices=PROFILES,
+            help="WORKER_PROFILE to measure; may be repeated. Defaults to all of them.",
+        )
+        parser.add_argument(
+            '--target',
+            choices=sorted(STARTUP_SCRIPTS),
+            default='wsgi',
+            help="What to start: a WSGI worker, or just django.setup() as manage.py does.",
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help="Cold starts per profile; the fastest and the median are reported.",
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=15,
+            help="Number of packages and modules listed per profile.",
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help="Print the results as JSON instead of tables.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        results = {}
+        for profile in options['profile'] or PROFILES:
+            results[profile] = self.measure(profile, options['target'], max(1, options['runs']), options['top'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'profile':<10}{'best ms':>10}{'median ms':>12}{'RSS MiB':>10}{'modules':>10}")
+        for profile, result in results.items():
+            self.stdout.write(
+                f"{profile:<10}{result['best_ms']:>10.0f}{result['median_ms']:>12.0f}"
+                f"{result['rss_mib']:>10.1f}{result['modules']:>10}"
+            )
+        for profile, result in results.items():
+            self.stdout.write(f"\n[{profile}] self import time by top-level package")
+            for package, ms in result['packages']:
+                self.stdout.write(f"  {package:<40}{ms:>9.1f} ms")
+            self.stdout.write(f"[{profile}] slowest modules (self / cumulative)")
+            for module, self_ms, cumulative_ms in result['modules_by_cost']:
+                self.stdout.write(f"  {module:<40}{self_ms:>9.1f} ms{cumulative_ms:>9.1f} ms")
+
+    def measure(self, profile: str, target: str, runs: int, top: int) -> Dict[str, Any]:
+        env = dict(os.environ, WORKER_PROFILE=profile, DJANGO_SETTINGS_MODULE='backend.settings')
+        code = MEASURE.format(script=STARTUP_SCRIPTS[target])
+        samples: List[Dict[str, Any]] = []
+        records: List[ImportRecord] = []
+        # Timed runs, then one more for the import report, which slows the interpreter down
+        for run in range(runs + 1):
+            flags = ['-X', 'importtime'] if run == runs else []
+            completed = subprocess.run(
+                [sys.executable, *flags, '-c', code],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            )
+            if completed.returncode:
+                raise CommandError(f"{profile} worker failed to start:\n{completed.stderr[-2000:]}")
+            if flags:
+                records = parse_import_times(completed.stderr)
+            else:
+                samples.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+        # Self time summed per package doesn't double count nested imports
+        packages: Dict[str, int] = defaultdict(int)
+        for module, self_us, _, _ in records:
+            packages[module.split('.')[0]] += self_us
+        slowest = sorted(records, key=lambda record: record[1], reverse=True)[:top]
+
+        seconds = [sample['seconds'] for sample in samples]
+        return {
+            'best_ms': min(seconds) * 1000,
+            'median_ms': statistics.median(seconds) * 1000,
+            'rss_mib': statistics.median(sample['rss_kib'] for sample in samples) / 1024,
+            'modules': samples[-1]['modules'],
+            'packages': [(package, us / 1000) for package, us in
+                         sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]],
+            'modules_by_cost': [(module, self_us / 1000, cumulative_us / 1000) for module, self_us, cumulative_us, _ in slowest],
+        }
@@ -0,0 +1,18 @@
+from typing import Tuple
+
+from django.conf import settings
+
+from core.mail import DEFAULT_BATCH_SIZE, deliver_batch
+from core.worker import BatchWorkerCommand
+
+
+class Command(BatchWorkerCommand):
+    help = "Delivers queued outbound emails in batches, retrying failures with backoff."
+    done_label = 'sent'
+    item_name = 'messages sent'
+
+    def get_default_batch_size(self) -> int:
+        return getattr(settings, 'MAIL_QUEUE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+    def process_batch(self, batch_size: int) -> Tuple[int, int, int]:
+        return deliver_batch(batch_size)
@@ -0,0 +1,155 @@
+"""
+Per-worker memory: preparing a preloaded master for fork, and measuring how
+much of each worker's memory is its own.
+
+With gunicorn's `preload_app` (gunicorn.conf.py) the master imports the
+project once and forks the workers, which share those pages copy-on-write
+until something writes to them. CPython's cyclic GC writes to the header of
+every object it scans, so `prepare_for_fork` moves everything the master has
+loaded into the permanent generation with gc.freeze(), where collections in
+the workers never touch it.
+
+Unique (USS) and shared memory come from /proc/<pid>/smaps_rollup, so the
+numbers are only available on Linux.
+"""
+import gc
+import os
+from typing import Any, Dict, List, Union
+
+from django.db import connections
+
+# smaps field -> key in the report; values are converted from kB to bytes
+SMAPS_FIELDS = {
+    'Rss': 'rss',
+    'Pss': 'pss',
+    'Shared_Clean': 'shared_clean',
+    'Shared_Dirty': 'shared_dirty',
+    'Private_Clean': 'private_clean',
+    'Private_Dirty': 'private_dirty',
+    'Swap': 'swap',
+}
+
+Pid = Union[int, str]
+
+
+def parse_smaps(text: str) -> Dict[str, int]:
+    """Sum the fields of smaps or smaps_rollup output, in bytes."""
+    totals = dict.fromkeys(SMAPS_FIELDS.values(), 0)
+    for line in text.splitlines():
+        field, _, value = line.partition(':')
+        key = SMAPS_FIELDS.get(field)
+        if key and value.strip().endswith('kB'):
+            totals[key] += int(value.split()[0]) * 1024
+    return totals
+
+
+def read_smaps(pid: Pid = 'self') -> Dict[str, int]:
+    """Memory of one process; raises OSError where /proc isn't available."""
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            return parse_smaps(f.read())
+    except FileNotFoundError:
+        # Kernels before 4.14 only have the per-mapping file
+        with open(f'/proc/{pid}/smaps') as f:
+            return parse_smaps(f.read())
+
+
+def process_memory(pid: Pid = 'self') -> Dict[str, int]:
+    smaps = read_smaps(pid)
+    return {
+        'pid': os.getpid() if pid == 'self' else int(pid),
+        'rss': smaps['rss'],
+        'pss': smaps['pss'],
+        # Pages only this process maps; what a new worker would add
+        'uss': smaps['private_clean'] + smaps['private_dirty'],
+        'shared': smaps['shared_clean'] + smaps['shared_dirty'],
+        'swap': smaps['swap'],
+    }
+
+
+def child_pids(pid: int) -> List[int]:
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except FileNotFoundError:
+        # Kernels without CONFIG_PROC_CHILDREN
+        children = []
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The command name is in parentheses and may contain spaces
+                    parent = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            if parent == pid:
+                children.append(int(entry))
+        return children
+
+
+def memory_report(include_siblings: bool = False) -> Dict[str, Any]:
+    """
+    Memory of this worker and, with `include_siblings`, of every other
+    process forked by the same master.
+    """
+    pids: List[Pid] = ['self']
+    if include_siblings:
+        pids = sorted(child_pids(os.getppid())) or pids
+    workers = []
+    for pid in pids:
+        try:
+            workers.append(process_memory(pid))
+        except OSError:
+            # Exited since it was listed
+            continue
+    return {
+        'pid': os.getpid(),
+        'master_pid': os.getppid(),
+        'gc': {
+            'enabled': gc.isenabled(),
+            'frozen_objects': gc.get_freeze_count(),
+            'counts': gc.get_count(),
+        },
+        'workers': workers,
+    }
+
+
+def memory_collector() -> List[str]:
+    """Prometheus lines for this worker's memory, registered with core.metrics."""
+    try:
+        memory = process_memory()
+    except OSError:
+        return []
+    lines = [
+        "# HELP lms_process_memory_bytes Memory of this worker process by kind (from smaps_rollup)",
+        "# TYPE lms_process_memory_bytes gauge",
+    ]
+    lines.extend(
+        f'lms_process_memory_bytes{{kind="{kind}"}} {memory[kind]}'
+        for kind in ('rss', 'pss', 'uss', 'shared', 'swap')
+    )
+    lines.append("# TYPE lms_gc_frozen_objects gauge")
+    lines.append(f"lms_gc_frozen_objects {gc.get_freeze_count()}")
+    return lines
+
+
+def warm_up() -> None:
+    """Load what every worker would otherwise load on its first request."""
+    from django.urls import get_resolver
+
+    # Imports every view, serializer and URL pattern
+    get_resolver().url_patterns
+    # Connections must not be shared between processes
+    connections.close_all()
+
+
+def prepare_for_fork() -> None:
+    """
+    Call in the preloaded master right before workers are forked. As the gc
+    docs advise, the master runs with the collector disabled so collections
+    don't leave freed holes in pages the workers share, and each worker
+    re-enables it after the fork.
+    """
+    warm_up()
+    gc.freeze()
@@ -0,0 +1,195 @@
+"""
+In-process request metrics with HDR-style histograms and Prometheus text output.
+
+Metrics live in the worker process that recorded them; each worker's
+/metrics endpoint reports its own numbers.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Prometheus `le` bounds, in seconds
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Time spent in instrumented phases of the current request, e.g. {'password_hash': 0.21}
+_phase_times: ContextVar[Optional[Dict[str, float]]] = ContextVar('metrics_phase_times', default=None)
+
+
+class Histogram:
+    """
+    Log-linear (HDR-style) histogram of non-negative values.
+
+    Values are scaled to integer units of `resolution` and bucketed by power
+    of two, with `2 ** precision_bits` linear sub-buckets per power, so every
+    recorded value keeps a relative error below 2 ** -precision_bits.
+    Recording is O(1); buckets are allocated sparsely.
+    """
+
+    def __init__(self, resolution: float = 1e-6, precision_bits: int = 5) -> None:
+        self.resolution = resolution
+        self.precision_bits = precision_bits
+        self.sub_buckets = 1 << precision_bits
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+
+    def _index(self, value: float) -> int:
+        units = int(value / self.resolution)
+        if units < self.sub_buckets:
+            return units
+        shift = units.bit_length() - self.precision_bits - 1
+        return (shift + 1) * self.sub_buckets + ((units >> shift) - self.sub_buckets)
+
+    def _upper_bound(self, index: int) -> float:
+        """Largest value (in seconds) that falls into bucket `index`."""
+        if index < self.sub_buckets:
+            return (index + 1) * self.resolution
+        shift = index // self.sub_buckets - 1
+        sub = index % self.sub_buckets + self.sub_buckets
+        return ((sub + 1) << shift) * self.resolution
+
+    def record(self, value: float) -> None:
+        index = self._index(max(0.0, value))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return self._upper_bound(index)
+        return 0.0
+
+    def cumulative(self, bounds: Sequence[float]) -> List[int]:
+        """Counts of values at or below each bound, for Prometheus buckets."""
+        ordered = sorted((self._upper_bound(index), count) for index, count in self.counts.items())
+        result, seen, position = [], 0, 0
+        for bound in bounds:
+            while position < len(ordered) and ordered[position][0] <= bound * (1 + 1e-9):
+                seen += ordered[position][1]
+                position += 1
+            result.append(seen)
+        return result
+
+
+class MetricsRegistry:
+    """Thread-safe store of labelled histograms and counters."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.help: Dict[str, str] = {}
+        self.collectors: List[Callable[[], List[str]]] = []
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, help_text: str = '', **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+                self.help.setdefault(name, help_text)
+            histogram.record(value)
+
+    def inc(self, name: str, amount: float = 1, help_text: str = '', **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+            self.help.setdefault(name, help_text)
+
+    def register_collector(self, collector: Callable[[], List[str]]) -> None:
+        """Add a callable returning extra exposition lines, computed at scrape time."""
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{format_labels(labels)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    for bound, count in zip(self.buckets, histogram.cumulative(self.buckets)):
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', f'{bound:g}'),))} {count}")
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+                quantile_name = f"{name}_quantile"
+                lines.append(f"# TYPE {quantile_name} gauge")
+                for labels, histogram in sorted(series.items()):
+                    for q in QUANTILES:
+                        lines.append(
+                            f"{quantile_name}{format_labels(labels + (('quantile', f'{q:g}'),))} "
+                            f"{histogram.quantile(q):.6f}"
+                        )
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+registry = MetricsRegistry()
+
+
+@contextmanager
+def collect_phases() -> Iterator[Dict[str, float]]:
+    """Collect time spent in `timed` phases for the duration of the block."""
+    phases: Dict[str, float] = {}
+    token = _phase_times.set(phases)
+    try:
+        yield phases
+    finally:
+        _phase_times.reset(token)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """
+    Add the block's wall time to `phase` for the current request. A no-op
+    (beyond one context lookup) when the request isn't being sampled.
+    """
+    phases = _phase_times.get()
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - start
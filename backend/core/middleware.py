@@ -0,0 +1,180 @@
+import random
+import re
+import time
+import uuid
+from contextlib import ExitStack
+from typing import Any, Callable, Dict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+
+from core.db import pin_to_primary, reset_primary_pin
+from core.log import request_id_var
+from core.metrics import collect_phases, registry
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+REQUEST_ID_HEADER = 'X-Request-ID'
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs natively under both WSGI and ASGI.
+
+    Under ASGI a sync-only middleware would force Django to run the whole
+    request, async views included, in a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+
+class RequestIdMiddleware(HybridMiddleware):
+    """
+    Gives every request a correlation id, taken from a well-formed X-Request-ID
+    header or generated, and exposes it to logging and the response.
+    """
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        return self.finish(request, response)
+
+    def start(self, request: HttpRequest) -> Any:
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        return request_id_var.set(request_id)
+
+    def finish(self, request: HttpRequest, response: HttpResponse) -> HttpResponse:
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+
+class PrimaryDatabaseMiddleware(HybridMiddleware):
+    """
+    Pins all database reads to the primary for write requests and for views
+    that set `use_primary_db = True`; other reads go to the replicas.
+    """
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = pin_to_primary(request.method not in SAFE_METHODS)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_primary_pin(token)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        token = pin_to_primary(request.method not in SAFE_METHODS)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_primary_pin(token)
+
+    def process_view(self, request: HttpRequest, view_func: Any, view_args: Any, view_kwargs: Dict[str, Any]) -> None:
+        # Undone by the reset in __call__. Under ASGI this runs in a worker thread
+        # and asgiref copies the context change back to the request's task.
+        view = getattr(view_func, 'view_class', view_func)
+        if getattr(view, 'use_primary_db', False):
+            pin_to_primary()
+        return None
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and their total time."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute: Callable, sql: str, params: Any, many: bool, context: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class RequestMetricsMiddleware(HybridMiddleware):
+    """
+    Records per-endpoint wall time, database query count and time, and time
+    spent in instrumented phases (password hashing, template rendering) into
+    the in-process histograms served at /metrics.
+
+    Only a METRICS_SAMPLE_RATE fraction of requests is measured; at 0 the
+    middleware just passes requests through.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        super().__init__(get_response)
+        self.sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 0.0)
+
+    def sampled(self) -> bool:
+        return self.sample_rate > 0 and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            phases = self.instrument(stack, timer)
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, timer, phases)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        if not self.sampled():
+            return await self.get_response(request)
+
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            phases = self.instrument(stack, timer)
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, timer, phases)
+        return response
+
+    def instrument(self, stack: ExitStack, timer: QueryTimer) -> Dict[str, float]:
+        phases = stack.enter_context(collect_phases())
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(timer))
+        return phases
+
+    def record(self, request: HttpRequest, response: HttpResponse, elapsed: float, timer: QueryTimer, phases: Dict[str, float]) -> None:
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.view_name or match.route) if match else 'unmatched'
+        labels = {'endpoint': endpoint, 'method': request.method}
+
+        registry.inc('lms_http_requests_total', help_text="Sampled HTTP requests.", status=str(response.status_code), **labels)
+        registry.observe('lms_http_request_duration_seconds', elapsed, help_text="Request wall time.", **labels)
+        registry.inc('lms_db_queries_total', timer.count, help_text="Database queries issued by sampled requests.", **labels)
+        registry.observe('lms_db_query_duration_seconds', timer.duration, help_text="Database time per request.", **labels)
+        for phase, duration in phases.items():
+            registry.observe(f'lms_{phase}_duration_seconds', duration, help_text=f"Time spent in {phase.replace('_', ' ')} per request.", **labels)
@@ -1,3 +1,48 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+MAX_SUBJECT_LENGTH = 255
+MAX_ERROR_LENGTH = 1000
+
+
+class OutboundEmail(models.Model):
+    """A queued outgoing email, delivered later by the `send_queued_mail` command."""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    # Message envelope and content, enough to rebuild an EmailMultiAlternatives.
+    subject = models.CharField(max_length=MAX_SUBJECT_LENGTH)
+    body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=MAX_SUBJECT_LENGTH)
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list, blank=True)
+    bcc = models.JSONField(default=list, blank=True)
+    reply_to = models.JSONField(default=list, blank=True)
+    headers = models.JSONField(default=dict, blank=True)
+    # List of [content, mimetype] pairs, e.g. the HTML part.
+    alternatives = models.JSONField(default=list, blank=True)
+
+    # Delivery state
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=MAX_ERROR_LENGTH, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('next_attempt_at', 'id')
+        indexes = [
+            # The worker polls for due, queued messages in this order.
+            models.Index(fields=['status', 'next_attempt_at'], name='core_outbound_due_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
@@ -0,0 +1,105 @@
+"""
+The OpenAPI schema, rendered once instead of on every request.
+
+drf_yasg introspects every view and serializer to build the schema. Here it
+is built once per process, or read from the files `manage.py
+export_openapi_schema` writes at deploy time, and served as fixed bytes
+with an ETag so clients can revalidate with If-None-Match.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, NamedTuple
+
+from django.conf import settings
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+logger = logging.getLogger(__name__)
+
+API_INFO = openapi.Info(
+    title="Frank LMS API",
+    default_version='v1',
+    description="Frank LMS API",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="f.kinuthia01@gmail.com"),
+    license=openapi.License(name="BSD License"),
+)
+
+CODECS = {
+    'json': OpenAPICodecJson,
+    'yaml': OpenAPICodecYaml,
+}
+
+_schemas: Dict[str, 'RenderedSchema'] = {}
+_lock = threading.Lock()
+
+
+class RenderedSchema(NamedTuple):
+    body: bytes
+    content_type: str
+    etag: str
+    source: str
+
+
+def schema_filename(fmt: str) -> str:
+    return f'schema.{fmt}'
+
+
+def get_schema_dir() -> str:
+    return str(getattr(settings, 'OPENAPI_SCHEMA_DIR', '') or '')
+
+
+def render_schema(fmt: str) -> bytes:
+    """Introspect the API and encode the public schema in `fmt` ('json' or 'yaml')."""
+    # No request, so the output is the same for every client and host
+    schema = OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+    return bytes(CODECS[fmt](validators=[]).encode(schema))
+
+
+def write_schema(fmt: str, directory: str) -> str:
+    """Render the schema into `directory` atomically and return the file's path."""
+    body = render_schema(fmt)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, schema_filename(fmt))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.schema-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+def get_schema(fmt: str) -> RenderedSchema:
+    """Return the process-wide rendered schema, pre-rendered file first."""
+    schema = _schemas.get(fmt)
+    if schema is None:
+        with _lock:
+            schema = _schemas.get(fmt)
+            if schema is None:
+                schema = _schemas[fmt] = _load_schema(fmt)
+    return schema
+
+
+def _load_schema(fmt: str) -> RenderedSchema:
+    directory = get_schema_dir()
+    path = os.path.join(directory, schema_filename(fmt))
+    if directory and os.path.exists(path):
+        with open(path, 'rb') as f:
+            body, source = f.read(), path
+    else:
+        body, source = render_schema(fmt), 'generated'
+        logger.info("OpenAPI schema generated at runtime; run export_openapi_schema at deploy to skip this")
+    etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+    return RenderedSchema(body, CODECS[fmt].media_type, etag, source)
+
+
+def clear_schemas() -> None:
+    with _lock:
+        _schemas.clear()
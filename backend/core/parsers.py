@@ -0,0 +1,36 @@
+"""
+JSON request parsing with orjson, falling back to DRF's JSONParser without it.
+
+Like JSONParser in strict mode, NaN and infinity are rejected.
+"""
+from typing import Any, IO, Mapping, Optional
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from core.renderers import FastJSONRenderer, orjson
+
+UTF8_NAMES = frozenset(('utf-8', 'utf8'))
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser decoding with orjson."""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream: IO[bytes], media_type: Optional[str] = None,
+              parser_context: Optional[Mapping[str, Any]] = None) -> Any:
+        if orjson is None or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            body = stream.read()
+            if encoding.lower() not in UTF8_NAMES:
+                body = body.decode(encoding)
+            return orjson.loads(body)
+        except ValueError as exc:
+            # orjson.JSONDecodeError and UnicodeDecodeError are both ValueErrors
+            raise ParseError('JSON parse error - %s' % str(exc))
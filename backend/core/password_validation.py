@@ -0,0 +1,221 @@
+"""
+Drop-in replacements for two of Django's password validators.
+
+CommonPasswordValidator decompresses a 20k-entry list into a set in every
+worker. IndexedCommonPasswordValidator looks passwords up in a sorted array
+of 64-bit hashes that `manage.py build_password_index` writes at deploy
+time; the file is memory-mapped read-only, so every worker on a host shares
+the same pages.
+
+UserAttributeSimilarityValidator builds a SequenceMatcher per attribute
+part; FastUserAttributeSimilarityValidator computes the same quick_ratio
+from character counts, with a length bound checked first.
+"""
+import array
+import bisect
+import gzip
+import hashlib
+import logging
+import mmap
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.contrib.auth import password_validation
+from django.contrib.auth.password_validation import CommonPasswordValidator, UserAttributeSimilarityValidator
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.utils.translation import gettext as _
+
+logger = logging.getLogger(__name__)
+
+# Magic, then the byte order of the hash array that follows
+INDEX_MAGIC = b'CPWIDX1'
+HEADER = INDEX_MAGIC + sys.byteorder[0].encode()
+HASH_SIZE = 8
+SPLIT_RE = re.compile(r'\W+')
+# The list CommonPasswordValidator uses by default
+DEFAULT_PASSWORD_LIST_PATH = Path(password_validation.__file__).resolve().parent / 'common-passwords.txt.gz'
+
+_indexes: Dict[Tuple[str, str], 'CommonPasswordIndex'] = {}
+_lock = threading.Lock()
+
+
+def password_hash(password: str) -> int:
+    """64-bit hash of a normalized password, as stored in the index."""
+    digest = hashlib.blake2b(password.lower().strip().encode(), digest_size=HASH_SIZE).digest()
+    return int.from_bytes(digest, sys.byteorder)
+
+
+def read_password_list(path: Any) -> Iterable[str]:
+    """Yield the entries of a (possibly gzipped) password list, like CommonPasswordValidator."""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            yield from (line.strip() for line in f)
+    except OSError:
+        with open(path) as f:
+            yield from (line.strip() for line in f)
+
+
+def build_hashes(passwords: Iterable[str]) -> array.array:
+    return array.array('Q', sorted({password_hash(password) for password in passwords if password}))
+
+
+def write_index(passwords: Iterable[str], path: Any) -> int:
+    """Write the index file atomically and return the number of entries."""
+    hashes = build_hashes(passwords)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.common-passwords-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER)
+            hashes.tofile(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(hashes)
+
+
+class CommonPasswordIndex:
+    """Sorted password hashes, memory-mapped from an index file or built in memory."""
+
+    def __init__(self, hashes: Sequence[int], source: str, handle: Optional[mmap.mmap] = None) -> None:
+        self.hashes = hashes
+        self.source = source
+        self._mmap = handle
+
+    @classmethod
+    def open(cls, path: Any) -> 'CommonPasswordIndex':
+        """Map an index file; raises OSError or ValueError if it's missing or unusable."""
+        with open(path, 'rb') as f:
+            handle = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if handle[:len(HEADER)] != HEADER or (len(handle) - len(HEADER)) % HASH_SIZE:
+            handle.close()
+            raise ValueError(f"{path} is not a common password index for this platform.")
+        return cls(memoryview(handle)[len(HEADER):].cast('Q'), str(path), handle)
+
+    @classmethod
+    def build(cls, passwords: Iterable[str]) -> 'CommonPasswordIndex':
+        return cls(build_hashes(passwords), 'memory')
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __contains__(self, password: str) -> bool:
+        value = password_hash(password)
+        position = bisect.bisect_left(self.hashes, value)
+        return position < len(self.hashes) and self.hashes[position] == value
+
+
+def get_index_path() -> str:
+    return str(getattr(settings, 'COMMON_PASSWORDS_INDEX', '') or '')
+
+
+def get_common_password_index(password_list_path: Any = None) -> CommonPasswordIndex:
+    """
+    Return the process-wide index. Without a usable index file (deploy step
+    skipped), it is built in memory from the password list instead.
+    """
+    path = get_index_path()
+    key = (path, str(password_list_path))
+    index = _indexes.get(key)
+    if index is None:
+        with _lock:
+            index = _indexes.get(key)
+            if index is None:
+                index = _indexes[key] = _load_index(path, password_list_path)
+    return index
+
+
+def _load_index(path: str, password_list_path: Any) -> CommonPasswordIndex:
+    if path and password_list_path is None:
+        try:
+            return CommonPasswordIndex.open(path)
+        except (OSError, ValueError) as error:
+            logger.warning("Common password index unavailable, building it in memory: %s", error)
+    source = password_list_path or DEFAULT_PASSWORD_LIST_PATH
+    return CommonPasswordIndex.build(read_password_list(source))
+
+
+def clear_indexes() -> None:
+    with _lock:
+        _indexes.clear()
+
+
+class IndexedCommonPasswordValidator(CommonPasswordValidator):
+    """CommonPasswordValidator backed by the shared, memory-mapped hash index."""
+
+    def __init__(self, password_list_path: Any = None) -> None:
+        # Skip the parent's eager load of the password list
+        self.password_list_path = password_list_path
+
+    @property
+    def passwords(self) -> CommonPasswordIndex:
+        return get_common_password_index(self.password_list_path)
+
+    def validate(self, password: str, user: Any = None) -> None:
+        if password in self.passwords:
+            raise ValidationError(
+                _("This password is too common."),
+                code="password_too_common",
+            )
+
+
+class FastUserAttributeSimilarityValidator(UserAttributeSimilarityValidator):
+    """
+    UserAttributeSimilarityValidator with the same results and less work.
+
+    SequenceMatcher.quick_ratio() is 2 * (characters in common) / (total
+    length), so it is computed straight from character counts. The length
+    bound 2 * min(len) / total caps that ratio and is checked first, and
+    repeated attribute parts are compared once.
+    """
+
+    def validate(self, password: str, user: Any = None) -> None:
+        if not user:
+            return
+
+        password = password.lower()
+        password_counts = list(Counter(password).items())
+        seen = set()
+        for attribute_name in self.user_attributes:
+            value = getattr(user, attribute_name, None)
+            if not value or not isinstance(value, str):
+                continue
+            value_lower = value.lower()
+            for value_part in SPLIT_RE.split(value_lower) + [value_lower]:
+                if value_part in seen:
+                    continue
+                seen.add(value_part)
+                if self.similarity(password, password_counts, value_part) >= self.max_similarity:
+                    self.reject(user, attribute_name)
+
+    def similarity(self, password: str, password_counts: List[Tuple[str, int]], value: str) -> float:
+        total = len(password) + len(value)
+        if not total:
+            return 1.0
+        if 2 * min(len(password), len(value)) < self.max_similarity * total:
+            return 0.0
+        common = 0
+        for char, count in password_counts:
+            found = value.count(char)
+            common += count if count < found else found
+        return 2.0 * common / total
+
+    def reject(self, user: Any, attribute_name: str) -> None:
+        try:
+            verbose_name = str(user._meta.get_field(attribute_name).verbose_name)
+        except FieldDoesNotExist:
+            verbose_name = attribute_name
+        raise ValidationError(
+            _("The password is too similar to the %(verbose_name)s."),
+            code="password_too_similar",
+            params={"verbose_name": verbose_name},
+        )
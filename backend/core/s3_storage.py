@@ -0,0 +1,15 @@
+from typing import Any, Dict
+
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from core.storage import CONTENT_PREFIX, IMMUTABLE_CACHE_CONTROL
+
+
+class MediaStorage(S3Boto3Storage):
+    """S3 media storage that marks content-addressed objects as cacheable forever."""
+
+    def get_object_parameters(self, name: str) -> Dict[str, Any]:
+        params = super().get_object_parameters(name)
+        if name.startswith(CONTENT_PREFIX + '/'):
+            params.setdefault('CacheControl', IMMUTABLE_CACHE_CONTROL)
+        return params
@@ -0,0 +1,267 @@
+"""
+Static and media file serving that keeps Django workers out of the byte path.
+
+`collectstatic` writes hashed file names through
+CompressedManifestStaticFilesStorage, with a .gz (and, when the `brotli`
+package is installed, a .br) copy of every compressible file.
+StaticFilesMiddleware indexes STATIC_ROOT once per process and answers
+static requests before the rest of the stack runs: it picks the best
+precompressed copy for the client, marks hashed names as immutable and
+returns a FileResponse, which WSGI servers with `wsgi.file_wrapper` send
+with sendfile().
+
+Media files are handed to the front proxy with X-Accel-Redirect (nginx) or
+X-Sendfile (Apache, lighttpd) according to MEDIA_SENDFILE; see
+`media_response`. Without a hand-off they are only served under DEBUG, and
+`check_media_serving` warns at startup when neither is set.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import quote
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core import checks
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, HttpRequest, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+from core.middleware import HybridMiddleware
+from core.storage import CONTENT_PREFIX, IMMUTABLE_CACHE_CONTROL
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Already compressed, or too small to be worth it
+INCOMPRESSIBLE_EXTENSIONS = {
+    '.br', '.gz', '.zip', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif',
+    '.woff', '.woff2', '.mp3', '.mp4', '.webm', '.pdf',
+}
+MIN_COMPRESS_SIZE = 256
+# A compressed copy is kept only when it saves at least this fraction
+MIN_SAVING = 0.05
+DEFAULT_MAX_AGE = 60
+
+
+def compress_file(path: str) -> List[str]:
+    """Write the .gz and .br siblings of `path` where they are worth it and return their paths."""
+    if os.path.splitext(path)[1].lower() in INCOMPRESSIBLE_EXTENSIONS:
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return []
+
+    compressors: Dict[str, Callable[[bytes], bytes]] = {
+        # mtime=0 keeps the output identical between deploys
+        '.gz': lambda raw: gzip.compress(raw, compresslevel=9, mtime=0),
+    }
+    if brotli is not None:
+        compressors['.br'] = lambda raw: brotli.compress(raw, quality=11)
+    written = []
+    for suffix, compress in compressors.items():
+        compressed = compress(data)
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also precompresses what it collects.
+
+    Names missing from the manifest, or every name before `collectstatic` has
+    run, resolve to the unhashed name instead of failing the page that
+    renders `{% static %}`; they just miss out on far-future caching.
+    """
+
+    manifest_strict = False
+
+    def stored_name(self, name: str) -> str:
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not in STATIC_ROOT either, so there is nothing to hash
+            return name
+
+    def post_process(self, paths: Dict[str, Any], dry_run: bool = False, **options: Any) -> Iterator[Tuple[str, str, bool]]:
+        names: Set[str] = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            names.add(name)
+            if isinstance(hashed_name, str):
+                names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(names):
+            compress_file(self.path(name))
+
+
+class StaticFile(NamedTuple):
+    path: str
+    size: int
+    content_type: str
+    last_modified: str
+    etag: str
+    cache_control: str
+    # Content-Encoding -> (path, size) of the precompressed copies
+    encodings: Dict[str, Tuple[str, int]]
+
+
+def index_static_files(root: str, immutable_names: Iterable[str] = (), max_age: int = DEFAULT_MAX_AGE) -> Dict[str, StaticFile]:
+    """Map URL path (relative to STATIC_URL) to file details for everything under `root`."""
+    immutable = set(immutable_names)
+    found: Dict[str, os.stat_result] = {}
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            found[os.path.relpath(path, root).replace(os.sep, '/')] = os.stat(path)
+
+    files = {}
+    for name, stat in found.items():
+        stem, extension = os.path.splitext(name)
+        # A .gz/.br next to its original is an encoding of it, not a file of its own
+        if extension in ('.gz', '.br') and stem in found:
+            continue
+        encodings = {
+            encoding: (os.path.join(root, name + suffix), found[name + suffix].st_size)
+            for encoding, suffix in ENCODINGS if name + suffix in found
+        }
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        files[name] = StaticFile(
+            path=os.path.join(root, name),
+            size=stat.st_size,
+            content_type=content_type,
+            last_modified=http_date(stat.st_mtime),
+            etag=f'{int(stat.st_mtime):x}-{stat.st_size:x}',
+            cache_control=IMMUTABLE_CACHE_CONTROL if name in immutable else f'public, max-age={max_age}',
+            encodings=encodings,
+        )
+    return files
+
+
+def accepted_encodings(header: str) -> Set[str]:
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == '*':
+        return True
+    return any(candidate.strip().removeprefix('W/') == etag for candidate in header.split(','))
+
+
+class StaticFilesMiddleware(HybridMiddleware):
+    """
+    Serves files collected into STATIC_ROOT. Place it near the top of
+    MIDDLEWARE so static requests skip sessions, auth and the URL resolver.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        super().__init__(get_response)
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+        root = settings.STATIC_ROOT
+        # Hashed names from the manifest never change content
+        immutable = getattr(staticfiles_storage, 'hashed_files', {}).values()
+        max_age = getattr(settings, 'STATIC_MAX_AGE', DEFAULT_MAX_AGE)
+        self.files = index_static_files(str(root), immutable, max_age) if root and os.path.isdir(root) else {}
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.serve(request)
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        response = self.serve(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
+
+    def serve(self, request: HttpRequest) -> Optional[HttpResponse]:
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.prefix):
+            return None
+        static = self.files.get(request.path_info[len(self.prefix):])
+        if static is None:
+            return None
+
+        path, size, encoding = static.path, static.size, ''
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        for candidate, (candidate_path, candidate_size) in static.encodings.items():
+            if candidate in accepted:
+                path, size, encoding = candidate_path, candidate_size, candidate
+                break
+        etag = f'"{static.etag}-{encoding}"' if encoding else f'"{static.etag}"'
+
+        if etag_matches(request.headers.get('If-None-Match', ''), etag):
+            response: HttpResponse = HttpResponseNotModified()
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=static.content_type)
+            response['Content-Length'] = str(size)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=static.content_type)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if static.encodings:
+            response['Vary'] = 'Accept-Encoding'
+        response['ETag'] = etag
+        response['Last-Modified'] = static.last_modified
+        response['Cache-Control'] = static.cache_control
+        return response
+
+
+def check_media_serving(app_configs: Any, **kwargs: Any) -> List[checks.CheckMessage]:
+    """Warn when core.views.media has neither DEBUG nor a proxy hand-off and so serves nothing."""
+    if settings.DEBUG or getattr(settings, 'MEDIA_SENDFILE', ''):
+        return []
+    return [checks.Warning(
+        "Media files are not served: DEBUG is off and MEDIA_SENDFILE is not set.",
+        hint="Set MEDIA_SENDFILE to 'x-accel-redirect' or 'x-sendfile', or serve MEDIA_URL from the front proxy or storage.",
+        id='core.W001',
+    )]
+
+
+def media_response(path: str) -> HttpResponse:
+    """
+    Response for the file at `path` (relative to MEDIA_ROOT, already checked
+    to exist), handed off to the front proxy when MEDIA_SENDFILE is set.
+    """
+    mode = getattr(settings, 'MEDIA_SENDFILE', '')
+    full_path = os.path.join(settings.MEDIA_ROOT, path)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    if mode == 'x-accel-redirect':
+        # nginx serves the file from an `internal` location mapped to MEDIA_ROOT
+        response: HttpResponse = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = posixpath.join(prefix, quote(path))
+    elif mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    # Content-addressed names (core.storage) never change
+    if path.startswith(CONTENT_PREFIX + '/'):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = f'public, max-age={getattr(settings, "STATIC_MAX_AGE", DEFAULT_MAX_AGE)}'
+    return response
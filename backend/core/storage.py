@@ -0,0 +1,32 @@
+"""
+Content-addressed media storage.
+
+Files are named after the SHA-256 of their bytes, so a name never changes
+meaning: identical uploads are stored once and CDNs can cache every URL
+forever.
+"""
+from typing import Optional
+
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+
+CONTENT_PREFIX = 'images'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def content_name(digest: str, extension: str) -> str:
+    """Storage name for content with the given SHA-256 hex digest."""
+    return f"{CONTENT_PREFIX}/{digest[:2]}/{digest}.{extension}"
+
+
+def save_content_addressed(content: File, digest: str, extension: str, storage: Optional[Storage] = None) -> str:
+    """
+    Store `content` under its digest and return the storage name. Content
+    that is already stored is not uploaded again.
+    """
+    storage = storage or default_storage
+    name = content_name(digest, extension)
+    if storage.exists(name):
+        return name
+    # Storage streams `content` in chunks; a concurrent writer of the same bytes may win the name
+    return storage.save(name, content)
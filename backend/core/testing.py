@@ -0,0 +1,46 @@
+"""
+Test runner for `manage.py test`.
+
+CACHES points at Redis or a cache directory shared with running workers, and
+the tests clear the default cache. Runs are given caches of the same shape
+whose shared tier is a core.cache.FileCache in a directory made for the run,
+so they never touch (or flush) a configured cache, throttle buckets and locks
+don't carry over between runs, and locking still goes through the atomic
+`add` that works across processes.
+"""
+import os
+import shutil
+import tempfile
+from typing import Any, Dict
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def isolated_caches(directory: str) -> Dict[str, Any]:
+    """CACHES with every cache other than the tiered front replaced by a FileCache under `directory`."""
+    caches = {}
+    for alias, config in settings.CACHES.items():
+        if config['BACKEND'] == 'core.cache.TieredCache':
+            caches[alias] = config
+        else:
+            caches[alias] = {
+                'BACKEND': 'core.cache.FileCache',
+                'LOCATION': os.path.join(directory, alias),
+                'OPTIONS': config.get('OPTIONS', {}) if config['BACKEND'] == 'core.cache.FileCache' else {},
+            }
+    return caches
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs: Any) -> None:
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp(prefix='lms-test-cache-')
+        self._caches = override_settings(CACHES=isolated_caches(self._cache_dir))
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs: Any) -> None:
+        self._caches.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1035 @@
-from django.test import TestCase
+import datetime
+import decimal
+import io
+import json
+import logging
+import gc
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+import orjson
+from asgiref.sync import sync_to_async
+from django.contrib.auth.password_validation import CommonPasswordValidator, UserAttributeSimilarityValidator
+from django.core import mail
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.db import OperationalError, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core import mail as mail_queue
+from core import openapi
+from core.db import PrimaryReplicaRouter, use_primary
+from core.executors import run_cpu_bound, submit
+from core.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+from core.log import JsonFormatter, QueueListenerHandler, RequestIdFilter, SamplingFilter
+from core.middleware import PrimaryDatabaseMiddleware, RequestIdMiddleware
+from core.memory import parse_smaps, prepare_for_fork
+from core.management.commands.profile_startup import parse_import_times
+from core.parsers import FastJSONParser
+from core.renderers import FastJSONRenderer
+from core.static import StaticFilesMiddleware, check_media_serving
+from core.testing import isolated_caches
+from core.password_validation import (
+    CommonPasswordIndex, FastUserAttributeSimilarityValidator, IndexedCommonPasswordValidator, clear_indexes, write_index,
+)
+from core.metrics import Histogram, MetricsRegistry, collect_phases, registry, timed
+from core.email_templates import PrecompiledEmailTemplate, clear_email_templates, get_email_template
+from core.models import OutboundEmail
+from userauths.models import User
+
+LOCMEM_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """Delivery backend that always raises, used to exercise retries."""
+
+    def send_messages(self, email_messages):
+        raise ConnectionError("Mail provider unavailable")
+
+
+def make_message(to: str = 'student@example.com') -> EmailMultiAlternatives:
+    msg = EmailMultiAlternatives(
+        subject="Password Reset Request",
+        body="Plain body",
+        from_email="LMS <noreply@example.com>",
+        to=[to],
+        headers={"X-Mailgun-Variables": {"user_id": "1"}},
+    )
+    msg.attach_alternative("<p>HTML body</p>", "text/html")
+    return msg
+
+
+@override_settings(MAIL_QUEUE_DELIVERY_BACKEND=LOCMEM_BACKEND)
+class OutboundMailQueueTests(TestCase):
+    def test_queued_backend_stores_message_without_sending(self):
+        with self.settings(EMAIL_BACKEND=mail_queue.QUEUED_EMAIL_BACKEND):
+            self.assertEqual(make_message().send(), 1)
+
+        self.assertEqual(len(mail.outbox), 0)
+        outbound = OutboundEmail.objects.get()
+        self.assertEqual(outbound.status, OutboundEmail.STATUS_QUEUED)
+        self.assertEqual(outbound.to, ['student@example.com'])
+        self.assertEqual(outbound.alternatives, [['<p>HTML body</p>', 'text/html']])
+
+    def test_deliver_batch_sends_and_marks_rows(self):
+        for i in range(3):
+            mail_queue.enqueue(make_message(f'student{i}@example.com'))
+
+        self.assertEqual(mail_queue.deliver_batch(batch_size=2), (2, 0, 0))
+        self.assertEqual(mail_queue.deliver_batch(batch_size=2), (1, 0, 0))
+        self.assertEqual(mail_queue.deliver_batch(batch_size=2), (0, 0, 0))
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].alternatives, [('<p>HTML body</p>', 'text/html')])
+        self.assertEqual(mail.outbox[0].extra_headers, {"X-Mailgun-Variables": {"user_id": "1"}})
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.STATUS_SENT).exists())
+
+    @override_settings(
+        MAIL_QUEUE_DELIVERY_BACKEND='core.tests.FailingEmailBackend',
+        MAIL_QUEUE_MAX_ATTEMPTS=2,
+    )
+    def test_failed_delivery_is_retried_then_given_up(self):
+        outbound = mail_queue.enqueue(make_message())
+
+        self.assertEqual(mail_queue.deliver_batch(), (0, 1, 0))
+        outbound.refresh_from_db()
+        self.assertEqual(outbound.status, OutboundEmail.STATUS_QUEUED)
+        self.assertGreater(outbound.next_attempt_at, timezone.now())
+        self.assertIn("unavailable", outbound.last_error)
+
+        # Not due yet, so the next batch skips it.
+        self.assertEqual(mail_queue.deliver_batch(), (0, 0, 0))
+
+        OutboundEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(mail_queue.deliver_batch(), (0, 0, 1))
+        outbound.refresh_from_db()
+        self.assertEqual(outbound.status, OutboundEmail.STATUS_FAILED)
+        self.assertEqual(outbound.attempts, 2)
+
+    def test_claimed_messages_are_leased_to_one_worker(self):
+        mail_queue.enqueue(make_message())
+        mail_queue.enqueue(make_message())
+
+        claimed = mail_queue.claim_batch(batch_size=1)
+        self.assertEqual(len(claimed), 1)
+        # The next worker only sees the message nobody has leased
+        remaining = mail_queue.claim_batch()
+        self.assertEqual(len(remaining), 1)
+        self.assertNotEqual(remaining[0].pk, claimed[0].pk)
+        self.assertEqual(mail_queue.claim_batch(), [])
+
+    def test_send_queued_mail_command_drains_queue(self):
+        mail_queue.enqueue(make_message())
+        out = io.StringIO()
+        call_command('send_queued_mail', stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("Done: 1 sent, 0 retrying, 0 failed", out.getvalue())
+
+
+class PrecompiledEmailTemplateTests(SimpleTestCase):
+    template_name = 'email/password_reset.html'
+    fields = ('user.full_name', 'reset_link')
+
+    def tearDown(self):
+        clear_email_templates()
+
+    def test_render_matches_render_to_string_and_strip_tags(self):
+        context = {
+            'user': {'full_name': 'Zoë <O\'Brien>'},
+            'reset_link': 'http://localhost:5173/create-new-password/?otp=1&uuid=2',
+        }
+        html = render_to_string(self.template_name, context)
+
+        rendered = get_email_template(self.template_name, self.fields).render(context)
+
+        self.assertEqual(rendered, (html, strip_tags(html)))
+
+    def test_template_is_compiled_once_per_process(self):
+        first = get_email_template(self.template_name, self.fields)
+        self.assertIs(get_email_template(self.template_name, self.fields), first)
+
+    def test_field_not_rendered_directly_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            PrecompiledEmailTemplate(self.template_name, ('user.username',))
+
+
+REPLICA = 'replica_0'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class PrimaryReplicaRoutingTests(TransactionTestCase):
+    """
+    Routes against a replica simulated by a second SQLite file. Reads inside a
+    transaction stay on the primary, hence TransactionTestCase.
+    """
+
+    # The replica alias only exists once setUpClass has registered it
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        config = connections.configure_settings({
+            'default': {},
+            REPLICA: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': cls.replica_path},
+        })
+        connections.settings[REPLICA] = config[REPLICA]
+        with connections[REPLICA].schema_editor() as editor:
+            editor.create_model(User)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        self.user = User.objects.create(email='student@example.com', full_name='Primary copy')
+        # The replica lags behind and still has the old name (bulk_create skips the profile signal)
+        User.objects.using(REPLICA).bulk_create([
+            User(pk=self.user.pk, email='student@example.com', username='student', full_name='Replica copy')
+        ])
+
+    def tearDown(self):
+        with connections[REPLICA].cursor() as cursor:
+            cursor.execute('DELETE FROM userauths_user')
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(User), REPLICA)
+        self.assertEqual(router.db_for_write(User), 'default')
+        self.assertEqual(User.objects.get(pk=self.user.pk).full_name, 'Replica copy')
+
+    def test_use_primary_pins_reads(self):
+        with use_primary():
+            self.assertEqual(User.objects.get(pk=self.user.pk).full_name, 'Primary copy')
+        self.assertEqual(User.objects.get(pk=self.user.pk).full_name, 'Replica copy')
+
+    def test_middleware_pins_unsafe_methods_and_flagged_views(self):
+        seen = []
+
+        def view(request):
+            seen.append(User.objects.get(pk=self.user.pk).full_name)
+
+        def flagged_view(request):
+            seen.append(User.objects.get(pk=self.user.pk).full_name)
+        flagged_view.use_primary_db = True
+
+        factory = RequestFactory()
+        for request, view_func in [
+            (factory.get('/'), view),
+            (factory.post('/'), view),
+            (factory.get('/'), flagged_view),
+        ]:
+            def get_response(request, view_func=view_func):
+                middleware.process_view(request, view_func, (), {})
+                return view_func(request)
+            middleware = PrimaryDatabaseMiddleware(get_response)
+            middleware(request)
+
+        self.assertEqual(seen, ['Replica copy', 'Primary copy', 'Primary copy'])
+        self.assertEqual(User.objects.get(pk=self.user.pk).full_name, 'Replica copy')
+
+    async def test_view_pin_applies_under_the_async_handler(self):
+        seen = []
+
+        def flagged_view(request):
+            seen.append(User.objects.get(pk=self.user.pk).full_name)
+        flagged_view.use_primary_db = True
+
+        async def get_response(request):
+            # The async handler runs sync process_view hooks in a worker thread
+            await sync_to_async(middleware.process_view)(request, flagged_view, (), {})
+            await sync_to_async(flagged_view)(request)
+            return HttpResponse()
+        middleware = PrimaryDatabaseMiddleware(get_response)
+        await middleware(RequestFactory().get('/'))
+
+        self.assertEqual(seen, ['Primary copy'])
+        name = await sync_to_async(lambda: User.objects.get(pk=self.user.pk).full_name)()
+        self.assertEqual(name, 'Replica copy')
+
+    def test_reads_inside_a_primary_transaction_stay_on_the_primary(self):
+        with transaction.atomic():
+            self.assertEqual(User.objects.get(pk=self.user.pk).full_name, 'Primary copy')
+
+    def test_migrations_only_run_on_the_primary(self):
+        router = PrimaryReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'userauths'))
+        self.assertFalse(router.allow_migrate(REPLICA, 'userauths'))
+
+
+class HealthCheckTests(TestCase):
+    def test_reports_database_status(self):
+        response = self.client.get('/health/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['databases']['default'], 'ok')
+
+    def test_failures_are_logged_not_returned(self):
+        error = OperationalError('could not connect to server at "db.internal" as user "lms"')
+        with mock.patch.object(connections['default'], 'cursor', side_effect=error), \
+                self.assertLogs('core.views', 'ERROR'):
+            response = self.client.get('/health/')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'status': 'error', 'databases': {'default': 'error'}})
+
+
+class StructuredLoggingTests(SimpleTestCase):
+    def make_logger(self, handler: logging.Handler) -> logging.Logger:
+        logger = logging.getLogger(f'core.tests.{self._testMethodName}')
+        logger.handlers = [handler]
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        self.addCleanup(setattr, logger, 'handlers', [])
+        return logger
+
+    def test_records_are_written_as_json_off_thread_with_request_id(self):
+        stream = io.StringIO()
+        handler = QueueListenerHandler(stream=stream)
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(RequestIdFilter())
+        logger = self.make_logger(handler)
+
+        def view(request):
+            logger.info("Reset %s", "queued", extra={'user_id': 7})
+            try:
+                raise ValueError("boom")
+            except ValueError:
+                logger.exception("Failed")
+            return HttpResponse()
+
+        response = RequestIdMiddleware(view)(RequestFactory().get('/', HTTP_X_REQUEST_ID='abc-123'))
+        handler.stop()
+
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+        first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(first['message'], 'Reset queued')
+        self.assertEqual(first['user_id'], 7)
+        self.assertEqual(first['request_id'], 'abc-123')
+        self.assertIn('ValueError: boom', second['exc_info'])
+
+    def test_malformed_request_id_is_replaced(self):
+        response = RequestIdMiddleware(lambda request: HttpResponse())(
+            RequestFactory().get('/', HTTP_X_REQUEST_ID='bad id\n')
+        )
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = QueueListenerHandler(stream=io.StringIO(), queue_size=1)
+        handler.listener.stop()
+        logger = self.make_logger(handler)
+
+        logger.info("one")
+        logger.info("two")
+
+        self.assertEqual(handler.dropped, 1)
+
+    def test_sampling_only_applies_to_low_levels(self):
+        sampler = SamplingFilter(rate=0.0)
+        debug = logging.LogRecord('x', logging.DEBUG, '', 0, 'debug', (), None)
+        error = logging.LogRecord('x', logging.ERROR, '', 0, 'error', (), None)
+
+        self.assertFalse(sampler.filter(debug))
+        self.assertTrue(sampler.filter(error))
+
+
+class HistogramTests(SimpleTestCase):
+    def test_quantiles_stay_within_relative_error(self):
+        histogram = Histogram()
+        for millis in range(1, 1001):
+            histogram.record(millis / 1000)
+
+        for q, expected in ((0.5, 0.5), (0.95, 0.95), (0.99, 0.99)):
+            self.assertAlmostEqual(histogram.quantile(q), expected, delta=expected / 32)
+        self.assertEqual(histogram.count, 1000)
+
+    def test_cumulative_buckets(self):
+        histogram = Histogram()
+        for value in (0.0004, 0.002, 0.003, 0.2, 20):
+            histogram.record(value)
+        self.assertEqual(histogram.cumulative([0.001, 0.005, 0.5, 10]), [1, 3, 4, 4])
+
+    def test_render_prometheus_text(self):
+        metrics = MetricsRegistry(buckets=(0.1, 1))
+        metrics.observe('lms_test_seconds', 0.05, help_text="Test.", endpoint='a')
+        metrics.inc('lms_test_total', 2, endpoint='a')
+        output = metrics.render()
+
+        self.assertIn('# TYPE lms_test_seconds histogram', output)
+        self.assertIn('lms_test_seconds_bucket{endpoint="a",le="0.1"} 1', output)
+        self.assertIn('lms_test_seconds_bucket{endpoint="a",le="+Inf"} 1', output)
+        self.assertIn('lms_test_seconds_quantile{endpoint="a",quantile="0.99"}', output)
+        self.assertIn('lms_test_total{endpoint="a"} 2', output)
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0, METRICS_AUTH_TOKEN='', INTERNAL_IPS=['127.0.0.1'])
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def test_sampled_request_is_recorded(self):
+        self.client.get('/health/')
+        output = self.client.get('/metrics').content.decode()
+
+        self.assertIn('lms_http_requests_total{endpoint="health",method="GET",status="200"} 1', output)
+        self.assertIn('lms_http_request_duration_seconds_count{endpoint="health",method="GET"} 1', output)
+        self.assertIn('lms_db_queries_total{endpoint="health",method="GET"} 1', output)
+
+    @override_settings(METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client.get('/health/')
+        self.assertNotIn('lms_http_requests_total', registry.render())
+
+    def test_password_hashing_phase(self):
+        with collect_phases() as phases:
+            PBKDF2PasswordHasher().encode('password', 'salt', iterations=1)
+        self.assertIn('password_hash', phases)
+
+    def test_timed_outside_a_request_is_a_noop(self):
+        with timed('password_hash'):
+            pass
+
+    @override_settings(METRICS_AUTH_TOKEN='secret', INTERNAL_IPS=[])
+    def test_metrics_endpoint_requires_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    @override_settings(INTERNAL_IPS=[])
+    def test_metrics_endpoint_is_closed_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+        with override_settings(INTERNAL_IPS=['10.0.0.5']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+
+class CpuExecutorTests(SimpleTestCase):
+    async def test_work_runs_off_the_event_loop_thread(self):
+        thread = await run_cpu_bound(lambda: threading.current_thread())
+        self.assertNotEqual(thread, threading.current_thread())
+        self.assertTrue(thread.name.startswith('cpu-bound'))
+
+    async def test_phases_recorded_on_the_pool_are_collected(self):
+        def hash_password():
+            with timed('password_hash'):
+                pass
+
+        with collect_phases() as phases:
+            await run_cpu_bound(hash_password)
+        self.assertIn('password_hash', phases)
+
+        # Background jobs, like the rehash after login
+        with collect_phases() as phases:
+            submit(hash_password).result()
+        self.assertIn('password_hash', phases)
+
+
+class TunableHasherTests(SimpleTestCase):
+    @override_settings(PASSWORD_HASHER_COSTS={'scrypt': {'work_factor': 2 ** 10}})
+    def test_costs_come_from_settings(self):
+        hasher = ScryptPasswordHasher()
+        encoded = hasher.encode('password', hasher.salt())
+
+        self.assertTrue(encoded.startswith('scrypt$1024$'))
+        self.assertTrue(hasher.verify('password', encoded))
+        self.assertFalse(hasher.must_update(encoded))
+        with override_settings(PASSWORD_HASHER_COSTS={}):
+            # Django's default work factor now applies, so the hash is upgraded on login
+            self.assertTrue(hasher.must_update(encoded))
+            self.assertTrue(hasher.verify('password', encoded))
+
+    def test_calibration_suggests_costs_within_budget(self):
+        out = io.StringIO()
+        call_command(
+            'calibrate_hashers', algorithm=['scrypt', 'pbkdf2_sha256'], target_ms=5, samples=1, stdout=out,
+        )
+        output = out.getvalue()
+
+        self.assertIn('PASSWORD_HASHER=scrypt', output)
+        costs = json.loads(output.split("PASSWORD_HASHER_COSTS='")[1].split("'")[0])
+        self.assertEqual(set(costs), {'scrypt', 'pbkdf2_sha256'})
+        self.assertGreaterEqual(costs['pbkdf2_sha256']['iterations'], 10_000)
+
+
+class PasswordValidationTests(SimpleTestCase):
+    def setUp(self):
+        clear_indexes()
+        self.addCleanup(clear_indexes)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.index_path = os.path.join(self.tmpdir.name, 'common-passwords.idx')
+
+    def test_index_round_trip(self):
+        self.assertEqual(write_index(['password', 'qwerty', 'qwerty', ''], self.index_path), 2)
+        index = CommonPasswordIndex.open(self.index_path)
+
+        self.assertEqual(len(index), 2)
+        self.assertIn(' Password', index)
+        self.assertNotIn('correct-horse-battery', index)
+
+    def test_rejects_files_that_are_not_an_index(self):
+        with open(self.index_path, 'wb') as f:
+            f.write(b'not an index')
+        with self.assertRaises(ValueError):
+            CommonPasswordIndex.open(self.index_path)
+
+    def test_validator_uses_the_built_index(self):
+        out = io.StringIO()
+        call_command('build_password_index', output=self.index_path, stdout=out)
+        self.assertIn(f'Indexed {len(CommonPasswordValidator().passwords)} passwords', out.getvalue())
+
+        with override_settings(COMMON_PASSWORDS_INDEX=self.index_path):
+            validator = IndexedCommonPasswordValidator()
+            self.assertEqual(validator.passwords.source, self.index_path)
+            with self.assertRaises(ValidationError) as raised:
+                validator.validate('Password')
+            self.assertEqual(raised.exception.code, 'password_too_common')
+            validator.validate('correct-horse-battery-staple')
+
+    def test_missing_index_falls_back_to_the_password_list(self):
+        with override_settings(COMMON_PASSWORDS_INDEX=self.index_path), self.assertLogs('core.password_validation', 'WARNING'):
+            validator = IndexedCommonPasswordValidator()
+            with self.assertRaises(ValidationError):
+                validator.validate('123456')
+        self.assertEqual(validator.passwords.source, 'memory')
+
+    def test_similarity_matches_django(self):
+        django_validator = UserAttributeSimilarityValidator(user_attributes=('username', 'full_name', 'email'))
+        fast_validator = FastUserAttributeSimilarityValidator(user_attributes=('username', 'full_name', 'email'))
+        users = [
+            User(username='student', full_name='Student One', email='student.one@example.com'),
+            User(username='jo', full_name='', email='jo@x.io'),
+        ]
+        passwords = ['student1', 'Studentone', 'example', 'x', 'j', 'one', 'tnedutS', 'correct-horse', 'jo@x.io!']
+
+        for user in users:
+            for password in passwords:
+                with self.subTest(user=user.username, password=password):
+                    self.assertEqual(self.outcome(django_validator, password, user), self.outcome(fast_validator, password, user))
+
+    def outcome(self, validator, password, user):
+        try:
+            validator.validate(password, user)
+        except ValidationError as error:
+            return error.messages
+        return None
+
+
+class StaticFilesTests(SimpleTestCase):
+    stylesheet = 'body { color: #333; }\n' * 200
+
+    def setUp(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        source = os.path.join(workdir, 'source')
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'app.css'), 'w') as f:
+            f.write(self.stylesheet)
+        with open(os.path.join(source, 'logo.png'), 'wb') as f:
+            f.write(b'\x89PNG' + b'\0' * 1000)
+
+        static = override_settings(
+            STATIC_ROOT=os.path.join(workdir, 'static'),
+            STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        static.enable()
+        self.addCleanup(static.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        self.hashed_name = staticfiles_storage.stored_name('css/app.css')
+        self.middleware = StaticFilesMiddleware(lambda request: HttpResponse('from the view'))
+        self.factory = RequestFactory()
+
+    def get(self, path, **headers):
+        return self.middleware(self.factory.get(path, **headers))
+
+    def test_collectstatic_precompresses_compressible_files(self):
+        root = self.middleware.files[self.hashed_name].path
+        with gzip.open(root + '.gz', 'rt') as f:
+            self.assertEqual(f.read(), self.stylesheet)
+        self.assertFalse(os.path.exists(self.middleware.files['logo.png'].path + '.gz'))
+
+    def test_serves_gzip_to_clients_that_accept_it(self):
+        response = self.get(f'/static/{self.hashed_name}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Content-Type'], 'text/css; charset=utf-8')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode(), self.stylesheet)
+
+    def test_hashed_names_are_immutable_and_revalidate_with_etags(self):
+        response = self.get(f'/static/{self.hashed_name}')
+
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(int(response['Content-Length']), len(self.stylesheet))
+        response.close()
+
+        revalidated = self.get(f'/static/{self.hashed_name}', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_unhashed_names_get_a_short_lifetime(self):
+        response = self.get('/static/css/app.css')
+
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+        response.close()
+
+    def test_other_requests_reach_the_view(self):
+        self.assertEqual(self.get('/static/missing.css').content, b'from the view')
+        self.assertEqual(self.get('/api/v1/').content, b'from the view')
+
+    def test_uncollected_names_fall_back_to_the_unhashed_url(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        self.assertEqual(staticfiles_storage.url('css/app.css'), f'/static/{self.hashed_name}')
+        self.assertEqual(staticfiles_storage.url('admin/css/base.css'), '/static/admin/css/base.css')
+        empty_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, empty_root)
+        with override_settings(STATIC_ROOT=empty_root):
+            self.assertEqual(staticfiles_storage.url('css/app.css'), '/static/css/app.css')
+
+
+class MediaServingTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        os.makedirs(os.path.join(media_root, 'images', 'ab'))
+        with open(os.path.join(media_root, 'images', 'ab', 'abc.webp'), 'wb') as f:
+            f.write(b'RIFF....WEBP')
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.media_root = media_root
+
+    def test_hands_off_to_nginx_with_x_accel_redirect(self):
+        with override_settings(MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/'):
+            response = self.client.get('/media/images/ab/abc.webp')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/images/ab/abc.webp')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response.content, b'')
+
+    def test_hands_off_with_x_sendfile(self):
+        with override_settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.client.get('/media/images/ab/abc.webp')
+
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'images', 'ab', 'abc.webp'))
+
+    def test_streams_the_file_without_a_proxy_under_debug(self):
+        with override_settings(MEDIA_SENDFILE='', DEBUG=True):
+            response = self.client.get('/media/images/ab/abc.webp')
+
+        self.assertEqual(b''.join(response.streaming_content), b'RIFF....WEBP')
+        response.close()
+
+    def test_serves_nothing_without_debug_or_a_proxy(self):
+        with override_settings(MEDIA_SENDFILE='', DEBUG=False):
+            response = self.client.get('/media/images/ab/abc.webp')
+            warnings = check_media_serving(None)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual([warning.id for warning in warnings], ['core.W001'])
+
+        with override_settings(MEDIA_SENDFILE='x-sendfile', DEBUG=False):
+            self.assertEqual(check_media_serving(None), [])
+
+    def test_rejects_missing_files_and_paths_outside_media_root(self):
+        self.assertEqual(self.client.get('/media/images/ab/missing.webp').status_code, 404)
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 404)
+
+
+class OpenAPISchemaTests(SimpleTestCase):
+    def setUp(self):
+        openapi.clear_schemas()
+        self.addCleanup(openapi.clear_schemas)
+        schema_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, schema_dir)
+        self.schema_dir = schema_dir
+
+    def test_schema_is_rendered_once_and_revalidated_with_etags(self):
+        with override_settings(OPENAPI_SCHEMA_DIR=self.schema_dir), \
+                mock.patch.object(openapi, 'render_schema', wraps=openapi.render_schema) as render:
+            first = self.client.get('/swagger.json/')
+            second = self.client.get('/swagger.json/')
+            revalidated = self.client.get('/swagger.json/', HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Content-Type'], 'application/json')
+        self.assertIn('/password-reset/{email}/', first.json()['paths'])
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], first['ETag'])
+
+    def test_serves_the_exported_files(self):
+        out = io.StringIO()
+        call_command('export_openapi_schema', '--output-dir', self.schema_dir, stdout=out)
+        self.assertIn('schema.yaml', out.getvalue())
+        with open(os.path.join(self.schema_dir, 'schema.yaml'), 'ab') as f:
+            f.write(b'# exported\n')
+
+        with override_settings(OPENAPI_SCHEMA_DIR=self.schema_dir), \
+                mock.patch.object(openapi, 'render_schema') as render:
+            response = self.client.get('/swagger.yaml/')
+
+        render.assert_not_called()
+        self.assertEqual(response['Content-Type'], 'application/yaml')
+        self.assertTrue(response.content.endswith(b'# exported\n'))
+
+    # Without collectstatic there is no manifest for the UI's {% static %} tags
+    @override_settings(STORAGES={
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_ui_loads_the_cached_schema(self):
+        response = self.client.get('/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/swagger.json/')
+
+    def test_unknown_format_is_not_found(self):
+        self.assertEqual(self.client.get('/swagger.xml/').status_code, 404)
+
+
+class StartupProfileTests(SimpleTestCase):
+    def test_parses_the_import_time_report(self):
+        report = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     yaml.reader\n"
+            "import time:       300 |        420 |   yaml\n"
+            "import time:      1000 |       1420 | api.views\n"
+            "System check identified no issues\n"
+        )
+
+        self.assertEqual(parse_import_times(report), [
+            ('yaml.reader', 120, 120, 2),
+            ('yaml', 300, 420, 1),
+            ('api.views', 1000, 1420, 0),
+        ])
+
+    def test_api_profile_starts_without_the_ui_apps(self):
+        out = io.StringIO()
+        call_command('profile_startup', '--profile', 'api', '--target', 'setup', '--runs', '1', '--top', '1000', '--json', stdout=out)
+
+        result = json.loads(out.getvalue())['api']
+        self.assertGreater(result['best_ms'], 0)
+        self.assertGreater(result['rss_mib'], 0)
+        packages = {package for package, _ in result['packages']}
+        self.assertIn('django', packages)
+        self.assertFalse(packages & {'jazzmin', 'drf_yasg', 'django_ckeditor_5'})
+
+
+class MemoryDiagnosticsTests(SimpleTestCase):
+    def test_parses_smaps_rollup(self):
+        rollup = (
+            "55ad354c8000-7ffd2d862000 ---p 00000000 00:00 0    [rollup]\n"
+            "Rss:                1400 kB\n"
+            "Pss:                 489 kB\n"
+            "Pss_Dirty:           100 kB\n"
+            "Shared_Clean:       1260 kB\n"
+            "Shared_Dirty:          0 kB\n"
+            "Private_Clean:        40 kB\n"
+            "Private_Dirty:       100 kB\n"
+            "Swap:                  0 kB\n"
+        )
+
+        memory = parse_smaps(rollup)
+
+        self.assertEqual(memory['rss'], 1400 * 1024)
+        self.assertEqual(memory['pss'], 489 * 1024)
+        self.assertEqual(memory['private_clean'] + memory['private_dirty'], 140 * 1024)
+
+    @override_settings(INTERNAL_IPS=['127.0.0.1'])
+    def test_reports_unique_and_shared_memory_of_this_worker(self):
+        response = self.client.get('/diagnostics/memory')
+
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report['pid'], os.getpid())
+        worker = report['workers'][0]
+        self.assertGreater(worker['uss'], 0)
+        self.assertGreaterEqual(worker['rss'], worker['uss'])
+        self.assertIn('frozen_objects', report['gc'])
+
+    @override_settings(METRICS_AUTH_TOKEN='s3cret')
+    def test_requires_the_metrics_token(self):
+        self.assertEqual(self.client.get('/diagnostics/memory').status_code, 403)
+        response = self.client.get('/diagnostics/memory', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(INTERNAL_IPS=['127.0.0.1'])
+    def test_failures_are_logged_not_returned(self):
+        error = PermissionError(13, "Permission denied", '/proc/1/smaps_rollup')
+        with mock.patch('core.views.memory_report', side_effect=error), \
+                self.assertLogs('core.views', 'ERROR'):
+            response = self.client.get('/diagnostics/memory')
+
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(response.json(), {"error": "Memory details unavailable."})
+
+    @override_settings(INTERNAL_IPS=[])
+    def test_is_closed_without_a_token(self):
+        self.assertEqual(self.client.get('/diagnostics/memory').status_code, 403)
+
+    @override_settings(INTERNAL_IPS=['127.0.0.1'])
+    def test_memory_is_exported_with_the_metrics(self):
+        response = self.client.get('/metrics')
+
+        self.assertContains(response, 'lms_process_memory_bytes{kind="uss"}')
+
+    def test_prepare_for_fork_freezes_what_is_loaded(self):
+        self.addCleanup(gc.unfreeze)
+
+        prepare_for_fork()
+
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+
+class TieredCacheTests(SimpleTestCase):
+    """Two workers' caches over one shared file cache, which stands in for Redis."""
+
+    def setUp(self):
+        workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, workdir)
+        worker = {
+            'BACKEND': 'core.cache.TieredCache',
+            'OPTIONS': {'SHARED_CACHE': 'shared', 'LOCAL_NAMESPACES': ['claims'], 'STAMP_CHECK_INTERVAL': 0},
+        }
+        # Instances with the same LOCATION share one process's copies, so each worker gets its own
+        run = uuid.uuid4().hex
+        settings = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'shared': {'BACKEND': 'core.cache.FileCache', 'LOCATION': workdir},
+            'worker_a': {**worker, 'LOCATION': f'a-{run}'},
+            'worker_b': {**worker, 'LOCATION': f'b-{run}'},
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.a, self.b = caches['worker_a'], caches['worker_b']
+
+    def test_local_namespace_is_read_from_the_process(self):
+        self.a.set('claims:1', {'email': 'a@example.com'})
+
+        with mock.patch.object(self.a.shared, 'get', wraps=self.a.shared.get) as shared_get:
+            self.assertEqual(self.a.get('claims:1'), {'email': 'a@example.com'})
+        # Only the key's stamp is looked up
+        shared_get.assert_called_once_with('cache-stamp:claims:1', version=None)
+        self.assertEqual(self.a.stats['local_hits'], 1)
+
+    def test_deletes_invalidate_other_workers_local_copies(self):
+        self.a.set('claims:1', 'old')
+        self.assertEqual(self.b.get('claims:1'), 'old')
+
+        self.a.delete('claims:1')
+        self.assertIsNone(self.b.get('claims:1'))
+
+        self.a.set('claims:1', 'new')
+        self.assertEqual(self.b.get('claims:1'), 'new')
+        self.a.invalidate('claims:1')
+        self.assertEqual(self.b.get('claims:1'), 'new')
+        self.assertEqual(self.b.stats['shared_hits'], 3)
+
+    def test_filling_misses_keeps_other_workers_local_copies(self):
+        self.a.set('claims:1', 1)
+        self.assertEqual(self.b.get('claims:1'), 1)
+
+        self.a.set('claims:2', 2)
+        self.assertEqual(self.b.get('claims:1'), 1)
+        self.assertEqual(self.b.stats['local_hits'], 1)
+
+    def test_invalidating_a_key_keeps_the_rest_of_its_namespace(self):
+        self.a.set('claims:1', 1)
+        self.a.set('claims:2', 2)
+        self.assertEqual((self.b.get('claims:1'), self.b.get('claims:2')), (1, 2))
+
+        self.a.delete('claims:2')
+
+        self.assertEqual(self.b.get('claims:1'), 1)
+        self.assertIsNone(self.b.get('claims:2'))
+        self.assertEqual(self.b.stats['local_hits'], 1)
+
+    def test_stamps_are_checked_once_per_interval(self):
+        self.b.stamp_check_interval = 60
+        self.a.set('claims:1', 'old')
+        self.assertEqual(self.b.get('claims:1'), 'old')
+        self.a.delete('claims:1')
+        self.a.set('claims:1', 'new')
+
+        self.assertEqual(self.b.get('claims:1'), 'old')
+        self.b.stamp_check_interval = 0
+        self.assertEqual(self.b.get('claims:1'), 'new')
+
+    def test_local_copies_expire_with_the_shared_value(self):
+        self.a.set('claims:1', 'short-lived', 2)
+        self.b.stamp_check_interval = 60
+        with mock.patch('core.cache.time.time', return_value=time.time() + 1):
+            self.assertEqual(self.b.get('claims:1'), 'short-lived')
+        entry = self.b.local.get(self.b.make_key('claims:1'))
+        self.assertLessEqual(entry.expires_at - time.monotonic(), 1)
+
+        with mock.patch('core.cache.time.time', return_value=time.time() + 3):
+            self.b.clear_local()
+            self.assertIsNone(self.b.get('claims:1'))
+
+    def test_counters_are_refused_in_local_namespaces(self):
+        self.a.set('claims:1', 1)
+        with self.assertRaises(ValueError):
+            self.a.incr('claims:1')
+        self.a.set('count:1', 1)
+        self.assertEqual(self.a.incr('count:1'), 2)
+
+    def test_other_namespaces_always_read_the_shared_cache(self):
+        self.assertTrue(self.a.add('lock:1', 1))
+        self.assertFalse(self.b.add('lock:1', 1))
+        self.assertEqual(self.b.get('lock:1'), 1)
+        self.assertEqual(len(self.b.local), 0)
+
+        self.a.delete('lock:1')
+        self.assertIsNone(self.b.get('lock:1'))
+
+    def test_file_cache_add_is_atomic(self):
+        shared = caches['shared']
+        barrier = threading.Barrier(8)
+
+        def add(i):
+            barrier.wait()
+            return shared.add('lock:1', i)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            self.assertEqual(sum(pool.map(add, range(8))), 1)
+
+        shared.set('lock:2', 'stale', -1)
+        self.assertTrue(shared.add('lock:2', 'fresh'))
+        self.assertEqual(shared.get('lock:2'), 'fresh')
+
+    def test_local_copies_are_bounded(self):
+        self.a.local.max_entries = 2
+        for i in range(3):
+            self.a.set(f'claims:{i}', i)
+
+        self.assertEqual(len(self.a.local), 2)
+        self.assertEqual(self.a.get('claims:0'), 0)
+        self.assertEqual(self.a.stats['shared_hits'], 1)
+
+    def test_hits_and_misses_are_counted(self):
+        self.a.get('claims:missing')
+        self.a.set('claims:1', 1)
+        self.a.get('claims:1')
+
+        rendered = registry.render()
+        location = f'location="{self.a.location}"'
+        self.assertIn(f'lms_cache_requests_total{{{location},result="miss",tier="local"}} 1', rendered)
+        self.assertIn(f'lms_cache_requests_total{{{location},result="miss",tier="shared"}} 1', rendered)
+        self.assertIn(f'lms_cache_requests_total{{{location},result="hit",tier="local"}} 1', rendered)
+
+    def test_threads_share_local_copies_and_counts(self):
+        self.a.set('claims:1', 1)
+
+        def read(_):
+            # Django gives each thread its own backend instance
+            return caches['worker_a'].get('claims:1')
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            self.assertEqual(list(pool.map(read, range(8))), [1] * 8)
+        self.assertEqual(self.a.stats['local_hits'], 8)
+        self.assertEqual(self.a.stats['shared_hits'], 0)
+
+    def test_finished_threads_leave_their_counts_behind(self):
+        self.a.set('claims:1', 1)
+        threads = [threading.Thread(target=lambda: caches['worker_a'].get('claims:1')) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+        del threads, thread
+        gc.collect()
+
+        self.assertEqual(self.a.state._thread_counts, {})
+        self.assertEqual(self.a.stats['local_hits'], 4)
+
+    def test_test_runs_get_isolated_caches(self):
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'core.cache.TieredCache', 'OPTIONS': {'SHARED_CACHE': 'shared'}},
+            'shared': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379/0'},
+        }):
+            isolated = isolated_caches('/tmp/run')
+
+        self.assertEqual(isolated['default']['BACKEND'], 'core.cache.TieredCache')
+        self.assertEqual(isolated['shared'], {
+            'BACKEND': 'core.cache.FileCache', 'LOCATION': os.path.join('/tmp/run', 'shared'), 'OPTIONS': {},
+        })
+
+
+class FastJSONTests(SimpleTestCase):
+    payload = {
+        'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'date': datetime.datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+        'day': datetime.date(2024, 1, 2),
+        'price': decimal.Decimal('9.99'),
+        'label': gettext_lazy('Profile'),
+        'about': 'Line\u2028separator, café',
+        1: [None, True, 1.5],
+    }
+
+    def test_output_matches_json_renderer(self):
+        for media_type in (None, 'application/json; indent=2'):
+            self.assertEqual(
+                json.loads(FastJSONRenderer().render(self.payload, media_type)),
+                json.loads(JSONRenderer().render(self.payload, media_type)),
+            )
+        self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_falls_back_for_values_orjson_cannot_encode(self):
+        self.assertEqual(FastJSONRenderer().render({'big': 2 ** 70}), b'{"big":1180591620717411303424}')
+
+    def test_parses_json_and_rejects_bad_input(self):
+        parser = FastJSONParser()
+
+        self.assertEqual(parser.parse(io.BytesIO('{"name": "café"}'.encode())), {'name': 'café'})
+        latin1 = io.BytesIO('{"name": "café"}'.encode('latin-1'))
+        self.assertEqual(parser.parse(latin1, parser_context={'encoding': 'latin-1'}), {'name': 'café'})
+        for body in (b'{"name": ', b'{"score": NaN}', b'\xff'):
+            with self.assertRaises(ParseError):
+                parser.parse(io.BytesIO(body))
+
+    def test_api_responses_are_rendered_with_orjson(self):
+        with mock.patch('core.renderers.orjson.dumps', wraps=orjson.dumps) as dumps:
+            response = self.client.post(
+                '/api/v1/user/token/refresh/', '{"refresh": "not-a-token"}', content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        dumps.assert_called_once()
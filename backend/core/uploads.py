@@ -0,0 +1,42 @@
+import hashlib
+from typing import Any, Optional
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Spools every upload to a temporary file, never to memory, and computes
+    its SHA-256 from the chunks as they arrive, so the file can be stored
+    content-addressed without reading it again.
+
+    The digest is available as `uploaded_file.sha256`. With `max_bytes`, the
+    upload is abandoned as soon as a file grows past it, without reading the
+    rest of the request; `exceeded` then tells the view why the file is missing.
+    """
+
+    def __init__(self, request: Any = None, max_bytes: Optional[int] = None) -> None:
+        super().__init__(request)
+        self.max_bytes = max_bytes
+        self.exceeded = False
+
+    def new_file(self, *args: Any, **kwargs: Any) -> None:
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> Optional[bytes]:
+        self.received += len(raw_data)
+        if self.max_bytes is not None and self.received > self.max_bytes:
+            self.exceeded = True
+            # Django closes the partial file; the server drops the connection instead of draining it
+            raise StopUpload(connection_reset=True)
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size: int) -> Optional[UploadedFile]:
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.sha256 = self.hasher.hexdigest()
+        return uploaded
@@ -1,3 +1,120 @@
-from django.shortcuts import render
+import logging
+import os
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import DatabaseError, connections
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import etag, require_GET, require_safe
+
+from core.memory import memory_report
+from core.metrics import registry
+from core.static import media_response
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
+
+@require_GET
+def health(request: HttpRequest) -> JsonResponse:
+    """Report whether every configured database answers a trivial query."""
+    databases = {}
+    for alias in connections:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            databases[alias] = "ok"
+        except DatabaseError:
+            # Driver errors can name hosts and users; they go to the log only
+            logger.exception("Health check failed for database %r", alias)
+            databases[alias] = "error"
+
+    healthy = all(state == "ok" for state in databases.values())
+    return JsonResponse(
+        {"status": "ok" if healthy else "error", "databases": databases},
+        status=200 if healthy else 503,
+    )
+
+
+def diagnostics_allowed(request: HttpRequest) -> bool:
+    """
+    Whether the request may see metrics and diagnostics: it carries
+    METRICS_AUTH_TOKEN, comes from one of INTERNAL_IPS, or DEBUG is on.
+    Without any of those, access is denied.
+    """
+    if settings.DEBUG or request.META.get('REMOTE_ADDR') in getattr(settings, 'INTERNAL_IPS', ()):
+        return True
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    return bool(token) and constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}")
+
+
+@require_GET
+def metrics(request: HttpRequest) -> HttpResponse:
+    """Expose this worker's request metrics in the Prometheus text format."""
+    if not diagnostics_allowed(request):
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@require_GET
+def memory_diagnostics(request: HttpRequest) -> HttpResponse:
+    """
+    Unique (USS) and shared memory of the worker serving the request; with
+    ?all=1, of every worker forked by the same gunicorn master.
+    """
+    if not diagnostics_allowed(request):
+        return HttpResponse(status=403)
+    try:
+        report = memory_report(include_siblings=request.GET.get('all') == '1')
+    except OSError:
+        # The error names /proc paths and process ids; it's logged, not returned
+        logger.exception("Memory details unavailable")
+        return JsonResponse({"error": "Memory details unavailable."}, status=501)
+    return JsonResponse(report)
+
+
+@require_safe
+def media(request: HttpRequest, path: str) -> HttpResponse:
+    """Serve a file from MEDIA_ROOT, handing the transfer to the front proxy when configured."""
+    # Without a proxy hand-off every download would hold a worker, so like
+    # django.conf.urls.static this only streams files under DEBUG
+    if not settings.DEBUG and not getattr(settings, 'MEDIA_SENDFILE', ''):
+        raise Http404("File not found.")
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found.")
+    if not os.path.isfile(full_path):
+        raise Http404("File not found.")
+    return media_response(os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, '/'))
+
+
+def schema_etag(request: HttpRequest, format: str) -> Optional[str]:
+    # drf_yasg is imported only by workers that route the schema views
+    from core import openapi
+
+    fmt = format.lstrip('.')
+    return openapi.get_schema(fmt).etag if fmt in openapi.CODECS else None
+
+
+@require_safe
+@etag(schema_etag)
+def openapi_schema(request: HttpRequest, format: str) -> HttpResponse:
+    """The OpenAPI schema as JSON or YAML, rendered once per process (core.openapi)."""
+    from core import openapi
+
+    # Routed as swagger.json/ and swagger.yaml/
+    fmt = format.lstrip('.')
+    if fmt not in openapi.CODECS:
+        raise Http404("Unknown schema format.")
+    schema = openapi.get_schema(fmt)
+    response = HttpResponse(schema.body, content_type=schema.content_type)
+    # Clients keep their copy and revalidate it with If-None-Match
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
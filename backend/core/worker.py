@@ -0,0 +1,90 @@
+"""
+Database-backed work queues drained by management commands.
+
+Queued rows carry a `next_attempt_at` timestamp. `claim_due` leases a batch
+by pushing that timestamp out, so concurrent workers skip the rows they
+don't own even on databases without row-level locking, and a crashed
+worker's batch becomes due again once the lease runs out.
+`BatchWorkerCommand` is the poll/process/sleep loop around a queue's
+batch function.
+"""
+import time
+from datetime import timedelta
+from typing import Any, List, Tuple
+
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.utils import timezone
+
+
+def claim_due(queryset: models.QuerySet, batch_size: int, lease: float) -> List[models.Model]:
+    """Claim up to `batch_size` rows of `queryset` that are due, hiding them for `lease` seconds."""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            queryset
+            .select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if batch:
+            queryset.model.objects.filter(pk__in=[row.pk for row in batch]).update(
+                next_attempt_at=now + timedelta(seconds=lease)
+            )
+    return batch
+
+
+class BatchWorkerCommand(BaseCommand):
+    """
+    Runs `process_batch` until the queue is drained, or forever with --loop.
+
+    Subclasses implement `process_batch` returning a (done, retried, failed)
+    tuple; `done_label` names the first count in the output.
+    """
+    default_batch_size = 20
+    done_label = 'processed'
+    item_name = 'items'
+
+    def process_batch(self, batch_size: int) -> Tuple[int, int, int]:
+        raise NotImplementedError
+
+    def get_default_batch_size(self) -> int:
+        return self.default_batch_size
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=self.get_default_batch_size(),
+            help=f"Maximum number of {self.item_name} per batch.",
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Keep polling the queue instead of exiting once it is drained.",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help="Seconds to sleep between polls when the queue is empty (with --loop).",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        totals = [0, 0, 0]
+        try:
+            while True:
+                done, retried, failed = self.process_batch(options['batch_size'])
+                totals = [totals[0] + done, totals[1] + retried, totals[2] + failed]
+                if done or retried or failed:
+                    self.stdout.write(f"Batch: {done} {self.done_label}, {retried} retrying, {failed} failed")
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals[0]} {self.done_label}, {totals[1]} retrying, {totals[2]} failed"
+        ))
@@ -0,0 +1,47 @@
+"""
+Gunicorn settings, picked up when it is started from this directory:
+
+    gunicorn backend.wsgi
+
+The app is preloaded in the master and the workers are forked from it, so
+they share the imported modules and app registry copy-on-write; see
+core.memory. Set GUNICORN_PRELOAD=false to load the app in each worker.
+"""
+import gc
+import multiprocessing
+
+from environs import Env
+
+env = Env()
+
+bind = env.str("GUNICORN_BIND", default="0.0.0.0:8000")
+workers = env.int("WEB_CONCURRENCY", default=multiprocessing.cpu_count() * 2 + 1)
+threads = env.int("GUNICORN_THREADS", default=1)
+timeout = env.int("GUNICORN_TIMEOUT", default=30)
+# Recycled workers are forked from the master again, sharing its pages from the start
+max_requests = env.int("GUNICORN_MAX_REQUESTS", default=0)
+max_requests_jitter = env.int("GUNICORN_MAX_REQUESTS_JITTER", default=0)
+preload_app = env.bool("GUNICORN_PRELOAD", default=True)
+
+
+def on_starting(server):
+    if preload_app:
+        # Objects freed in the master would leave holes in pages the workers share
+        gc.disable()
+
+
+def when_ready(server):
+    if preload_app:
+        from core.memory import prepare_for_fork
+
+        prepare_for_fork()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # Also covers anything the master created since the last fork
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
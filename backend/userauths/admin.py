@@ -1,9 +1,14 @@
 from django.contrib import admin
-from .models import User, Profile
+from .models import User, Profile, ProfileImage
 
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('full_name', 'user', 'date')
 
+class ProfileImageAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'status', 'attempts', 'created')
+    list_filter = ('status',)
+
 # Register your models here.
 admin.site.register(User)
 admin.site.register(Profile, ProfileAdmin)
+admin.site.register(ProfileImage, ProfileImageAdmin)
@@ -0,0 +1,231 @@
+"""
+Profile picture uploads and their resized variants.
+
+Uploads are stored content-addressed (core.storage) as they arrive. The
+`process_profile_images` command later renders each configured variant
+size in WebP and JPEG and stores those content-addressed too, so every
+URL handed to clients can be cached by a CDN forever.
+"""
+import hashlib
+import io
+import logging
+from datetime import timedelta
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, default_storage
+from django.utils import timezone
+
+from core.storage import save_content_addressed
+from core.worker import claim_due
+from userauths.models import MAX_ERROR_LENGTH, Profile, ProfileImage
+
+# Pillow is imported where images are decoded, so API workers pay for it on their first upload
+if TYPE_CHECKING:
+    from PIL import Image
+
+# Longest side in pixels per variant
+DEFAULT_VARIANTS = {'thumb': 96, 'small': 256, 'medium': 512}
+DEFAULT_FORMATS = ('webp', 'jpeg')
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 60  # seconds, doubled on every failed attempt
+DEFAULT_LEASE = 300  # seconds a claimed batch is hidden from other workers
+MAX_PIXELS = 40_000_000
+
+# Pillow format -> extension of the stored original
+ACCEPTED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+VARIANT_ENCODERS: Dict[str, Dict[str, Any]] = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+VARIANT_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidImage(ValueError):
+    """The upload is not an image we accept."""
+
+
+def get_variant_sizes() -> Dict[str, int]:
+    return getattr(settings, 'PROFILE_IMAGE_VARIANTS', DEFAULT_VARIANTS)
+
+
+def get_variant_formats() -> Tuple[str, ...]:
+    return tuple(getattr(settings, 'PROFILE_IMAGE_FORMATS', DEFAULT_FORMATS))
+
+
+def get_max_bytes() -> int:
+    return getattr(settings, 'PROFILE_IMAGE_MAX_BYTES', DEFAULT_MAX_BYTES)
+
+
+def too_large_error(max_bytes: int) -> InvalidImage:
+    return InvalidImage(f"Images can be at most {max_bytes // (1024 * 1024)} MB.")
+
+
+def file_digest(file: File) -> str:
+    """SHA-256 of a file, from the upload handler when it already computed it."""
+    digest = getattr(file, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in file.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def inspect_image(file: File) -> Tuple[str, int, int]:
+    """
+    Check that `file` is an accepted image without decoding its pixels and
+    return (extension, width, height). Raises InvalidImage otherwise.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    # Uploads through the API are cut off while streaming (core.uploads); this covers other callers
+    max_bytes = get_max_bytes()
+    if file.size is not None and file.size > max_bytes:
+        raise too_large_error(max_bytes)
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+            if image_format not in ACCEPTED_FORMATS:
+                raise InvalidImage("Upload a JPEG, PNG, WebP or GIF image.")
+            if width * height > MAX_PIXELS:
+                raise InvalidImage("The image has too many pixels.")
+            image.verify()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        raise InvalidImage("Upload a valid JPEG, PNG, WebP or GIF image.")
+    finally:
+        file.seek(0)
+    return ACCEPTED_FORMATS[image_format], width, height
+
+
+def store_profile_image(profile: Profile, upload: File) -> ProfileImage:
+    """
+    Store an upload content-addressed and make it the profile's picture.
+    Bytes uploaded before are not stored again, and reuse their variants.
+    """
+    digest = file_digest(upload)
+    extension, width, height = inspect_image(upload)
+
+    image = ProfileImage.objects.filter(digest=digest).first()
+    if image is None:
+        name = save_content_addressed(upload, digest, extension)
+        image, _ = ProfileImage.objects.get_or_create(
+            digest=digest, defaults={'original': name, 'width': width, 'height': height},
+        )
+    elif image.status == ProfileImage.STATUS_FAILED:
+        # Give a failed image another round when someone uploads it again
+        image.status, image.attempts, image.next_attempt_at = ProfileImage.STATUS_PENDING, 0, timezone.now()
+        image.save(update_fields=['status', 'attempts', 'next_attempt_at'])
+
+    profile.image = image.original
+    profile.image_asset = image
+    profile.save(update_fields=['image', 'image_asset'])
+    return image
+
+
+def variant_urls(image: Optional[ProfileImage], storage: Optional[Storage] = None) -> Dict[str, Dict[str, str]]:
+    """{variant: {format: url}} for a processed image; empty until the variants exist."""
+    if image is None or image.status != ProfileImage.STATUS_READY:
+        return {}
+    storage = storage or default_storage
+    return {
+        variant: {fmt: storage.url(entry['name']) for fmt, entry in formats.items()}
+        for variant, formats in image.variants.items()
+    }
+
+
+def encode_variant(image: 'Image.Image', fmt: str) -> bytes:
+    from PIL import Image
+
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+        if has_alpha:
+            # JPEG has no alpha channel; flatten onto white
+            rgba = image.convert('RGBA')
+            flattened = Image.new('RGB', image.size, 'white')
+            flattened.paste(rgba, mask=rgba.getchannel('A'))
+            image = flattened
+        else:
+            image = image.convert('RGB')
+    elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    buffer = io.BytesIO()
+    image.save(buffer, **VARIANT_ENCODERS[fmt])
+    return buffer.getvalue()
+
+
+def render_variants(image: ProfileImage, storage: Optional[Storage] = None) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Render and store every configured variant of `image`."""
+    from PIL import Image, ImageOps
+
+    storage = storage or default_storage
+    sizes = sorted(get_variant_sizes().items(), key=lambda item: item[1], reverse=True)
+    variants: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    with storage.open(image.original, 'rb') as f, Image.open(f) as source:
+        # JPEGs decode straight to a reduced scale that still covers the largest variant
+        largest = sizes[0][1] if sizes else max(source.size)
+        source.draft('RGB', (largest, largest))
+        working = ImageOps.exif_transpose(source)
+
+        # Each variant is scaled down from the previous, larger one
+        for name, size in sizes:
+            working = working.copy()
+            working.thumbnail((size, size), Image.Resampling.LANCZOS)
+            for fmt in get_variant_formats():
+                data = encode_variant(working, fmt)
+                digest = hashlib.sha256(data).hexdigest()
+                stored = save_content_addressed(ContentFile(data), digest, VARIANT_EXTENSIONS[fmt], storage)
+                variants.setdefault(name, {})[fmt] = {
+                    'name': stored, 'width': working.width, 'height': working.height,
+                }
+    return variants
+
+
+def claim_batch(batch_size: int = DEFAULT_BATCH_SIZE) -> List[ProfileImage]:
+    """Claim up to `batch_size` due images under a lease (core.worker.claim_due)."""
+    pending = ProfileImage.objects.filter(status=ProfileImage.STATUS_PENDING)
+    return claim_due(pending, batch_size, DEFAULT_LEASE)
+
+
+def process_batch(batch_size: int = DEFAULT_BATCH_SIZE) -> Tuple[int, int, int]:
+    """
+    Generate variants for one batch of pending images.
+
+    Returns a (processed, retried, failed) tuple. Failures are retried with
+    exponential backoff until PROFILE_IMAGE_MAX_ATTEMPTS is reached.
+    """
+    batch = claim_batch(batch_size)
+    max_attempts = getattr(settings, 'PROFILE_IMAGE_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    processed = retried = failed = 0
+
+    for image in batch:
+        image.attempts += 1
+        try:
+            image.variants = render_variants(image)
+        except Exception as error:
+            logger.exception("Profile image variants failed", extra={'profile_image_id': image.pk})
+            image.last_error = str(error)[:MAX_ERROR_LENGTH]
+            if image.attempts >= max_attempts:
+                image.status = ProfileImage.STATUS_FAILED
+                failed += 1
+            else:
+                delay = DEFAULT_RETRY_DELAY * 2 ** (image.attempts - 1)
+                image.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+                retried += 1
+            image.save(update_fields=['attempts', 'status', 'next_attempt_at', 'last_error'])
+        else:
+            image.status = ProfileImage.STATUS_READY
+            image.last_error = ''
+            image.save(update_fields=['attempts', 'status', 'variants', 'last_error'])
+            processed += 1
+
+    return processed, retried, failed
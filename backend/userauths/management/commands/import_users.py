@@ -0,0 +1,169 @@
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from userauths.models import User, Profile, MAX_NAME_LENGTH
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _init_worker() -> None:
+    """Make sure Django is configured in pool workers started with `spawn`."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+
+
+def _hash_password(password: Optional[str]) -> str:
+    # An empty password gets an unusable hash, as with `set_unusable_password`
+    return make_password(password or None)
+
+
+def read_rows(stream: Iterable[str], fmt: str) -> Iterator[Dict[str, Any]]:
+    """Yield one dict per user from a CSV or JSONL stream without loading it whole."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            raise CommandError(f"Invalid JSON on line {line_number}: {error}")
+
+
+def chunked(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-imports users from a CSV or JSONL file with `email`, `full_name`, "
+        "`password` and optional `username` columns. Users and profiles are inserted "
+        "with bulk_create and passwords are hashed across a process pool."
+    )
+
+    def add_arguments(self, parser: Any) -> None:
+        parser.add_argument('path', help="CSV or JSONL file to import, or '-' for stdin.")
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'jsonl'),
+            help="Input format. Defaults to the file extension, or csv for stdin.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Users hashed and inserted per batch.",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Password hashing processes. 1 hashes in the current process.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        workers = max(1, options['workers'])
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) if workers > 1 else None
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        imported = skipped = 0
+        started = time.perf_counter()
+        try:
+            for chunk in chunked(read_rows(stream, fmt), options['batch_size']):
+                users = self.build_users(chunk)
+                skipped += len(chunk) - len(users)
+                if not users:
+                    continue
+
+                passwords = [row.get('password') for row in chunk if row['_import']]
+                if executor is not None:
+                    hashes = executor.map(_hash_password, passwords, chunksize=max(1, len(passwords) // workers))
+                else:
+                    hashes = map(_hash_password, passwords)
+                for user, encoded in zip(users, hashes):
+                    user.password = encoded
+
+                self.insert(users)
+                imported += len(users)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{imported} users imported ({imported / elapsed:.0f} users/s)")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if executor is not None:
+                executor.shutdown()
+
+        elapsed = time.perf_counter() - started
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} users, skipped {skipped} in {elapsed:.1f}s ({rate:.0f} users/s)"
+        ))
+
+    def build_users(self, chunk: List[Dict[str, Any]]) -> List[User]:
+        """
+        Build unsaved users for a chunk, skipping rows without an email and emails
+        that already exist. Rows to import are flagged with `_import`.
+        """
+        for row in chunk:
+            row['email'] = User.objects.normalize_email((row.get('email') or '').strip())
+            row['_import'] = False
+
+        emails = {row['email'] for row in chunk if row['email']}
+        taken_emails = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+
+        # Mirror User.save: default the username and full name to the email's local part
+        for row in chunk:
+            local_part = row['email'].split('@')[0]
+            row['username'] = (row.get('username') or local_part)[:MAX_NAME_LENGTH]
+            row['full_name'] = (row.get('full_name') or local_part)[:MAX_NAME_LENGTH]
+        usernames = {row['username'] for row in chunk}
+        taken_usernames = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+
+        users = []
+        for row in chunk:
+            email = row['email']
+            if not email or email in taken_emails:
+                continue
+            username = row['username']
+            if username in taken_usernames:
+                suffix = '-' + hashlib.sha1(email.encode()).hexdigest()[:6]
+                username = username[:MAX_NAME_LENGTH - len(suffix)] + suffix
+            taken_emails.add(email)
+            taken_usernames.add(username)
+            row['_import'] = True
+            users.append(User(email=email, username=username, full_name=row['full_name']))
+        return users
+
+    @transaction.atomic
+    def insert(self, users: List[User]) -> None:
+        """Insert users and their profiles without firing the post_save receivers."""
+        User.objects.bulk_create(users)
+        if any(user.pk is None for user in users):
+            # Backends that can't return ids from bulk inserts
+            ids = dict(User.objects.filter(email__in=[u.email for u in users]).values_list('email', 'id'))
+            for user in users:
+                user.pk = ids[user.email]
+        # Mirror Profile.save, which defaults full_name to the username
+        Profile.objects.bulk_create([Profile(user=user, full_name=user.username) for user in users])
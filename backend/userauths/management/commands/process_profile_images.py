@@ -0,0 +1,13 @@
+from typing import Tuple
+
+from core.worker import BatchWorkerCommand
+from userauths.images import DEFAULT_BATCH_SIZE, process_batch
+
+
+class Command(BatchWorkerCommand):
+    help = "Renders the resized WebP and JPEG variants of uploaded profile pictures."
+    default_batch_size = DEFAULT_BATCH_SIZE
+    item_name = 'images processed'
+
+    def process_batch(self, batch_size: int) -> Tuple[int, int, int]:
+        return process_batch(batch_size)
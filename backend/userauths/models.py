@@ -1,17 +1,90 @@
-from django.db import models
+import copy
+import logging
+from django.contrib.auth.hashers import check_password, make_password
+from django.db import connections, models
+from django.db.models.fields.files import FieldFile
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
-from typing import Any
+from typing import Any, Dict, Iterable, List, Optional
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+from core.executors import submit
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_USER_IMAGE = 'default-user.jpg'
 MAX_NAME_LENGTH = 100
 MAX_ABOUT_LENGTH = 500
 OTP_LENGTH = 6
+MAX_STORAGE_NAME_LENGTH = 255
+MAX_ERROR_LENGTH = 1000
+
+class DirtyFieldsMixin:
+    """
+    Tracks field values as last loaded from or saved to the database, so callers
+    can save only what changed with `save(update_fields=obj.get_dirty_fields())`.
+    """
+
+    @classmethod
+    def from_db(cls, db: Optional[str], field_names: Iterable[str], values: Iterable[Any]) -> Any:
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_fields()
+        return instance
+
+    def _tracked_fields(self) -> List[models.Field]:
+        return [field for field in self._meta.concrete_fields if not field.primary_key]
+
+    @staticmethod
+    def _comparable(value: Any) -> Any:
+        # FieldFile objects are mutated in place by `.save()`, so compare names
+        if isinstance(value, FieldFile):
+            return value.name
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
+        return value
+
+    def _snapshot_fields(self, field_names: Optional[Iterable[str]] = None) -> None:
+        saved: Dict[str, Any] = self.__dict__.setdefault('_saved_values', {})
+        deferred = self.get_deferred_fields()
+        names = set(field_names) if field_names is not None else None
+        for field in self._tracked_fields():
+            if field.attname in deferred:
+                continue
+            if names is None or field.name in names or field.attname in names:
+                saved[field.attname] = self._comparable(getattr(self, field.attname))
+
+    def get_dirty_fields(self) -> List[str]:
+        """Return the names of fields that differ from the database copy."""
+        saved = self.__dict__.get('_saved_values')
+        if self._state.adding or saved is None:
+            return [field.name for field in self._tracked_fields()]
+        deferred = self.get_deferred_fields()
+        return [
+            field.name for field in self._tracked_fields()
+            if field.attname not in deferred
+            and saved.get(field.attname) != self._comparable(getattr(self, field.attname))
+        ]
+
+    def save(self, *args: Any, **kwargs: Any) -> None:
+        super().save(*args, **kwargs)
+        self._snapshot_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using: Optional[str] = None, fields: Optional[Iterable[str]] = None) -> None:
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot_fields(fields)
+
+
+def include_row_version(save_kwargs: Dict[str, Any]) -> None:
+    """Make a partial save also write the `updated` row version."""
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields:
+        save_kwargs['update_fields'] = {*update_fields, 'updated'}
+
 
 # Custom User model that extends Django's AbstractUser to add additional fields and functionality.
-class User(AbstractUser):
+class User(DirtyFieldsMixin, AbstractUser):
     # Field to store the username, ensuring it is unique.
     username = models.CharField(max_length=MAX_NAME_LENGTH, unique=True)
     # Field to store the email address, ensuring it is unique.
@@ -22,6 +95,8 @@ class User(AbstractUser):
     otp = models.CharField(max_length=OTP_LENGTH, null=True, blank=True)
     # Refresh token for additional security
     refresh_token = models.CharField(max_length=1000, null=True, blank=True)
+    # Row version: changes on every save, so API responses can be validated without re-reading them
+    updated = models.DateTimeField(auto_now=True)
 
     # Set email as the main field for authentication instead of the default username.
     USERNAME_FIELD = 'email'
@@ -38,10 +113,77 @@ class User(AbstractUser):
             self.full_name = self.email.split('@')[0]
         if not self.username:
             self.username = self.email.split('@')[0]
+        include_row_version(kwargs)
         super().save(*args, **kwargs)
 
+    # Verify the password; an outdated hash is upgraded in the background so the login isn't slowed down.
+    def check_password(self, raw_password: str) -> bool:
+        def setter(raw_password: str) -> None:
+            submit(_rehash_in_background, self.pk, self.password, raw_password)
+        return check_password(raw_password, self.password, setter)
+
 
-class Profile(models.Model):
+def rehash_password(user_id: Any, old_encoded: str, raw_password: str) -> bool:
+    """
+    Re-hash a verified password with the preferred hasher. The row is only
+    updated while it still holds `old_encoded`, so a password changed in the
+    meantime is never overwritten.
+    """
+    encoded = make_password(raw_password)
+    return bool(User.objects.filter(pk=user_id, password=old_encoded).update(password=encoded))
+
+
+def _rehash_in_background(user_id: Any, old_encoded: str, raw_password: str) -> None:
+    try:
+        rehash_password(user_id, old_encoded, raw_password)
+    except Exception:
+        logger.exception("Background password rehash failed", extra={'user_id': user_id})
+    finally:
+        # Pool threads outlive requests, so don't leave their connections open
+        connections.close_all()
+
+
+class ProfileImage(models.Model):
+    """
+    A content-addressed profile picture. Resized variants are generated later
+    by the `process_profile_images` command.
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_READY = 'ready'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_READY, 'Ready'),
+        (STATUS_FAILED, 'Failed'),
+    )
+
+    # SHA-256 of the uploaded bytes, which also names the original in storage.
+    digest = models.CharField(max_length=64, unique=True)
+    original = models.CharField(max_length=MAX_STORAGE_NAME_LENGTH)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    # {variant: {format: {"name": storage name, "width": w, "height": h}}}
+    variants = models.JSONField(default=dict, blank=True)
+
+    # Variant generation state
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=MAX_ERROR_LENGTH, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The worker polls for due, pending images in this order.
+            models.Index(fields=['status', 'next_attempt_at'], name='userauths_image_due_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.digest[:12]} ({self.status})"
+
+
+class Profile(DirtyFieldsMixin, models.Model):
     # Represents a user profile linked to a User model instance.
     image = models.FileField(
         upload_to='user_folder',
@@ -55,6 +197,10 @@ class Profile(models.Model):
     country = models.CharField(max_length=MAX_NAME_LENGTH, null=True, blank=True)
     about = models.TextField(max_length=MAX_ABOUT_LENGTH, null=True, blank=True)
     date = models.DateTimeField(auto_now_add=True)
+    # Set by the upload API; carries the resized variants of `image`
+    image_asset = models.ForeignKey(ProfileImage, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    # Row version, as on User
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self) -> str:
         # Returns the full name of the profile if available, otherwise returns the full name of the associated user.
@@ -63,6 +209,7 @@ class Profile(models.Model):
     def save(self, *args: Any, **kwargs: Any) -> None:
         if not self.full_name:
             self.full_name = self.user.username
+        include_row_version(kwargs)
         super().save(*args, **kwargs)
 
     def clean(self) -> None:
@@ -82,9 +229,21 @@ def create_user_profile(sender: type[User], instance: User, created: bool, **kwa
         Profile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender: type[User], instance: User, **kwargs: Any) -> None:
+def save_user_profile(sender: type[User], instance: User, created: bool, **kwargs: Any) -> None:
     """
     Signal handler to save the Profile instance whenever the User is saved.
+
+    Only a profile already loaded on the user can carry unsaved changes, so no
+    query is made to fetch it, and only the fields that changed are written.
     """
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+    if created or not sender.profile.is_cached(instance):
+        return
+    profile = sender.profile.related.get_cached_value(instance)
+    if profile is None:
+        return
+    if profile.pk is None:
+        profile.save()
+        return
+    dirty_fields = profile.get_dirty_fields()
+    if dirty_fields:
+        profile.save(update_fields=dirty_fields)
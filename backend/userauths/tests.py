@@ -1,3 +1,281 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
 
-# Create your tests here.
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopUpload
+from django.core.management import call_command
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.serializer import ProfileSerializer
+from core.executors import shutdown_executor
+from core.uploads import HashingUploadHandler
+from userauths.images import process_batch
+from userauths.models import User, Profile, ProfileImage, rehash_password
+
+MD5_HASHER = 'django.contrib.auth.hashers.MD5PasswordHasher'
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersCommandTests(TestCase):
+    def write_file(self, suffix: str, content: str) -> str:
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def import_users(self, path: str, *args: str) -> str:
+        out = io.StringIO()
+        call_command('import_users', path, '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_imports_csv_users_with_profiles(self):
+        path = self.write_file('.csv', (
+            "email,full_name,password\n"
+            "ada@example.com,Ada Lovelace,analytical-engine\n"
+            "grace@example.com,,cobol-rules\n"
+        ))
+
+        output = self.import_users(path, '--batch-size', '1')
+
+        self.assertIn("Imported 2 users", output)
+        self.assertIn("users/s", output)
+        ada = User.objects.get(email='ada@example.com')
+        self.assertTrue(ada.check_password('analytical-engine'))
+        self.assertEqual(ada.username, 'ada')
+        self.assertEqual(ada.profile.full_name, 'ada')
+        grace = User.objects.get(email='grace@example.com')
+        self.assertEqual(grace.full_name, 'grace')
+        self.assertEqual(Profile.objects.count(), 2)
+
+    def test_imports_jsonl_and_skips_existing_and_duplicate_emails(self):
+        User.objects.create(email='ada@example.com')
+        path = self.write_file('.jsonl', "\n".join(json.dumps(row) for row in [
+            {"email": "ada@example.com", "password": "x"},
+            {"email": "ada@other.org", "full_name": "Other Ada"},
+            {"email": "ada@other.org", "full_name": "Duplicate"},
+            {"email": ""},
+        ]))
+
+        output = self.import_users(path)
+
+        self.assertIn("Imported 1 users, skipped 3", output)
+        other = User.objects.get(email='ada@other.org')
+        self.assertNotEqual(other.username, 'ada')
+        self.assertTrue(other.username.startswith('ada-'))
+        self.assertFalse(other.has_usable_password())
+        self.assertTrue(Profile.objects.filter(user=other).exists())
+
+
+class DirtyFieldTrackingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(email='student@example.com')
+
+    def test_loaded_instances_start_clean(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.get_dirty_fields(), [])
+        self.assertEqual(user.profile.get_dirty_fields(), [])
+
+    def test_changed_fields_are_reported_until_saved(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.otp = '123456'
+        self.assertEqual(user.get_dirty_fields(), ['otp'])
+
+        user.save(update_fields=['otp'])
+        self.assertEqual(user.get_dirty_fields(), [])
+
+    def test_user_save_does_not_load_or_write_unloaded_profile(self):
+        user = User.objects.get(pk=self.user.pk)
+        user.otp = '123456'
+        with self.assertNumQueries(1):
+            user.save(update_fields=['otp'])
+
+    def test_user_save_skips_clean_profile(self):
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        with self.assertNumQueries(1):
+            user.save()
+
+    def test_user_save_writes_only_changed_profile_fields(self):
+        user = User.objects.select_related('profile').get(pk=self.user.pk)
+        user.profile.country = 'Kenya'
+        with self.assertNumQueries(2) as queries:
+            user.save()
+        profile_update = queries.captured_queries[1]['sql']
+        self.assertIn('"country"', profile_update)
+        self.assertNotIn('"about"', profile_update)
+        self.assertEqual(Profile.objects.get(user=user).country, 'Kenya')
+
+
+@override_settings(
+    PASSWORD_HASHERS=['core.hashers.PBKDF2PasswordHasher', MD5_HASHER],
+    PASSWORD_HASHER_COSTS={'pbkdf2_sha256': {'iterations': 1000}},
+)
+class BackgroundRehashTests(TransactionTestCase):
+    password = 'Sup3r-secret-pw'
+
+    def setUp(self):
+        with override_settings(PASSWORD_HASHERS=[MD5_HASHER]):
+            self.user = User.objects.create(email='student@example.com', password=make_password(self.password))
+
+    def test_login_upgrades_an_outdated_hash_in_the_background(self):
+        response = self.client.post('/api/v1/user/token/', {'email': 'student@example.com', 'password': self.password})
+        self.assertEqual(response.status_code, 200)
+
+        # Waits for the queued rehash
+        shutdown_executor()
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(self.user.check_password(self.password))
+
+    def test_rehash_never_overwrites_a_changed_password(self):
+        old_encoded = self.user.password
+        User.objects.filter(pk=self.user.pk).update(password=make_password('changed-pw-2'))
+
+        self.assertFalse(rehash_password(self.user.pk, old_encoded, self.password))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('changed-pw-2'))
+
+
+FILE_SYSTEM_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(
+    STORAGES=FILE_SYSTEM_STORAGES,
+    PROFILE_IMAGE_VARIANTS={'thumb': 32, 'small': 64},
+    PROFILE_IMAGE_FORMATS=('webp', 'jpeg'),
+)
+class ProfileImageTests(TestCase):
+    url = '/api/v1/user/profile/image/'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.user = User.objects.create(email='student@example.com', username='student')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def make_image(self, color='red', size=(300, 200), fmt='PNG', mode='RGBA') -> bytes:
+        buffer = io.BytesIO()
+        Image.new(mode, size, color).save(buffer, fmt)
+        return buffer.getvalue()
+
+    def upload(self, content: bytes, name='avatar.png'):
+        return self.client.post(self.url, {'image': SimpleUploadedFile(name, content)}, **self.auth)
+
+    def test_upload_is_stored_content_addressed_and_queued(self):
+        response = self.upload(self.make_image())
+
+        self.assertEqual(response.status_code, 202)
+        image = ProfileImage.objects.get()
+        self.assertEqual(response.data['status'], 'pending')
+        self.assertEqual(response.data['variants'], {})
+        self.assertEqual((image.width, image.height), (300, 200))
+        self.assertEqual(image.original, f'images/{image.digest[:2]}/{image.digest}.png')
+        self.assertTrue(default_storage.exists(image.original))
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.image.name, image.original)
+        self.assertEqual(profile.image_asset, image)
+
+    def test_same_bytes_are_stored_once(self):
+        content = self.make_image()
+        self.upload(content)
+        other = User.objects.create(email='other@example.com', username='other')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(other)}'}
+
+        response = self.upload(content, name='copy.png')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(ProfileImage.objects.count(), 1)
+        image = ProfileImage.objects.get()
+        self.assertEqual(os.listdir(os.path.dirname(default_storage.path(image.original))), [f'{image.digest}.png'])
+        self.assertEqual(Profile.objects.get(user=other).image_asset, image)
+
+    def test_rejects_files_that_are_not_images(self):
+        response = self.upload(b'not an image at all', name='avatar.png')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.assertFalse(ProfileImage.objects.exists())
+
+    def test_rejects_oversized_uploads(self):
+        with override_settings(PROFILE_IMAGE_MAX_BYTES=100):
+            response = self.upload(self.make_image())
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most', response.data['image'][0])
+        self.assertFalse(ProfileImage.objects.exists())
+
+    def test_oversized_uploads_are_cut_off_while_streaming(self):
+        handler = HashingUploadHandler(max_bytes=100)
+        handler.new_file('image', 'avatar.png', 'image/png', None)
+        handler.receive_data_chunk(b'x' * 60, 0)
+
+        with self.assertRaises(StopUpload) as stopped:
+            handler.receive_data_chunk(b'x' * 60, 60)
+        self.assertTrue(stopped.exception.connection_reset)
+        self.assertTrue(handler.exceeded)
+
+    def test_requires_authentication(self):
+        response = self.client.post(self.url, {'image': SimpleUploadedFile('a.png', self.make_image())})
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_command_renders_variants_and_marks_ready(self):
+        self.upload(self.make_image(mode='RGB', fmt='JPEG'), name='avatar.jpg')
+        out = io.StringIO()
+
+        call_command('process_profile_images', stdout=out)
+
+        self.assertIn("1 processed", out.getvalue())
+        image = ProfileImage.objects.get()
+        self.assertEqual(image.status, ProfileImage.STATUS_READY)
+        self.assertEqual(set(image.variants), {'thumb', 'small'})
+        small = image.variants['small']
+        self.assertEqual((small['webp']['width'], small['webp']['height']), (64, 43))
+        for variant in image.variants.values():
+            for fmt, entry in variant.items():
+                self.assertTrue(entry['name'].startswith('images/'))
+                with default_storage.open(entry['name']) as f, Image.open(f) as rendered:
+                    self.assertEqual(rendered.format, {'webp': 'WEBP', 'jpeg': 'JPEG'}[fmt])
+                    self.assertEqual(rendered.size, (entry['width'], entry['height']))
+
+    def test_serializer_exposes_variant_urls_once_ready(self):
+        self.upload(self.make_image())
+        profile = Profile.objects.select_related('image_asset').get(user=self.user)
+        self.assertEqual(ProfileSerializer(profile).data['image_variants'], {})
+
+        process_batch()
+        profile.image_asset.refresh_from_db()
+
+        variants = ProfileSerializer(profile).data['image_variants']
+        name = profile.image_asset.variants['thumb']['webp']['name']
+        self.assertEqual(variants['thumb']['webp'], f'/media/{name}')
+        self.assertEqual(set(variants['small']), {'webp', 'jpeg'})
+
+    def test_failed_images_are_retried_then_given_up(self):
+        self.upload(self.make_image())
+        image = ProfileImage.objects.get()
+        default_storage.delete(image.original)
+
+        with override_settings(PROFILE_IMAGE_MAX_ATTEMPTS=2), self.assertLogs('userauths.images', 'ERROR'):
+            self.assertEqual(process_batch(), (0, 1, 0))
+            ProfileImage.objects.update(next_attempt_at=image.created)
+            self.assertEqual(process_batch(), (0, 0, 1))
+
+        image.refresh_from_db()
+        self.assertEqual(image.status, ProfileImage.STATUS_FAILED)
+        self.assertEqual(image.attempts, 2)
+        self.assertTrue(image.last_error)